@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""An idle daemon in the mode given by $BENCH_MODE, used by the benchmarks
+
+Only the daemon class of the selected mode is imported, so that the init
+script pays for the same imports as a real one would.
+"""
+from __future__ import print_function, absolute_import, division
+
+import os
+import sys
+
+
+def plain_daemon():
+    from succubus import Daemon
+
+    class PlainDaemon(Daemon):
+        def run(self):
+            self.wait()
+    return PlainDaemon
+
+
+def prefork_daemon():
+    from succubus import PreforkDaemon
+
+    class IdlePreforkDaemon(PreforkDaemon):
+        def run(self):
+            self.wait()
+    return IdlePreforkDaemon
+
+
+def async_daemon():
+    import asyncio
+    from succubus import AsyncDaemon
+
+    class IdleAsyncDaemon(AsyncDaemon):
+        async def run(self):
+            await asyncio.Event().wait()
+    return IdleAsyncDaemon
+
+
+def main():
+    mode = os.environ.get('BENCH_MODE', 'daemon')
+    pid_file = os.environ['PID_FILE']
+    if mode == 'prefork':
+        daemon = prefork_daemon()(pid_file=pid_file, workers=2)
+    elif mode == 'async':
+        daemon = async_daemon()(pid_file=pid_file)
+    else:
+        daemon = plain_daemon()(pid_file=pid_file)
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""Measure what an init script invocation costs
+
+Monitoring may call "status" on hundreds of daemons per minute, so the
+interpreter start and the imports dominate. This measures:
+
+- interpreter_seconds: "python -c pass", the floor for everything below
+- import_seconds: "python -c 'import succubus'"
+- status_stopped_seconds: "status" of a daemon that is not running
+- status_running_seconds: "status" of a running daemon
+- stop_stopped_seconds: "stop" of a daemon that is not running
+
+It also lists the modules that "import succubus" should not load, but
+does. Results are printed as JSON (or written to --output).
+"""
+from __future__ import print_function, absolute_import, division
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from lifecycle_benchmark import DAEMON, summarize
+
+HEAVY_MODULES = ['psutil', 'asyncio', 'logging', 'http.server', 'json',
+                 'multiprocessing']
+
+
+def run_time(args, env=None, expected_status=None):
+    with open(os.devnull, 'w') as devnull:
+        start = time.time()
+        status = subprocess.call(args, env=env, stdout=devnull, stderr=devnull)
+        elapsed = time.time() - start
+    if expected_status is not None and status != expected_status:
+        raise Exception("%s exited with %s" % (' '.join(args), status))
+    return elapsed
+
+
+def heavy_imports():
+    code = ("import sys, succubus; print(' '.join(name for name in %r "
+            "if name in sys.modules))" % HEAVY_MODULES)
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return output.decode('utf-8').split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='Write JSON results to this file')
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp(prefix='succubus-bench')
+    pid_file = os.path.join(temp_dir, 'daemon.pid')
+    env = dict(os.environ, BENCH_MODE='daemon', PID_FILE=pid_file)
+    script = [sys.executable, DAEMON]
+    results = dict((name, []) for name in (
+        'interpreter_seconds', 'import_seconds', 'status_stopped_seconds',
+        'status_running_seconds', 'stop_stopped_seconds'))
+    try:
+        for _ in range(args.repeat):
+            results['interpreter_seconds'].append(
+                run_time([sys.executable, '-c', 'pass']))
+            results['import_seconds'].append(
+                run_time([sys.executable, '-c', 'import succubus']))
+            results['status_stopped_seconds'].append(
+                run_time(script + ['status'], env, expected_status=3))
+            results['stop_stopped_seconds'].append(
+                run_time(script + ['stop'], env, expected_status=0))
+
+        run_time(script + ['start'], env, expected_status=0)
+        try:
+            for _ in range(args.repeat):
+                results['status_running_seconds'].append(
+                    run_time(script + ['status'], env, expected_status=0))
+        finally:
+            run_time(script + ['stop'], env)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'timestamp': time.time(),
+              'repeat': args.repeat,
+              'heavy_imports': heavy_imports(),
+              'results': dict((name, summarize(samples))
+                              for name, samples in results.items())}
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""Measure the latency and overhead of the daemon lifecycle
+
+For every daemon mode (plain Daemon, PreforkDaemon, AsyncDaemon), this
+measures:
+
+- start_seconds: wall time of "start", which returns once the daemon is ready
+- startup_seconds: startup latency as reported by "start" itself
+- stop_seconds: from sending SIGTERM until the pid file is removed
+- stop_command_seconds: wall time of the "stop" command
+- restart_downtime_seconds: longest interval during "restart" in which the
+  pid file did not name a live process
+- status_seconds: wall time of the "status" command
+- rss_overhead_bytes: RSS of the daemon process minus the RSS of a bare
+  interpreter doing nothing
+
+Results are printed as JSON (or written to --output) so that runs against
+different releases can be compared.
+"""
+from __future__ import print_function, absolute_import, division
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import psutil
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DAEMON = os.path.join(HERE, 'bench_daemon.py')
+MODES = ['daemon', 'prefork', 'async']
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {'median': ordered[len(ordered) // 2],
+            'min': ordered[0],
+            'max': ordered[-1],
+            'samples': samples}
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return time.time() - start, result
+
+
+class Benchmark(object):
+    def __init__(self, mode, temp_dir):
+        self.mode = mode
+        self.pid_file = os.path.join(temp_dir, '%s.pid' % mode)
+        self.env = dict(os.environ, BENCH_MODE=mode, PID_FILE=self.pid_file)
+
+    def command(self, action):
+        return subprocess.check_output([sys.executable, DAEMON, action],
+                                       env=self.env).decode('utf-8')
+
+    def read_pid(self):
+        try:
+            with open(self.pid_file) as pid_file:
+                return int(pid_file.readline().strip())
+        except (IOError, ValueError):
+            return None
+
+    def start(self):
+        elapsed, output = timed(self.command, 'start')
+        match = re.search(r'ready after ([0-9.]+) seconds', output)
+        return elapsed, float(match.group(1)) if match else None
+
+    def stop_by_signal(self):
+        """Time from SIGTERM until the daemon has removed its pid file"""
+        pid = self.read_pid()
+        start = time.time()
+        os.kill(pid, signal.SIGTERM)
+        while os.path.exists(self.pid_file):
+            time.sleep(0.0005)
+        return time.time() - start
+
+    def restart_downtime(self):
+        """Longest time during "restart" without a live daemon process"""
+        done = threading.Event()
+        gaps = []
+
+        def probe():
+            down_since = None
+            while not done.is_set():
+                pid = self.read_pid()
+                alive = pid is not None and psutil.pid_exists(pid)
+                now = time.time()
+                if not alive and down_since is None:
+                    down_since = now
+                elif alive and down_since is not None:
+                    gaps.append(now - down_since)
+                    down_since = None
+                time.sleep(0.0005)
+        thread = threading.Thread(target=probe)
+        thread.start()
+        try:
+            self.command('restart')
+            # "restart" returns when the new daemon is ready.
+            time.sleep(0.05)
+        finally:
+            done.set()
+            thread.join()
+        return max(gaps) if gaps else 0.0
+
+    def rss_overhead(self, baseline):
+        return psutil.Process(self.read_pid()).memory_info().rss - baseline
+
+    def run(self, repeat):
+        results = dict((name, []) for name in (
+            'start_seconds', 'startup_seconds', 'stop_seconds',
+            'stop_command_seconds', 'restart_downtime_seconds',
+            'status_seconds', 'rss_overhead_bytes'))
+        baseline = baseline_rss()
+        for _ in range(repeat):
+            elapsed, startup = self.start()
+            results['start_seconds'].append(elapsed)
+            if startup is not None:
+                results['startup_seconds'].append(startup)
+            results['status_seconds'].append(timed(self.command, 'status')[0])
+            results['rss_overhead_bytes'].append(self.rss_overhead(baseline))
+            results['stop_seconds'].append(self.stop_by_signal())
+
+            self.start()
+            results['restart_downtime_seconds'].append(self.restart_downtime())
+            results['stop_command_seconds'].append(timed(self.command, 'stop')[0])
+        return dict((name, summarize(samples))
+                    for name, samples in results.items() if samples)
+
+
+def baseline_rss():
+    """RSS of an interpreter that has not imported anything"""
+    process = subprocess.Popen([sys.executable, '-c',
+                                'import sys; sys.stdin.read()'],
+                               stdin=subprocess.PIPE)
+    try:
+        time.sleep(0.2)
+        return psutil.Process(process.pid).memory_info().rss
+    finally:
+        process.communicate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--mode', action='append', choices=MODES,
+                        help='Daemon mode to benchmark (default: all)')
+    parser.add_argument('--output', help='Write JSON results to this file')
+    args = parser.parse_args()
+
+    modes = args.mode or MODES
+    if sys.version_info < (3, 7) and 'async' in modes:
+        modes.remove('async')
+
+    temp_dir = tempfile.mkdtemp(prefix='succubus-bench')
+    try:
+        results = dict((mode, Benchmark(mode, temp_dir).run(args.repeat))
+                       for mode in modes)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'timestamp': time.time(),
+              'repeat': args.repeat,
+              'results': results}
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
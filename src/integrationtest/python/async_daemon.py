@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""An asyncio daemon with many concurrent tasks and an async shutdown()"""
+from __future__ import print_function, absolute_import, division
+
+import asyncio
+import os
+import sys
+
+from succubus import AsyncDaemon
+
+
+class MyDaemon(AsyncDaemon):
+    async def tick(self):
+        while True:
+            await asyncio.sleep(0.1)
+
+    async def run(self):
+        await asyncio.gather(*[self.tick() for _ in range(1000)])
+
+    async def shutdown(self):
+        # Pretend to do something that takes a while.
+        await asyncio.sleep(0.5)
+        pid_dir = os.path.dirname(self.pid_file)
+        open(os.path.join(pid_dir, "success"), "w").close()
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'])
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
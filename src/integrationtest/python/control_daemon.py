@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+"""A daemon that serves a control socket with a custom command and metrics"""
+from __future__ import print_function, absolute_import, division
+
+import os
+import sys
+
+from succubus import Daemon
+
+
+class MyDaemon(Daemon):
+    def run(self):
+        self.iterations = 0
+        self.register_command('iterations', lambda: self.iterations)
+        loops = self.metrics.counter('loop_iterations_total')
+        while not self.wait(0.1):
+            self.iterations += 1
+            loops.inc()
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'])
+    daemon.enable_control_socket = True
+    daemon.metrics_address = os.path.join(
+        os.path.dirname(os.environ['PID_FILE']), 'metrics.sock')
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import unittest2
+
+from succubus import control
+
+
+class ControlDaemonTests(unittest2.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        self.control_socket = os.path.join(self.temp_dir, 'succubus.sock')
+        os.environ['PID_FILE'] = self.pid_file
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_daemon_is_controlled_through_socket(self):
+        daemon = "./src/integrationtest/python/control_daemon.py"
+        subprocess.check_call([daemon, "start"])
+
+        time.sleep(0.3)
+        self.assertTrue(os.path.exists(self.control_socket))
+        subprocess.check_call([daemon, "status"])
+
+        status = control.request(self.control_socket, 'status')
+        with open(self.pid_file) as pid_file:
+            self.assertEqual(status['pid'], int(pid_file.readline().strip()))
+        self.assertGreater(control.request(self.control_socket, 'iterations'), 0)
+        self.assertGreater(control.request(self.control_socket, 'stats')['rss'], 0)
+        metrics = control.request(self.control_socket, 'metrics')
+        self.assertGreater(metrics['loop_iterations_total'], 0)
+
+        # The same metrics are served in the Prometheus text format.
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(os.path.join(self.temp_dir, 'metrics.sock'))
+        conn.sendall(b'GET /metrics HTTP/1.0\r\n\r\n')
+        response = conn.makefile('rb').read()
+        conn.close()
+        self.assertIn(b'# TYPE loop_iterations_total counter', response)
+        self.assertIn(b'process_resident_memory_bytes', response)
+
+        subprocess.check_call([daemon, "stop"])
+
+        self.assertRaises(Exception, subprocess.check_call, [daemon, "status"])
+        self.assertFalse(os.path.exists(self.control_socket))
+        self.assertFalse(os.path.exists(self.pid_file))
+
+
+if __name__ == "__main__":
+    unittest2.main()
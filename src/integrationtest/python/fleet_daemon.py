@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+"""A daemon that takes its pid file as argument, e.g. "fleet_daemon.py start x.pid"
+
+The name under which it registers comes from the pid file.
+"""
+from __future__ import print_function, absolute_import, division
+
+import sys
+
+from succubus import Daemon
+
+
+class MyDaemon(Daemon):
+    def run(self):
+        while not self.wait(1):
+            pass
+
+
+def main():
+    daemon = MyDaemon(pid_file=sys.argv[2])
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest2
+
+
+class FleetDaemonTests(unittest2.TestCase):
+    daemon = "./src/integrationtest/python/fleet_daemon.py"
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.registry = os.path.join(self.temp_dir, 'registry')
+        os.mkdir(self.registry)
+        os.environ['SUCCUBUS_REGISTRY'] = self.registry
+
+    def tearDown(self):
+        del os.environ['SUCCUBUS_REGISTRY']
+        shutil.rmtree(self.temp_dir)
+
+    def start(self, name):
+        pid_file = os.path.join(self.temp_dir, name + '.pid')
+        subprocess.check_call([self.daemon, "start", pid_file])
+
+    def fleet(self, *args):
+        process = subprocess.Popen([sys.executable, "-m", "succubus.fleet"] + list(args),
+                                   stdout=subprocess.PIPE, universal_newlines=True)
+        output = process.communicate()[0]
+        return process.returncode, output
+
+    def states(self, *patterns):
+        retval, output = self.fleet("status", "--json", *patterns)
+        return retval, dict((result['name'], result['running'])
+                            for result in json.loads(output))
+
+    def test_control_registered_daemons(self):
+        self.start('web-1')
+        self.start('web-2')
+        self.start('worker')
+        try:
+            self.assertEqual(self.states(), (0, {'web-1': True, 'web-2': True,
+                                                 'worker': True}))
+
+            retval, output = self.fleet("stop", "web-*")
+            self.assertEqual(retval, 0)
+            self.assertIn("web-1", output)
+
+            self.assertEqual(self.states(), (3, {'web-1': False, 'web-2': False,
+                                                 'worker': True}))
+            self.assertEqual(self.states("worker"), (0, {'worker': True}))
+
+            retval, output = self.fleet("start", "-j", "1")
+            self.assertEqual(retval, 0)
+            self.assertEqual(self.states(), (0, {'web-1': True, 'web-2': True,
+                                                 'worker': True}))
+        finally:
+            self.fleet("stop")
+
+    def test_script_need_not_be_executable(self):
+        script = os.path.join(self.temp_dir, 'fleet_daemon.py')
+        shutil.copy(self.daemon, script)
+        os.chmod(script, 0o644)
+        pid_file = os.path.join(self.temp_dir, 'plain.pid')
+        subprocess.check_call([sys.executable, script, "start", pid_file])
+        try:
+            self.assertEqual(self.states(), (0, {'plain': True}))
+
+            retval, output = self.fleet("stop")
+
+            self.assertEqual(retval, 0, output)
+            self.assertEqual(self.states(), (3, {'plain': False}))
+        finally:
+            self.fleet("stop")
+
+
+if __name__ == "__main__":
+    unittest2.main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+"""A TCP daemon that answers every connection with its own pid"""
+from __future__ import print_function, absolute_import, division
+
+import os
+import select
+import sys
+
+from succubus import Daemon
+
+
+class MyDaemon(Daemon):
+    def run(self):
+        port = int(os.environ['PORT'])
+        server = self.listen_socket('http', ('127.0.0.1', port))
+        self.notify_ready()
+        while True:
+            select.select([server, self.shutdown_requested], [], [])
+            if self.shutdown_requested.is_set():
+                return
+            connection, _ = server.accept()
+            connection.sendall(("%d\n" % os.getpid()).encode('ascii'))
+            connection.close()
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'])
+    daemon.wait_for_ready = True
+    daemon.zero_downtime_restart = True
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import errno
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import unittest2
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class HandoverDaemonTests(unittest2.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        os.environ['PID_FILE'] = self.pid_file
+        self.port = free_port()
+        os.environ['PORT'] = str(self.port)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def read_pid_file(self):
+        with open(self.pid_file) as pid_file:
+            return int(pid_file.readline().strip())
+
+    def test_restart_never_refuses_connections(self):
+        daemon = "./src/integrationtest/python/handover_daemon.py"
+        subprocess.check_call([daemon, "start"])
+        old_pid = self.read_pid_file()
+
+        refused = []
+        served_by = set()
+        restarted = threading.Event()
+
+        def client():
+            while not restarted.is_set():
+                try:
+                    connection = socket.create_connection(('127.0.0.1', self.port))
+                except socket.error as e:
+                    if e.errno == errno.ECONNREFUSED:
+                        refused.append(e)
+                    continue
+                # A connection that was accepted by the old process when it
+                # got SIGTERM may be closed without an answer.
+                answer = connection.recv(64)
+                if answer:
+                    served_by.add(int(answer))
+                connection.close()
+        thread = threading.Thread(target=client)
+        thread.start()
+        try:
+            subprocess.check_call([daemon, "restart"])
+        finally:
+            restarted.set()
+            thread.join()
+
+        new_pid = self.read_pid_file()
+        self.assertNotEqual(old_pid, new_pid)
+        self.assertEqual(refused, [])
+        self.assertIn(old_pid, served_by)
+        # The new daemon serves on the very same socket.
+        connection = socket.create_connection(('127.0.0.1', self.port))
+        self.assertEqual(int(connection.recv(64)), new_pid)
+        connection.close()
+
+        subprocess.check_call([daemon, "stop"])
+        self.assertFalse(os.path.exists(self.pid_file))
+
+
+if __name__ == "__main__":
+    unittest2.main()
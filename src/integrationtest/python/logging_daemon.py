@@ -18,6 +18,8 @@ class MyDaemon(Daemon):
 
 def main():
     daemon = MyDaemon(pid_file=os.environ['PID_FILE'])
+    # Stop the endless run() loop the way older versions did.
+    daemon.raise_on_sigterm = True
     sys.exit(daemon.action())
 
 
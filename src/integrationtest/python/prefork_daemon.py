@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+"""A daemon that runs three idle worker processes, supervised if $SUPERVISE is set"""
+from __future__ import print_function, absolute_import, division
+
+import os
+import sys
+
+from succubus import PreforkDaemon
+
+
+class MyDaemon(PreforkDaemon):
+    def run(self):
+        self.wait()
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'], workers=3)
+    daemon.supervise = bool(os.environ.get('SUPERVISE'))
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
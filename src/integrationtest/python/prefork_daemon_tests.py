@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import os
+import psutil
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest2
+
+
+@unittest2.skipIf(sys.version_info < (3, 3), "PreforkDaemon needs Python 3.3+")
+class PreforkDaemonTests(unittest2.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        os.environ['PID_FILE'] = self.pid_file
+        os.environ['SUPERVISE'] = ''
+
+    def tearDown(self):
+        del os.environ['SUPERVISE']
+        shutil.rmtree(self.temp_dir)
+
+    def test_master_supervises_workers(self):
+        daemon = "./src/integrationtest/python/prefork_daemon.py"
+        subprocess.check_call([daemon, "start"])
+
+        time.sleep(0.5)
+        subprocess.check_call([daemon, "status"])
+        with open(self.pid_file) as pid_file:
+            master = psutil.Process(int(pid_file.readline().strip()))
+        workers = master.children()
+        self.assertEqual(len(workers), 3)
+
+        # A worker that dies must be replaced.
+        os.kill(workers[0].pid, signal.SIGKILL)
+        time.sleep(1.5)
+        self.assertEqual(len(master.children()), 3)
+        workers = master.children()
+
+        subprocess.check_call([daemon, "stop"])
+
+        self.assertRaises(Exception, subprocess.check_call, [daemon, "status"])
+        self.assertFalse(os.path.exists(self.pid_file))
+        for worker in workers:
+            self.assertFalse(worker.is_running() and
+                             worker.status() != psutil.STATUS_ZOMBIE)
+
+    def test_supervised_master_stops_workers(self):
+        daemon = "./src/integrationtest/python/prefork_daemon.py"
+        os.environ['SUPERVISE'] = '1'
+        subprocess.check_call([daemon, "start"])
+
+        time.sleep(0.5)
+        with open(self.pid_file) as pid_file:
+            supervisor = psutil.Process(int(pid_file.readline().strip()))
+        processes = supervisor.children(recursive=True)
+        self.assertEqual(len(processes), 4)
+
+        process = subprocess.Popen([daemon, "stop"], stderr=subprocess.PIPE,
+                                   universal_newlines=True)
+        errors = process.communicate()[1]
+
+        self.assertEqual(process.returncode, 0)
+        self.assertNotIn("SIGKILL", errors)
+        self.assertFalse(os.path.exists(self.pid_file))
+        time.sleep(0.1)
+        for process in processes:
+            self.assertFalse(process.is_running() and
+                             process.status() != psutil.STATUS_ZOMBIE)
+
+
+if __name__ == "__main__":
+    unittest2.main()
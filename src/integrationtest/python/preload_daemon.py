@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+"""A daemon that preloads a large data set and shares it with two workers
+
+Each worker runs a full garbage collection once it has started.
+"""
+from __future__ import print_function, absolute_import, division
+
+import gc
+import os
+import sys
+
+from succubus import PreforkDaemon
+
+
+class MyDaemon(PreforkDaemon):
+    def preload(self):
+        # Lists are tracked by the garbage collector, unlike strings.
+        self.data = [[number] for number in range(500000)]
+
+    def run(self):
+        gc.collect()
+        self.wait()
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'], workers=2)
+    daemon.enable_control_socket = True
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
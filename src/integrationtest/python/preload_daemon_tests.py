@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest2
+
+from succubus.control import request
+
+
+@unittest2.skipIf(sys.version_info < (3, 3), "PreforkDaemon needs Python 3.3+")
+class PreloadDaemonTests(unittest2.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        os.environ['PID_FILE'] = self.pid_file
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_preloaded_data_stays_shared_after_gc_in_workers(self):
+        daemon = "./src/integrationtest/python/preload_daemon.py"
+        subprocess.check_call([daemon, "start"])
+        try:
+            time.sleep(1)
+            stats = request(os.path.join(self.temp_dir, 'succubus.sock'), 'stats')
+        finally:
+            subprocess.check_call([daemon, "stop"])
+
+        workers = stats['workers']
+        self.assertEqual(sorted(workers), ['0', '1'])
+        for memory in workers.values():
+            # Half a million lists take about 40 MB.
+            self.assertGreater(memory['shared'], 30 * 1024 * 1024)
+            self.assertLess(memory['private'], memory['shared'] // 4)
+
+
+if __name__ == "__main__":
+    unittest2.main()
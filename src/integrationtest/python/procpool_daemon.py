@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""A daemon that sums up 1 MB of shared memory on its process pool
+
+The sum, the pids of the pool workers and their user id are written to
+$RESULT_FILE.
+"""
+from __future__ import print_function, absolute_import, division
+
+import os
+import sys
+
+from succubus import Daemon
+
+
+def checksum(block, start, end):
+    return sum(block.buf[start:end]), os.getpid(), os.getuid()
+
+
+class MyDaemon(Daemon):
+    def run(self):
+        data = bytes(bytearray(range(256))) * 4096
+        block = self.process_pool.shared(data)
+        chunk = len(data) // 4
+        results = [self.process_pool.submit(checksum, block, start, start + chunk)
+                   for start in range(0, len(data), chunk)]
+        results = [result.get(10) for result in results]
+        self.process_pool.release(block)
+        with open(os.environ['RESULT_FILE'], 'w') as result_file:
+            result_file.write('%d\n' % sum(total for total, _, _ in results))
+            for _, pid, uid in results:
+                result_file.write('%d %d\n' % (pid, uid))
+        self.wait()
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'])
+    daemon.pool_processes = 2
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
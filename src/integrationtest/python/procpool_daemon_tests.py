@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import errno
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest2
+
+
+def pid_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    # Zombies count as gone.
+    try:
+        with open('/proc/%d/stat' % pid) as stat:
+            return stat.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except IOError:
+        return False
+
+
+class ProcessPoolDaemonTests(unittest2.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        self.result_file = os.path.join(self.temp_dir, 'result')
+        os.environ['PID_FILE'] = self.pid_file
+        os.environ['RESULT_FILE'] = self.result_file
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def wait_for_result(self, timeout=10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if os.path.exists(self.result_file):
+                with open(self.result_file) as result_file:
+                    lines = result_file.read().splitlines()
+                if len(lines) == 5:
+                    return lines
+            time.sleep(0.05)
+        self.fail("The daemon did not write its result")
+
+    def test_pool_workers_share_memory_and_stop_with_daemon(self):
+        daemon = "./src/integrationtest/python/procpool_daemon.py"
+        subprocess.check_call([daemon, "start"])
+
+        lines = self.wait_for_result()
+        subprocess.check_call([daemon, "stop"])
+
+        self.assertEqual(int(lines[0]), sum(range(256)) * 4096)
+        workers = [tuple(int(value) for value in line.split()) for line in lines[1:]]
+        self.assertTrue(all(uid == os.getuid() for _, uid in workers))
+        self.assertFalse(any(pid_exists(pid) for pid, _ in workers))
+        self.assertFalse(os.path.exists(self.pid_file))
+
+
+if __name__ == "__main__":
+    unittest2.main()
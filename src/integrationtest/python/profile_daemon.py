@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+"""A daemon that spends its time in spin(), to be found by the profiler"""
+from __future__ import print_function, absolute_import, division
+
+import os
+import sys
+
+from succubus import Daemon
+
+
+class MyDaemon(Daemon):
+    def run(self):
+        while not self.shutdown_requested.is_set():
+            self.spin()
+
+    def spin(self):
+        return sum(range(10000))
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'])
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
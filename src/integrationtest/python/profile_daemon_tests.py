@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+import unittest2
+
+
+class ProfileDaemonTests(unittest2.TestCase):
+    daemon = "./src/integrationtest/python/profile_daemon.py"
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        os.environ['PID_FILE'] = self.pid_file
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_sigusr1_toggles_profiler(self):
+        subprocess.check_call([self.daemon, "start"])
+        with open(self.pid_file) as pid_file:
+            pid = int(pid_file.readline())
+        output_file = os.path.join(self.temp_dir, 'succubus.%d.collapsed' % pid)
+
+        os.kill(pid, signal.SIGUSR1)
+        time.sleep(0.5)
+        os.kill(pid, signal.SIGUSR1)
+        deadline = time.time() + 5
+        while not os.path.exists(output_file) and time.time() < deadline:
+            time.sleep(0.05)
+        subprocess.check_call([self.daemon, "stop"])
+
+        with open(output_file) as output:
+            stacks = output.read().splitlines()
+        spinning = sum(int(line.rsplit(' ', 1)[1]) for line in stacks
+                       if ';spin (profile_daemon.py:' in line)
+        # Other threads (logging, signals) are sampled as well.
+        total = sum(int(line.rsplit(' ', 1)[1]) for line in stacks
+                    if line.startswith('MainThread;'))
+        self.assertGreater(spinning, total / 2)
+
+
+if __name__ == "__main__":
+    unittest2.main()
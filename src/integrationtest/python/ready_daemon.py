@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+"""A daemon that needs a while to become ready, or fails during startup"""
+from __future__ import print_function, absolute_import, division
+
+import os
+import sys
+import time
+
+from succubus import Daemon
+
+
+class MyDaemon(Daemon):
+    def run(self):
+        # Pretend to do some expensive initialisation.
+        time.sleep(0.5)
+        if os.environ.get('FAIL_STARTUP'):
+            raise Exception("Startup failed")
+        self.notify_ready()
+        self.wait()
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'])
+    daemon.wait_for_ready = True
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest2
+
+class ReadyDaemonTests(unittest2.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        os.environ['PID_FILE'] = self.pid_file
+        os.environ.pop('FAIL_STARTUP', None)
+
+    def tearDown(self):
+        os.environ.pop('FAIL_STARTUP', None)
+        shutil.rmtree(self.temp_dir)
+
+    def test_start_returns_when_daemon_is_ready(self):
+        daemon = "./src/integrationtest/python/ready_daemon.py"
+        start = time.time()
+        output = subprocess.check_output([daemon, "start"])
+        startup_time = time.time() - start
+
+        # "start" must wait for notify_ready() and report the latency.
+        self.assertGreater(startup_time, 0.5)
+        self.assertIn(b"ready after", output)
+        # No need to sleep, the daemon is running as soon as "start" returns.
+        subprocess.check_call([daemon, "status"])
+        subprocess.check_call([daemon, "stop"])
+
+    def test_start_reports_failed_startup(self):
+        daemon = "./src/integrationtest/python/ready_daemon.py"
+        os.environ['FAIL_STARTUP'] = '1'
+
+        self.assertRaises(subprocess.CalledProcessError,
+                          subprocess.check_call, [daemon, "start"])
+
+        self.assertRaises(Exception, subprocess.check_call, [daemon, "status"])
+
+
+if __name__ == "__main__":
+    unittest2.main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+"""A daemon whose two workers are recycled after five units of work each
+
+Every worker does one unit of work every 50 milliseconds.
+"""
+from __future__ import print_function, absolute_import, division
+
+import os
+import sys
+
+from succubus import PreforkDaemon
+
+
+class MyDaemon(PreforkDaemon):
+    def run(self):
+        while not self.wait(0.05):
+            self.unit_done()
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'], workers=2)
+    daemon.max_worker_units = 5
+    daemon.recycle_interval = 0.1
+    daemon.enable_control_socket = True
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
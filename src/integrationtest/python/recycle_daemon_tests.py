@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import os
+import psutil
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest2
+
+from succubus.control import request
+
+
+@unittest2.skipIf(sys.version_info < (3, 3), "PreforkDaemon needs Python 3.3+")
+class RecycleDaemonTests(unittest2.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        os.environ['PID_FILE'] = self.pid_file
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def running_workers(self, master):
+        workers = set()
+        for child in master.children():
+            try:
+                if child.status() != psutil.STATUS_ZOMBIE:
+                    workers.add(child.pid)
+            except psutil.NoSuchProcess:
+                pass
+        return workers
+
+    def test_workers_are_recycled_without_losing_capacity(self):
+        daemon = "./src/integrationtest/python/recycle_daemon.py"
+        subprocess.check_call([daemon, "start"])
+        try:
+            with open(self.pid_file) as pid_file:
+                master = psutil.Process(int(pid_file.readline().strip()))
+            first_workers = self.running_workers(master)
+            seen = set(first_workers)
+            for _ in range(40):
+                workers = self.running_workers(master)
+                self.assertGreaterEqual(len(workers), 2)
+                seen.update(workers)
+                time.sleep(0.05)
+            metrics = request(os.path.join(self.temp_dir, 'succubus.sock'), 'metrics')
+        finally:
+            subprocess.check_call([daemon, "stop"])
+
+        self.assertGreater(len(seen), 4)
+        self.assertGreater(metrics['succubus_worker_recycles_total'], 2)
+        self.assertEqual(metrics['succubus_restarts_total'], 0)
+
+
+if __name__ == "__main__":
+    unittest2.main()
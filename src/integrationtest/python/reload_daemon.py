@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+"""A pre-forked daemon that reads its greeting from the JSON file $CONFIG_FILE
+
+Every worker writes the greeting it was started with to a file named after
+its pid in $RESULT_DIR, and removes the file when it stops.
+"""
+from __future__ import print_function, absolute_import, division
+
+import json
+import os
+import sys
+
+from succubus import PreforkDaemon
+
+
+class MyDaemon(PreforkDaemon):
+    def load_configuration(self):
+        with open(os.environ['CONFIG_FILE']) as config_file:
+            self.config.update(json.load(config_file))
+
+    def validate_configuration(self, config):
+        if not config.get('greeting'):
+            raise ValueError("greeting must not be empty")
+
+    def result_file(self):
+        return os.path.join(os.environ['RESULT_DIR'], str(os.getpid()))
+
+    def run(self):
+        with open(self.result_file(), 'w') as result_file:
+            result_file.write(self.config['greeting'])
+        self.wait()
+
+    def shutdown(self):
+        os.remove(self.result_file())
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'], workers=2)
+    daemon.enable_control_socket = True
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
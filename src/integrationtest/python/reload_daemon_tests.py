@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest2
+
+
+@unittest2.skipIf(sys.version_info < (3, 3), "PreforkDaemon needs Python 3.3+")
+class ReloadDaemonTests(unittest2.TestCase):
+    daemon = "./src/integrationtest/python/reload_daemon.py"
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        self.config_file = os.path.join(self.temp_dir, 'config.json')
+        self.result_dir = os.path.join(self.temp_dir, 'results')
+        os.mkdir(self.result_dir)
+        os.environ['PID_FILE'] = self.pid_file
+        os.environ['CONFIG_FILE'] = self.config_file
+        os.environ['RESULT_DIR'] = self.result_dir
+        self.write_config("hello")
+        subprocess.check_call([self.daemon, "start"])
+
+    def tearDown(self):
+        subprocess.check_call([self.daemon, "stop"])
+        shutil.rmtree(self.temp_dir)
+
+    def write_config(self, greeting):
+        with open(self.config_file, 'w') as config_file:
+            json.dump({'greeting': greeting}, config_file)
+
+    def greetings(self):
+        """Return the greetings of the running workers"""
+        greetings = []
+        for name in os.listdir(self.result_dir):
+            with open(os.path.join(self.result_dir, name)) as result_file:
+                greetings.append(result_file.read())
+        return sorted(greetings)
+
+    def wait_for_greetings(self, expected, timeout=10):
+        deadline = time.time() + timeout
+        while self.greetings() != expected and time.time() < deadline:
+            time.sleep(0.05)
+        return self.greetings()
+
+    def reload(self):
+        process = subprocess.Popen([self.daemon, "reload"], stdout=subprocess.PIPE,
+                                   universal_newlines=True)
+        output = process.communicate()[0]
+        return process.returncode, output
+
+    def test_reload_replaces_workers_with_new_configuration(self):
+        self.assertEqual(self.wait_for_greetings(['hello', 'hello']), ['hello', 'hello'])
+        self.write_config("howdy")
+
+        returncode, output = self.reload()
+
+        self.assertEqual(returncode, 0)
+        self.assertIn("reloaded its configuration in", output)
+        self.assertEqual(self.wait_for_greetings(['howdy', 'howdy']), ['howdy', 'howdy'])
+
+    def test_invalid_configuration_is_rejected(self):
+        self.assertEqual(self.wait_for_greetings(['hello', 'hello']), ['hello', 'hello'])
+        self.write_config("")
+
+        returncode, _ = self.reload()
+        time.sleep(0.5)
+
+        self.assertEqual(returncode, 1)
+        self.assertEqual(self.greetings(), ['hello', 'hello'])
+
+    def test_sighup_reloads(self):
+        self.assertEqual(self.wait_for_greetings(['hello', 'hello']), ['hello', 'hello'])
+        self.write_config("howdy")
+
+        with open(self.pid_file) as pid_file:
+            os.kill(int(pid_file.readline()), signal.SIGHUP)
+
+        self.assertEqual(self.wait_for_greetings(['howdy', 'howdy']), ['howdy', 'howdy'])
+
+
+if __name__ == "__main__":
+    unittest2.main()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+"""A daemon that appends a line to $TICK_FILE every 50 milliseconds"""
+from __future__ import print_function, absolute_import, division
+
+import os
+import sys
+
+from succubus import Daemon
+
+
+class MyDaemon(Daemon):
+    def tick(self):
+        with open(os.environ['TICK_FILE'], 'a') as tick_file:
+            tick_file.write('tick\n')
+
+    def run(self):
+        self.scheduler.every(0.05, self.tick, first=0)
+        self.scheduler.run()
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'])
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
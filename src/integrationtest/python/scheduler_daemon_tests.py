@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest2
+
+
+class SchedulerDaemonTests(unittest2.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        self.tick_file = os.path.join(self.temp_dir, 'ticks')
+        os.environ['PID_FILE'] = self.pid_file
+        os.environ['TICK_FILE'] = self.tick_file
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def count_ticks(self):
+        with open(self.tick_file) as tick_file:
+            return len(tick_file.readlines())
+
+    def test_scheduled_job_runs_until_stop(self):
+        daemon = "./src/integrationtest/python/scheduler_daemon.py"
+        subprocess.check_call([daemon, "start"])
+
+        time.sleep(0.5)
+        subprocess.check_call([daemon, "stop"])
+
+        ticks = self.count_ticks()
+        # 0.5 seconds at 20 ticks per second, give or take a few.
+        self.assertGreater(ticks, 5)
+        self.assertLess(ticks, 15)
+        self.assertFalse(os.path.exists(self.pid_file))
+        time.sleep(0.2)
+        self.assertEqual(self.count_ticks(), ticks)
+
+
+if __name__ == "__main__":
+    unittest2.main()
@@ -18,9 +18,8 @@ class MyDaemon(Daemon):
         log_file = os.path.join(log_dir, "daemon.log")
 
         logger.addHandler(logging.FileHandler(log_file))
-        while True:
-            logger.debug("sleeping for 1 second...")
-            time.sleep(1)
+        while not self.wait(1):
+            logger.debug("slept for 1 second...")
 
     def shutdown(self):
         logger = logging.getLogger()
@@ -16,8 +16,7 @@ from succubus import Daemon
 
 class MyDaemon(Daemon):
     def run(self):
-        while True:
-            time.sleep(1)
+        self.wait()
 
     def shutdown(self):
         # Pretend that the daemon is stuck and will not shut down.
@@ -26,7 +26,7 @@ class ShutdownTimeoutTests(unittest2.TestCase):
         time.sleep(0.3)
         subprocess.check_call([daemon, "status"])
         with open(self.pid_file) as pid_file:
-            daemon_pid = int(pid_file.read().strip())
+            daemon_pid = int(pid_file.readline().strip())
         self.assertTrue(psutil.pid_exists(daemon_pid))
 
         start = time.time()
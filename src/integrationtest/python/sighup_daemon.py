@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""A daemon that logs all the time and counts its reloads in its status file"""
+from __future__ import print_function, absolute_import, division
+
+import logging
+import os
+import sys
+
+from succubus import Daemon
+
+
+class MyDaemon(Daemon):
+    def load_configuration(self):
+        # Every record must go through the logging queue.
+        self.config['log_rate_limit'] = None
+        if self._status is not None:
+            self.status_counter('reloads').inc()
+
+    def run(self):
+        self.logger.setLevel(logging.INFO)
+        while not self.wait(0):
+            self.logger.info("succubus test running")
+            self.heartbeat()
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'])
+    daemon.enable_status_file = True
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+import unittest2
+
+from succubus.statusfile import read
+
+
+class SighupDaemonTests(unittest2.TestCase):
+    daemon = "./src/integrationtest/python/sighup_daemon.py"
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        self.status_file = os.path.join(self.temp_dir, 'succubus.status')
+        os.environ['PID_FILE'] = self.pid_file
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_sighup_storm_does_not_block_logging_daemon(self):
+        subprocess.check_call([self.daemon, "start"])
+        try:
+            with open(self.pid_file) as pid_file:
+                pid = int(pid_file.readline())
+            for _ in range(200):
+                os.kill(pid, signal.SIGHUP)
+                time.sleep(0.002)
+            time.sleep(0.5)
+            before = read(self.status_file)
+            time.sleep(0.5)
+            after = read(self.status_file)
+        finally:
+            subprocess.check_call([self.daemon, "stop"])
+
+        self.assertGreater(before['counters']['reloads'], 0)
+        self.assertGreater(after['iterations'], before['iterations'])
+
+
+if __name__ == "__main__":
+    unittest2.main()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+"""A daemon that counts its loop iterations and "requests" in its status file"""
+from __future__ import print_function, absolute_import, division
+
+import os
+import sys
+
+from succubus import Daemon
+
+
+class MyDaemon(Daemon):
+    def run(self):
+        requests = self.status_counter('requests')
+        while not self.wait(0.01):
+            self.heartbeat()
+            requests.inc(2)
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'])
+    daemon.enable_status_file = True
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest2
+
+from succubus.statusfile import read
+
+
+class StatusFileDaemonTests(unittest2.TestCase):
+    daemon = "./src/integrationtest/python/statusfile_daemon.py"
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        self.status_file = os.path.join(self.temp_dir, 'succubus.status')
+        os.environ['PID_FILE'] = self.pid_file
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_verbose_status_reads_status_file(self):
+        subprocess.check_call([self.daemon, "start"])
+        time.sleep(1.5)
+
+        process = subprocess.Popen([self.daemon, "status", "--verbose"],
+                                   stdout=subprocess.PIPE, universal_newlines=True)
+        output = process.communicate()[0]
+        status = read(self.status_file)
+        subprocess.check_call([self.daemon, "stop"])
+
+        self.assertEqual(process.returncode, 0)
+        iterations = int(re.search(r"Loop iterations: (\d+)", output).group(1))
+        self.assertGreater(iterations, 10)
+        self.assertIn("Last heartbeat: 0.0 seconds ago", output)
+        self.assertIn("Resident memory:", output)
+        self.assertIn("requests:", output)
+        # notify_ready() sends one heartbeat before run() is called.
+        self.assertGreaterEqual(status['counters']['requests'], 2 * (iterations - 1))
+        self.assertFalse(os.path.exists(self.status_file))
+
+
+if __name__ == "__main__":
+    unittest2.main()
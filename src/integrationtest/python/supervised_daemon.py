@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""A supervised daemon that crashes the first $CRASHES times it runs
+
+Every run appends a line to $RUN_FILE. If $CONTROL_SOCKET is set, the daemon
+serves a control socket and shutdown() takes longer than shutdown_timeout.
+"""
+from __future__ import print_function, absolute_import, division
+
+import os
+import sys
+import time
+
+from succubus import Daemon
+
+
+class MyDaemon(Daemon):
+    def run(self):
+        with open(os.environ['RUN_FILE'], 'a+') as run_file:
+            run_file.write('run\n')
+            run_file.seek(0)
+            runs = len(run_file.readlines())
+        if runs <= int(os.environ['CRASHES']):
+            raise RuntimeError("Crash number %d" % runs)
+        self.wait()
+
+    def shutdown(self):
+        if self.enable_control_socket:
+            time.sleep(2)
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'])
+    daemon.supervise = True
+    daemon.restart_backoff = 0.1
+    daemon.restart_limit = 3
+    daemon.enable_control_socket = bool(os.environ.get('CONTROL_SOCKET'))
+    daemon.shutdown_timeout = 1
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
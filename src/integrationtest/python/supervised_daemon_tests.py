@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import os
+import psutil
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest2
+
+
+class SupervisedDaemonTests(unittest2.TestCase):
+    daemon = "./src/integrationtest/python/supervised_daemon.py"
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        self.run_file = os.path.join(self.temp_dir, 'runs')
+        os.environ['PID_FILE'] = self.pid_file
+        os.environ['RUN_FILE'] = self.run_file
+        os.environ['CONTROL_SOCKET'] = ''
+
+    def tearDown(self):
+        del os.environ['CONTROL_SOCKET']
+        shutil.rmtree(self.temp_dir)
+
+    def count_runs(self):
+        with open(self.run_file) as run_file:
+            return len(run_file.readlines())
+
+    def status(self):
+        process = subprocess.Popen([self.daemon, "status"], stdout=subprocess.PIPE,
+                                   universal_newlines=True)
+        output = process.communicate()[0]
+        return process.returncode, output
+
+    def test_crashed_daemon_is_restarted(self):
+        os.environ['CRASHES'] = '2'
+        subprocess.check_call([self.daemon, "start"])
+
+        time.sleep(1)
+        returncode, output = self.status()
+        subprocess.check_call([self.daemon, "stop"])
+
+        self.assertEqual(self.count_runs(), 3)
+        self.assertEqual(returncode, 0)
+        self.assertIn("restarted 2 times, last exit: exit code 1", output)
+        self.assertFalse(os.path.exists(self.pid_file))
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'succubus.supervisor')))
+
+    def test_control_socket_reports_and_stops_supervisor(self):
+        os.environ['CRASHES'] = '0'
+        os.environ['CONTROL_SOCKET'] = '1'
+        subprocess.check_call([self.daemon, "start"])
+
+        time.sleep(0.5)
+        with open(self.pid_file) as pid_file:
+            supervisor = psutil.Process(int(pid_file.readline()))
+        processes = [supervisor] + supervisor.children()
+        returncode, output = self.status()
+        # shutdown() takes too long, the supervisor kills the child and
+        # exits instead of restarting it.
+        subprocess.check_call([self.daemon, "stop"])
+
+        self.assertEqual(returncode, 0)
+        self.assertIn("(pid  %d) is running" % supervisor.pid, output)
+        self.assertEqual(len(processes), 2)
+        self.assertEqual(self.count_runs(), 1)
+        self.assertFalse(os.path.exists(self.pid_file))
+        time.sleep(0.1)
+        for process in processes:
+            self.assertFalse(process.is_running() and
+                             process.status() != psutil.STATUS_ZOMBIE)
+
+    def test_supervisor_gives_up_on_crash_loop(self):
+        os.environ['CRASHES'] = '100'
+        subprocess.check_call([self.daemon, "start"])
+
+        time.sleep(2)
+        returncode, output = self.status()
+
+        # The first run and three restarts.
+        self.assertEqual(self.count_runs(), 4)
+        self.assertEqual(returncode, 3)
+        self.assertIn("Supervisor gave up after 3 restarts, last exit: exit code 1", output)
+        self.assertFalse(os.path.exists(self.pid_file))
+
+
+if __name__ == "__main__":
+    unittest2.main()
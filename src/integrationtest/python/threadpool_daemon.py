@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""A daemon that handles an endless stream of numbers on two threads
+
+Every number is logged to $WORK_FILE when it is fetched and again when it
+was handled, which takes 100 milliseconds.
+"""
+from __future__ import print_function, absolute_import, division
+
+import itertools
+import os
+import sys
+import threading
+import time
+
+from succubus import ThreadPoolDaemon
+
+
+class MyDaemon(ThreadPoolDaemon):
+    def __init__(self, *args, **kwargs):
+        super(MyDaemon, self).__init__(*args, **kwargs)
+        self.numbers = itertools.count()
+        self.lock = threading.Lock()
+
+    def log(self, line):
+        with self.lock:
+            with open(os.environ['WORK_FILE'], 'a') as work_file:
+                work_file.write(line + '\n')
+
+    def get_work(self):
+        number = next(self.numbers)
+        self.log('fetched %d' % number)
+        return number
+
+    def handle(self, item):
+        time.sleep(0.1)
+        self.log('handled %d' % item)
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'], threads=2, queue_size=4)
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
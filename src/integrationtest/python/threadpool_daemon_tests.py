@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest2
+
+
+class ThreadPoolDaemonTests(unittest2.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        self.work_file = os.path.join(self.temp_dir, 'work')
+        os.environ['PID_FILE'] = self.pid_file
+        os.environ['WORK_FILE'] = self.work_file
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def read_work_log(self):
+        fetched, handled = set(), set()
+        with open(self.work_file) as work_file:
+            for line in work_file:
+                action, number = line.split()
+                (fetched if action == 'fetched' else handled).add(int(number))
+        return fetched, handled
+
+    def test_fetched_work_is_handled_before_exit(self):
+        daemon = "./src/integrationtest/python/threadpool_daemon.py"
+        subprocess.check_call([daemon, "start"])
+
+        time.sleep(0.5)
+        subprocess.check_call([daemon, "stop"])
+
+        fetched, handled = self.read_work_log()
+        # Two threads need 100 ms per item, at most 2 + 4 are in flight.
+        self.assertGreater(len(handled), 4)
+        self.assertLess(len(fetched), len(handled) + 7)
+        self.assertEqual(fetched, handled)
+        self.assertFalse(os.path.exists(self.pid_file))
+
+
+if __name__ == "__main__":
+    unittest2.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""A daemon with a watchdog that hangs during its first run
+
+Every run appends a line to $RUN_FILE, the log goes to $LOG_FILE. The daemon
+is supervised unless $SUPERVISE is empty.
+"""
+from __future__ import print_function, absolute_import, division
+
+import logging
+import os
+import sys
+import time
+
+from succubus import Daemon
+
+
+class MyDaemon(Daemon):
+    def setup_logging(self):
+        super(MyDaemon, self).setup_logging()
+        self.logger.addHandler(logging.FileHandler(os.environ['LOG_FILE']))
+
+    def run(self):
+        with open(os.environ['RUN_FILE'], 'a+') as run_file:
+            run_file.write('run\n')
+            run_file.seek(0)
+            runs = len(run_file.readlines())
+        for _ in range(3):
+            self.heartbeat()
+            self.wait(0.1)
+        if runs == 1:
+            self.hang_forever()
+        while not self.wait(0.1):
+            self.heartbeat()
+
+    def hang_forever(self):
+        time.sleep(3600)
+
+
+def main():
+    daemon = MyDaemon(pid_file=os.environ['PID_FILE'])
+    daemon.supervise = bool(os.environ.get('SUPERVISE'))
+    daemon.watchdog_interval = 0.5
+    daemon.restart_backoff = 0.1
+    sys.exit(daemon.action())
+
+
+if __name__ == '__main__':
+    main()
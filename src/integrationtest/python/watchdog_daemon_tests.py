@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+from __future__ import print_function, absolute_import, division
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest2
+
+
+class WatchdogDaemonTests(unittest2.TestCase):
+    daemon = "./src/integrationtest/python/watchdog_daemon.py"
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+        self.run_file = os.path.join(self.temp_dir, 'runs')
+        self.log_file = os.path.join(self.temp_dir, 'daemon.log')
+        os.environ['PID_FILE'] = self.pid_file
+        os.environ['RUN_FILE'] = self.run_file
+        os.environ['LOG_FILE'] = self.log_file
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def read(self, path):
+        with open(path) as the_file:
+            return the_file.read()
+
+    def status(self):
+        process = subprocess.Popen([self.daemon, "status"], stdout=subprocess.PIPE,
+                                   universal_newlines=True)
+        output = process.communicate()[0]
+        return process.returncode, output
+
+    def test_hung_daemon_is_restarted_with_stacks_logged(self):
+        os.environ['SUPERVISE'] = '1'
+        subprocess.check_call([self.daemon, "start"])
+
+        time.sleep(2.5)
+        returncode, output = self.status()
+        subprocess.check_call([self.daemon, "stop"])
+
+        self.assertEqual(self.read(self.run_file).count('run'), 2)
+        self.assertEqual(returncode, 0)
+        self.assertIn("restarted 1 times, last exit: killed by SIGABRT", output)
+        log = self.read(self.log_file)
+        self.assertIn("sent no heartbeat", log)
+        self.assertIn("hang_forever", log)
+
+    def test_unsupervised_hung_daemon_kills_itself(self):
+        os.environ['SUPERVISE'] = ''
+        subprocess.check_call([self.daemon, "start"])
+
+        time.sleep(2)
+        returncode, _ = self.status()
+
+        self.assertNotEqual(returncode, 0)
+        log = self.read(self.log_file)
+        self.assertIn("No heartbeat for", log)
+        self.assertIn("hang_forever", log)
+
+
+if __name__ == "__main__":
+    unittest2.main()
@@ -1,6 +1,35 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import sys
+
 from succubus.daemonize import Daemon
 
-__all__ = ['Daemon']
+__all__ = ['Daemon', 'PreforkDaemon', 'QueueingHandler', 'RateLimitFilter',
+           'ThreadPoolDaemon']
+
+if sys.version_info >= (3, 7):
+    __all__.append('AsyncDaemon')
+
+    # Import everything but Daemon on first access: asyncio and logging
+    # would add tens of milliseconds to every invocation of an init script.
+    _LAZY_IMPORTS = {
+        'AsyncDaemon': 'succubus.asyncdaemon',
+        'PreforkDaemon': 'succubus.prefork',
+        'QueueingHandler': 'succubus.handlers',
+        'RateLimitFilter': 'succubus.filters',
+        'ThreadPoolDaemon': 'succubus.threadpool',
+    }
+
+    def __getattr__(name):
+        if name not in _LAZY_IMPORTS:
+            raise AttributeError("module %r has no attribute %r" % (__name__, name))
+        import importlib
+        value = getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+        globals()[name] = value
+        return value
+else:
+    from succubus.filters import RateLimitFilter
+    from succubus.handlers import QueueingHandler
+    from succubus.prefork import PreforkDaemon
+    from succubus.threadpool import ThreadPoolDaemon
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import asyncio
+import time
+
+from signal import SIGTERM, SIGINT, SIGHUP
+
+from succubus.daemonize import Daemon
+
+
+class AsyncDaemon(Daemon):
+    """Daemon whose run() and shutdown() are coroutines
+
+    run() is executed in an asyncio event loop. SIGTERM is handled by the
+    event loop: all tasks get cancelled, then shutdown() is awaited.
+    Together this has to finish within self.shutdown_timeout. SIGHUP calls
+    self.reload() in the event loop.
+    """
+
+    def _run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        loop = asyncio.get_running_loop()
+        self.stop_requested = asyncio.Event()
+        for signo in (SIGTERM, SIGINT):
+            loop.add_signal_handler(signo, self._request_stop)
+        loop.add_signal_handler(SIGHUP, self.reload)
+
+        if not self.wait_for_ready:
+            self.notify_ready()
+        run_task = loop.create_task(self.run())
+        stop_task = loop.create_task(self.stop_requested.wait())
+        try:
+            await asyncio.wait([run_task, stop_task],
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            deadline = time.time() + self.shutdown_timeout
+            await self._cancel_tasks(deadline)
+            try:
+                await asyncio.wait_for(self.shutdown(),
+                                       max(deadline - time.time(), 0))
+            except asyncio.TimeoutError:
+                self.logger.error("shutdown() did not finish within %s seconds",
+                                  self.shutdown_timeout)
+            except Exception:
+                self.logger.exception("Error in daemon shutdown:")
+        if (run_task.done() and not run_task.cancelled() and
+                run_task.exception() is not None):
+            raise run_task.exception()
+
+    def _request_stop(self):
+        # Threads started by run() may wait for self.shutdown_requested.
+        self.shutdown_requested.set()
+        self.stop_requested.set()
+
+    async def _cancel_tasks(self, deadline):
+        """Cancel all other tasks and wait for them until deadline"""
+        tasks = [task for task in asyncio.all_tasks()
+                 if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            _, pending = await asyncio.wait(
+                tasks, timeout=max(deadline - time.time(), 0))
+            for task in pending:
+                self.logger.warning("Task %r ignored its cancellation", task)
+
+    def _shutdown(self):
+        # The event loop already awaited self.shutdown().
+        deadline = time.time() + self.shutdown_timeout
+        self._stop_process_pool(deadline)
+        self._cleanup(deadline)
+
+    async def run(self):
+        """Placeholder for later overwriting"""
+        raise NotImplementedError
+
+    async def shutdown(self):
+        """Clean up when daemon is about to terminate
+
+        Unlike Daemon.shutdown(), this is a coroutine. All other tasks have
+        already been cancelled when it is awaited.
+        """
+        pass
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Layered configuration files with a cache of their parsed contents
+
+load() reads JSON or YAML files in order, later files overriding earlier
+ones, then applies overrides from environment variables. Parsing large
+files is slow, so the parsed contents are kept in a cache file (written
+with marshal), keyed by path, modification time and size. Files that did
+not change are not parsed again.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import json
+import marshal
+import os
+import sys
+import time
+
+# Files modified more recently than this are not cached: a change within
+# the same timestamp tick that keeps the size would go unnoticed.
+_RACY_SECONDS = 2
+
+
+def merge(base, override):
+    """Return base updated with override, merging nested dicts"""
+    result = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = merge(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+def apply_env(config, prefix, environ=None):
+    """Return config overridden by environment variables starting with prefix
+
+    FOO_DB__HOST=example.com with prefix 'FOO_' sets config['db']['host'].
+    Values are parsed as JSON if possible (numbers, booleans, lists), and
+    used as strings otherwise.
+    """
+    if environ is None:
+        environ = os.environ
+    for name, value in sorted(environ.items()):
+        if not name.startswith(prefix) or name == prefix:
+            continue
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        keys = name[len(prefix):].lower().split('__')
+        override = value
+        for key in reversed(keys):
+            override = {key: override}
+        config = merge(config, override)
+    return config
+
+
+def _parse(path):
+    with open(path, 'rb') as config_file:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            data = yaml.safe_load(config_file) or {}
+        else:
+            data = json.loads(config_file.read().decode('utf-8'))
+    if not isinstance(data, dict):
+        raise ValueError("%s does not contain a mapping" % path)
+    return data
+
+
+def _read_cache(cache_file):
+    try:
+        with open(cache_file, 'rb') as cache:
+            version, entries = marshal.load(cache)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return {}
+    # The marshal format may change between Python versions.
+    if version != sys.hexversion or not isinstance(entries, dict):
+        return {}
+    return entries
+
+
+def _write_cache(cache_file, entries):
+    temp_file = '%s.%d.tmp' % (cache_file, os.getpid())
+    try:
+        with open(temp_file, 'wb') as cache:
+            marshal.dump((sys.hexversion, entries), cache)
+        os.rename(temp_file, cache_file)
+    except (IOError, OSError):
+        # A read-only directory only costs us the cache.
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+
+
+def _mtime_ns(stat):
+    """Return st_mtime_ns, which os.stat() results lack on Python 2"""
+    mtime_ns = getattr(stat, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(stat.st_mtime * 1e9)
+    return mtime_ns
+
+
+def load_files(paths, cache_file=None):
+    """Parse the files in paths and merge them, later ones take precedence
+
+    Files ending in .yaml or .yml are YAML (which needs PyYAML), all others
+    JSON. Files that do not exist are skipped, so optional layers (e.g.
+    local overrides) can simply be listed.
+    """
+    cache = _read_cache(cache_file) if cache_file else {}
+    new_cache = {}
+    config = {}
+    now = time.time()
+    for path in paths:
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        key = [_mtime_ns(stat), stat.st_size]
+        entry = cache.get(path)
+        if entry is not None and entry[0] == key:
+            data = entry[1]
+        else:
+            data = _parse(path)
+        if now - stat.st_mtime >= _RACY_SECONDS:
+            try:
+                marshal.dumps(data)
+            except ValueError:
+                # E.g. dates in YAML, which marshal cannot store.
+                pass
+            else:
+                new_cache[path] = [key, data]
+        config = merge(config, data)
+    if cache_file and new_cache != cache:
+        _write_cache(cache_file, new_cache)
+    return config
+
+
+def load(paths, env_prefix=None, cache_file=None):
+    """Load layered configuration files, then apply environment overrides"""
+    config = load_files(paths, cache_file)
+    if env_prefix:
+        config = apply_env(config, env_prefix)
+    return config
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Request/response protocol of the daemon's unix domain control socket
+
+A client connects, sends one JSON object terminated by a newline, e.g.
+{"command": "status", "args": []}, and reads one JSON line back: either
+{"ok": true, "result": ...} or {"ok": false, "error": "..."}.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import json
+import os
+import socket
+import threading
+
+MAX_MESSAGE_SIZE = 65536
+
+
+class ControlError(Exception):
+    """The daemon answered a control request with an error"""
+
+
+def _read_line(conn):
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+        if len(data) > MAX_MESSAGE_SIZE:
+            raise ValueError("Control message too long")
+    return data.decode('utf-8')
+
+
+class ControlServer(object):
+    """Serve control requests on a unix domain socket in a background thread
+
+    commands maps command names to callables. They are called with the
+    "args" of the request and must return something JSON serializable.
+    """
+
+    def __init__(self, path, commands):
+        self.path = path
+        self.commands = commands
+        self._inode = None
+        self._sock = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            # Left behind by a crashed daemon, or by the predecessor during
+            # a zero-downtime restart.
+            os.remove(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # The daemon runs with umask 0. Create the socket accessible to its
+        # user only, instead of fixing the mode after anyone could connect.
+        old_umask = os.umask(0o077)
+        try:
+            self._sock.bind(self.path)
+        finally:
+            os.umask(old_umask)
+        self._inode = os.stat(self.path).st_ino
+        self._sock.listen(16)
+        thread = threading.Thread(target=self._serve, args=(self._sock,),
+                                  name='succubus-control')
+        thread.daemon = True
+        thread.start()
+
+    def _serve(self, sock):
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except (OSError, socket.error):
+                # The socket was closed by stop().
+                return
+            try:
+                conn.settimeout(1)
+                conn.sendall(self.handle(_read_line(conn)).encode('utf-8'))
+            except Exception:
+                pass
+            finally:
+                conn.close()
+
+    def handle(self, line):
+        """Execute the request in line, return the response line"""
+        try:
+            request = json.loads(line)
+            name = request['command']
+            if name not in self.commands:
+                raise ControlError('Unknown command: %s' % name)
+            result = self.commands[name](*request.get('args', []))
+            response = {'ok': True, 'result': result}
+        except Exception as e:
+            response = {'ok': False, 'error': '%s: %s' % (type(e).__name__, e)}
+        return json.dumps(response) + '\n'
+
+    def stop(self):
+        """Close the socket and remove it, unless a successor replaced it"""
+        if self._sock is None:
+            return
+        try:
+            # Wakes up the thread blocked in accept().
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except (OSError, socket.error):
+            pass
+        self._sock.close()
+        self._sock = None
+        try:
+            if os.stat(self.path).st_ino == self._inode:
+                os.remove(self.path)
+        except OSError:
+            pass
+
+
+def request(path, command, args=(), timeout=5):
+    """Send a request to the control socket at path, return the result
+
+    Raises socket.error if nobody listens on path and ControlError if the
+    daemon reports an error.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.settimeout(timeout)
+        conn.connect(path)
+        message = json.dumps({'command': command, 'args': list(args)}) + '\n'
+        conn.sendall(message.encode('utf-8'))
+        response = json.loads(_read_line(conn))
+    finally:
+        conn.close()
+    if not response['ok']:
+        raise ControlError(response['error'])
+    return response['result']
@@ -3,18 +3,126 @@
 
 from __future__ import print_function, absolute_import, division
 
-from logging.handlers import SysLogHandler
-import logging
 import os
 import signal
 import sys
 import time
 import atexit
-import psutil
+import errno
+import fcntl
+import gc
+import select
+import socket
+import threading
 
 from pwd import getpwnam
 from grp import getgrnam
-from signal import SIGTERM, SIGKILL
+from signal import SIGTERM, SIGKILL, SIGUSR1, SIGUSR2, SIGHUP
+
+# Only what "status" and "stop" need is imported at module level. Logging,
+# the control socket and the metrics HTTP server are imported when they are
+# set up, so that the init script runs without the cost of importing them.
+from succubus.events import PipeEvent, wait_for_any
+from succubus.metrics import Registry, process_collector
+
+
+def _pidfd_open(pid):
+    """Return a pidfd for pid, or None if the platform does not support it"""
+    try:
+        return os.pidfd_open(pid)
+    except AttributeError:
+        return None
+    except OSError as err:
+        if err.errno == errno.ENOSYS:
+            return None
+        raise
+
+
+def _pid_exists(pid):
+    """Return True if a process with this pid exists
+
+    Signal 0 only checks whether the process could be signalled. EPERM
+    means it exists, but belongs to another user.
+    """
+    if pid <= 0:
+        # os.kill() would signal a whole process group.
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError as err:
+        return err.errno == errno.EPERM
+    return True
+
+
+def _process_start_time(pid):
+    """Return the start time of process pid in clock ticks since boot
+
+    Together with the pid, this identifies a process even after the pid has
+    been reused. Returns None if the process does not exist or /proc is not
+    available.
+    """
+    try:
+        with open('/proc/%d/stat' % pid) as fp:
+            stat = fp.read()
+    except (IOError, OSError):
+        return None
+    # The command name in parentheses may contain spaces, starttime is the
+    # 20th field after it.
+    return int(stat.rsplit(')', 1)[1].split()[19])
+
+
+def _parse_pid_file(content):
+    """Return (pid, start time) from the content of a pid file
+
+    The first line holds the pid, so "kill $(head -1 foo.pid)" keeps
+    working. Either value is None if it is missing.
+    """
+    lines = content.split()
+    pid = int(lines[0]) if lines else None
+    start_time = None
+    for line in lines[1:]:
+        if line.startswith('start_time='):
+            start_time = int(line[len('start_time='):])
+    return pid, start_time
+
+
+def _try_lock(fd, operation):
+    """flock() without blocking, return False if the lock is held elsewhere"""
+    try:
+        fcntl.flock(fd, operation | fcntl.LOCK_NB)
+    except (IOError, OSError) as err:
+        if err.errno in (errno.EAGAIN, errno.EACCES):
+            return False
+        raise
+    return True
+
+
+def _set_inheritable(fd):
+    """Keep fd open across exec(), also where os.set_inheritable() is missing"""
+    set_inheritable = getattr(os, 'set_inheritable', None)
+    if set_inheritable is not None:
+        set_inheritable(fd, True)
+    else:
+        # Python 2 has no os.set_inheritable(), but sockets may still be
+        # created with FD_CLOEXEC.
+        flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+        fcntl.fcntl(fd, fcntl.F_SETFD, flags & ~fcntl.FD_CLOEXEC)
+
+
+def _parse_listen_fds(value):
+    """Parse "name=fd,name=fd" as passed on by a zero-downtime restart"""
+    fds = {}
+    for item in value.split(','):
+        if item:
+            name, fd = item.rsplit('=', 1)
+            fds[name] = int(fd)
+    return fds
+
+
+def _freeze_heap():
+    """Move all objects to the permanent generation before forking"""
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
 
 
 class Daemon(object):
@@ -25,23 +133,322 @@ class Daemon(object):
                  stdin='/dev/null',
                  stdout='/dev/null',
                  stderr='/dev/null'):
+        # Loaded on first access of self.config, see load_configuration().
+        self._config = {}
+        # (thread, config) while reload() loads a new configuration, which
+        # only that thread sees as self.config until it is validated.
+        self._pending_config = None
+        # Metrics of the daemon, exposed via the "metrics" control command
+        # and, if metrics_address is set to a (host, port) tuple or the path
+        # of a unix domain socket, over HTTP in the Prometheus text format.
+        # Created before the usage check, so that subclasses can always
+        # register their metrics.
+        self.metrics = Registry()
         if len(sys.argv) == 1:
             self.param1 = None
             return
+        self._config = None
         self.param1 = sys.argv.pop(1)
+        # Command line for re-executing the daemon on a zero-downtime restart.
+        self._argv = [os.path.abspath(sys.argv[0])] + sys.argv[1:]
 
         self.stdin = os.path.abspath(stdin)
         self.stdout = os.path.abspath(stdout)
         self.stderr = os.path.abspath(stderr)
-        self.config = {}
-        self.load_configuration()
-        self.user = self.config.get('user')
-        self.group = self.config.get('group')
+        # Default to self.config['user'] and self.config['group'] on start.
+        self.user = None
+        self.group = None
         if not pid_file:
             raise Exception("You did not provide a pid file")
         self.pid_file = os.path.abspath(pid_file)
+        # JSON or YAML files read by the default load_configuration(), later
+        # ones override earlier ones. Environment variables starting with
+        # config_env_prefix override them. Parsed files are cached in
+        # config_cache_file, see succubus.config.
+        self.config_files = []
+        self.config_env_prefix = None
+        self.config_cache_file = os.path.splitext(self.pid_file)[0] + '.config-cache'
         self.pid = None
+        # Start time of self.pid as recorded in the pid file, see
+        # _process_start_time().
+        self.pid_start_time = None
+        # The daemon keeps its pid file open and flock()ed while it runs.
+        self._pid_file_fd = None
         self.shutdown_timeout = 10
+        # Seconds the last reliable_kill() had to wait for the daemon to exit.
+        self.shutdown_duration = None
+        # "start" waits this many seconds for the daemon to become ready.
+        self.startup_timeout = 10
+        # Seconds between forking and the daemon becoming ready.
+        self.startup_duration = None
+        # If True, run() must call self.notify_ready() itself.
+        self.wait_for_ready = False
+        self._ready_fd = None
+        # The QueueingHandler and RateLimitFilter installed by the default
+        # setup_logging().
+        self.log_handler = None
+        self.log_filter = None
+        # Set when SIGTERM is received. run() loops should check it, or
+        # sleep with self.wait() instead of time.sleep().
+        self.shutdown_requested = PipeEvent()
+        # Set by SIGHUP and SIGUSR1. Reloading and toggling the profiler log
+        # and take locks, which a signal handler must not do, so they run
+        # in the succubus-signals thread, see _serve_signals().
+        self._reload_requested = PipeEvent()
+        self._profile_requested = PipeEvent()
+        # SIGHUP and the "reload" control command may overlap.
+        self._reload_lock = threading.Lock()
+        # If True, SIGTERM raises an exception in the main thread instead,
+        # wherever it happens to be (the behaviour of older versions).
+        self.raise_on_sigterm = False
+        # Created on first use of self.scheduler.
+        self._scheduler = None
+        # If True, the daemon process only supervises: run() is called in a
+        # child process, which is restarted when it crashes, after
+        # restart_backoff seconds, doubling up to restart_backoff_max
+        # seconds for repeated crashes. After more than restart_limit
+        # restarts within restart_window seconds, the supervisor gives up.
+        # See succubus.supervisor.
+        self.supervise = False
+        self.restart_backoff = 1
+        self.restart_backoff_max = 60
+        self.restart_limit = 5
+        self.restart_window = 300
+        self.supervisor_state_file = os.path.splitext(self.pid_file)[0] + '.supervisor'
+        self._supervisor = None
+        # Pid of the supervisor, set in the supervised child.
+        self._supervisor_pid = None
+        # If set, the daemon must call self.heartbeat() at least every
+        # watchdog_interval seconds once it is ready. Otherwise it is
+        # considered hung: the stacks of all threads are logged and it is
+        # killed (and restarted, if supervised). Under systemd, this
+        # defaults to WatchdogSec, see succubus.watchdog.
+        watchdog_usec = os.environ.get('WATCHDOG_USEC')
+        self.watchdog_interval = int(watchdog_usec) / 1e6 if watchdog_usec else None
+        self._heartbeat = None
+        # If True, the running daemon keeps its heartbeat, loop iterations,
+        # queue depth, resident memory and the counters returned by
+        # status_counter() in a memory-mapped file next to the pid file,
+        # shown by "status --verbose". See succubus.statusfile.
+        self.enable_status_file = False
+        self.status_file = os.path.splitext(self.pid_file)[0] + '.status'
+        self._status = None
+        # SIGUSR1 (or the "profile" control command) starts a sampling
+        # profiler, the next one stops it and writes the collapsed stacks
+        # to profile_file(). See succubus.profiler.
+        self.profile_interval = 0.01
+        self._profiler = None
+        # Worker processes of self.process_pool, default: one per CPU.
+        self.pool_processes = None
+        # gc.set_threshold() arguments for forked workers (PreforkDaemon
+        # workers and self.process_pool), e.g. (50000, 50, 50) to collect
+        # less often. None keeps the interpreter's defaults.
+        self.worker_gc_threshold = None
+        self._process_pool = None
+        self.metrics.add_collector(process_collector(lambda: self.started_at))
+        self.restarts = self.metrics.counter(
+            'succubus_restarts_total', 'Processes restarted by succubus.')
+        self.reload_duration = self.metrics.histogram(
+            'succubus_reload_duration_seconds',
+            'Time taken to load, validate and apply a new configuration.')
+        self.reload_failures = self.metrics.counter(
+            'succubus_reload_failures_total',
+            'Reloads that kept the old configuration.')
+        self.metrics_address = None
+        self._metrics_server = None
+        # If True, the daemon serves status/stop/reload/stats requests (and
+        # everything added with register_command()) on a unix domain socket
+        # next to the pid file.
+        self.enable_control_socket = False
+        self.control_socket_path = os.path.splitext(self.pid_file)[0] + '.sock'
+        self.control_commands = {
+            'status': self._control_status,
+            'stop': self._control_stop,
+            'reload': self._control_reload,
+            'stats': self._control_stats,
+            'metrics': self.metrics.to_dict,
+            'profile': self._control_profile,
+        }
+        self._control_server = None
+        # When the daemon process started serving (time.time()).
+        self.started_at = None
+        # "start" records how to control the daemon in registry_dir, for
+        # the succubus command (see succubus.fleet), if the directory
+        # exists. The name must be unique on the host.
+        self.name = os.path.splitext(os.path.basename(self.pid_file))[0]
+        self.registry_dir = os.environ.get('SUCCUBUS_REGISTRY',
+                                           '/var/lib/succubus/registry')
+        # If True, "restart" hands the listening sockets over to a new
+        # process instead of doing "stop" and "start".
+        self.zero_downtime_restart = False
+        # Maps name -> socket for everything created with listen_socket().
+        self.listeners = {}
+        self._inherited_fds = _parse_listen_fds(
+            os.environ.pop('SUCCUBUS_LISTEN_FDS', ''))
+        self._handover_pid = os.environ.pop('SUCCUBUS_HANDOVER_PID', None)
+        if self._handover_pid is not None:
+            self._handover_pid = int(self._handover_pid)
+
+    @property
+    def config(self):
+        pending = self._pending_config
+        if pending is not None and pending[0] is threading.current_thread():
+            return pending[1]
+        if self._config is None:
+            # load_configuration() may refer to self.config itself.
+            self._config = {}
+            self.load_configuration()
+        return self._config
+
+    @config.setter
+    def config(self, config):
+        pending = self._pending_config
+        if pending is not None and pending[0] is threading.current_thread():
+            self._pending_config = (pending[0], config)
+        else:
+            self._config = config
+
+    @property
+    def scheduler(self):
+        """Scheduler for periodic jobs, see succubus.scheduler
+
+        Add jobs with self.scheduler.every() or self.scheduler.cron() and
+        call self.scheduler.run() from run(). It returns when shutdown is
+        requested. Running jobs are finished before shutdown() is called.
+        """
+        if self._scheduler is None:
+            from succubus.scheduler import Scheduler
+            self._scheduler = Scheduler(stop_event=self.shutdown_requested)
+        return self._scheduler
+
+    @property
+    def process_pool(self):
+        """Pool of worker processes for CPU bound work, see succubus.procpool
+
+        Started on first use, which must be in the daemon process (in run()
+        or later), so the workers run with the daemon's user and group.
+        They are stopped after shutdown(), within self.shutdown_timeout.
+        """
+        if self._process_pool is None:
+            if self.started_at is None:
+                raise RuntimeError("The process pool can only be used once "
+                                   "the daemon runs")
+            from succubus.procpool import ProcessPool
+            self._process_pool = ProcessPool(self.pool_processes,
+                                             initializer=self._init_pool_worker)
+            self._process_pool.start()
+        return self._process_pool
+
+    def _init_pool_worker(self):
+        """Called in every worker process of self.process_pool"""
+        self._tune_worker_gc()
+        # A worker outliving the daemon must neither keep it "running" nor
+        # keep "start" waiting for it to become ready.
+        if self._ready_fd is not None:
+            os.close(self._ready_fd)
+            self._ready_fd = None
+        if self._pid_file_fd is not None:
+            os.close(self._pid_file_fd)
+            self._pid_file_fd = None
+
+    def preload(self):
+        """Load data that forked workers should share
+
+        Called in the daemon process before run(), and before any worker
+        (of PreforkDaemon or self.process_pool) is forked. Everything that
+        exists afterwards is frozen with gc.freeze() (Python 3.7+), so the
+        garbage collector in the workers does not write to those objects,
+        and the memory pages holding them stay shared with the master
+        instead of being copied into every worker.
+        """
+        pass
+
+    def _preload(self):
+        # Collections during preload() would free memory that later
+        # allocations reuse, scattering new objects across pages that
+        # should stay shared.
+        gc.disable()
+        try:
+            self.preload()
+        finally:
+            _freeze_heap()
+            gc.enable()
+
+    def _tune_worker_gc(self):
+        if self.worker_gc_threshold is not None:
+            gc.set_threshold(*self.worker_gc_threshold)
+
+    def heartbeat(self):
+        """Tell the watchdog that the daemon is not hung
+
+        Call this at least every self.watchdog_interval seconds, from the
+        loop that would stop if the daemon hangs. It is cheap enough to be
+        called far more often.
+        """
+        if self._heartbeat is not None:
+            self._heartbeat.beat()
+        if self._status is not None:
+            self._status.beat()
+
+    def status_counter(self, name):
+        """Return the counter name (at most 24 bytes) in the status file
+
+        The counter has inc(amount=1) and set(value) methods, which write
+        to shared memory only. Available once the daemon is started; without
+        enable_status_file, the values are just not visible outside.
+        """
+        if self._status is None:
+            raise RuntimeError("The status file is available after start")
+        return self._status.counter(name)
+
+    def profile_file(self):
+        """Return the path the profiler of this process writes to"""
+        return '%s.%d.collapsed' % (os.path.splitext(self.pid_file)[0],
+                                    os.getpid())
+
+    def toggle_profiler(self):
+        """Start the sampling profiler, or stop it and write its output
+
+        Returns True if the profiler is running now.
+        """
+        if self._profiler is not None:
+            self._stop_profiler()
+            return False
+        from succubus.profiler import Profiler
+        self._profiler = Profiler(self.profile_file(), self.profile_interval)
+        self._profiler.start()
+        self.logger.info("Started profiling, output goes to %s",
+                         self._profiler.path)
+        return True
+
+    def _stop_profiler(self):
+        if self._profiler is None:
+            return
+        profiler, self._profiler = self._profiler, None
+        try:
+            profiler.stop()
+        except (IOError, OSError):
+            self.logger.exception("Could not write the profile:")
+        else:
+            self.logger.info("Wrote %d samples to %s", profiler.samples,
+                             profiler.path)
+
+    def queue_depth(self):
+        """Return the number of work items waiting, for the status file
+
+        Called once per second from a background thread.
+        """
+        return 0
+
+    def wait(self, timeout=None):
+        """Sleep until shutdown is requested or timeout seconds have passed
+
+        Returns True if the daemon should shut down, so a run() loop can
+        look like "while not self.wait(1): ...". Unlike time.sleep(), this
+        returns as soon as SIGTERM arrives. Loops that wait with select()
+        or selectors can add self.shutdown_requested to their fds instead.
+        """
+        return self.shutdown_requested.wait(timeout)
 
     def set_gid(self):
         """Change the group of the running process"""
@@ -69,7 +476,7 @@ class Daemon(object):
 
     @staticmethod
     def usage():
-        sys.stdout.write("Usage: %s {start|stop|restart|status}\n" % sys.argv[0])
+        sys.stdout.write("Usage: %s {start|stop|restart|reload|status}\n" % sys.argv[0])
         return 2
 
     def action(self):
@@ -81,11 +488,40 @@ class Daemon(object):
             return self.restart()
         elif self.param1 == 'status':
             return self.status()
+        elif self.param1 == 'reload':
+            return self.reload_running()
         else:
             return self.usage()
 
     def load_configuration(self):
-        """Set up self.config if needed"""
+        """Set up self.config if needed
+
+        Called on first access of self.config, so that actions like "status"
+        and "stop" do not pay for it. Also called by reload() in the running
+        daemon, where self.config starts out as an empty dict that only the
+        reloading thread sees, while run() goes on with the old one. The
+        default implementation loads self.config_files.
+        """
+        if self.config_files or self.config_env_prefix:
+            from succubus import config
+            self.config.update(config.load(self.config_files,
+                                           env_prefix=self.config_env_prefix,
+                                           cache_file=self.config_cache_file))
+
+    def validate_configuration(self, config):
+        """Raise an exception if config must not be used
+
+        Called by reload() before the new configuration is applied.
+        """
+        pass
+
+    def on_config_changed(self, old, new):
+        """Apply a reloaded configuration
+
+        Called by reload() when the configuration has changed. self.config
+        is already the new one. If this raises, the old configuration is
+        restored.
+        """
         pass
 
     def setup_logging(self):
@@ -95,14 +531,40 @@ class Daemon(object):
         to new user/group IDs (if configured). Logging to syslog using the
         root logger is configured by default, you can override this method if
         you want something else.
+
+        Records are handed to syslog by a background thread, so logging never
+        blocks the daemon. self.config['log_queue_size'] (default: 10000)
+        limits the number of queued records, self.config['log_overflow']
+        decides whether to 'drop' (the default) or 'block' when the queue is
+        full. self.log_handler.dropped counts the dropped records.
+
+        To keep log storms from flooding syslog, identical messages (same
+        logger, same format string) are rate limited to
+        self.config['log_rate_limit'] records per second (default: 10) with
+        bursts of up to self.config['log_rate_burst'] records (default: 50).
+        Set log_rate_limit to None to disable this.
         """
+        import logging
+        from logging.handlers import SysLogHandler
+        from succubus.filters import RateLimitFilter
+        from succubus.handlers import QueueingHandler
+
         self.logger = logging.getLogger()
 
         if os.path.exists('/dev/log'):
             handler = SysLogHandler('/dev/log')
         else:
             handler = SysLogHandler()
-        self.logger.addHandler(handler)
+        self.log_handler = QueueingHandler(
+            [handler],
+            capacity=self.config.get('log_queue_size', 10000),
+            overflow=self.config.get('log_overflow', 'drop'))
+        rate = self.config.get('log_rate_limit', 10)
+        if rate is not None:
+            self.log_filter = RateLimitFilter(
+                rate=rate, burst=self.config.get('log_rate_burst', 50))
+            self.log_handler.addFilter(self.log_filter)
+        self.logger.addHandler(self.log_handler)
 
     def shutdown(self):
         """Clean up when daemon is about to terminate
@@ -114,26 +576,78 @@ class Daemon(object):
         pass
 
     def _shutdown(self):
+        if self._supervisor is not None:
+            # run() and shutdown() only ran in the supervised child.
+            self._cleanup(time.time() + self.shutdown_timeout * 0.2)
+            return
+        deadline = time.time() + self.shutdown_timeout
+        self._stop_scheduler(deadline)
         try:
             self.shutdown()
         except Exception:
             self.logger.exception("Error in daemon shutdown:")
-        self.delpid()
+        self._stop_process_pool(deadline)
+        self._cleanup(deadline)
+
+    def _stop_scheduler(self, deadline):
+        """Stop running jobs before shutdown() is called"""
+        if self._scheduler is not None:
+            self._scheduler.stop(max(deadline - time.time(), 0))
+
+    def _stop_process_pool(self, deadline):
+        """Stop the workers after shutdown(), which may still need them"""
+        if self._process_pool is not None:
+            self._process_pool.stop(max(deadline - time.time(), 0))
+            self._process_pool = None
+
+    def _cleanup(self, deadline):
+        """Release everything the framework set up for the daemon process"""
+        if self._control_server is not None:
+            self._control_server.stop()
+        if self._metrics_server is not None:
+            self._metrics_server.stop()
+        if self._supervisor is not None:
+            self._supervisor.close()
+        if self._status is not None:
+            self._status.close()
+        self._stop_profiler()
+        self._delpid_if_owned(os.getpid())
+        self._flush_logging(deadline)
+
+    def _flush_logging(self, deadline):
+        """Ship queued log records, but do not wait beyond deadline"""
+        if self.log_filter is not None:
+            self.log_filter.log_suppressed()
+        if self.log_handler is not None:
+            self.log_handler.close(max(deadline - time.time(), 0))
 
     def daemonize(self):
         """
         Do the UNIX double-fork magic, see Stevens' "Advanced
         Programming in the UNIX Environment" for details (ISBN 0201563177)
         http://www.erlenstar.demon.co.uk/unix/faq_2.html#SEC16
+
+        The invoking process does not exit right away, it waits on a pipe
+        until the daemon calls self.notify_ready() (or fails to start).
         """
+        read_fd, write_fd = os.pipe()
+        start_time = time.time()
         try:
             pid = os.fork()
             if pid > 0:
-                sys.exit(0)
+                os.close(write_fd)
+                retval = self._wait_for_ready(read_fd, start_time)
+                if retval == 0 and self._handover_pid is not None:
+                    # We took over from a running daemon, retire it.
+                    self.pid = self._handover_pid
+                    retval = self.reliable_kill()
+                sys.exit(retval)
         except OSError as e:
             sys.stderr.write('fork #1 failed: %d (%s)\n' %
                              (e.errno, e.strerror))
             sys.exit(1)
+        os.close(read_fd)
+        self._ready_fd = write_fd
         os.chdir('/')
         os.setsid()
         os.umask(0)
@@ -151,39 +665,328 @@ class Daemon(object):
         sys.stdout.close()
         sys.stderr.close()
         os.closerange(0, 3)
+        # Keep fds 0-2 occupied, so that no socket opened later on ends up
+        # there. Those would get clobbered when a zero-downtime restart
+        # hands them over to the next process.
+        null_fd = os.open(os.devnull, os.O_RDWR)
+        _set_inheritable(null_fd)
+        for fd in range(3):
+            if fd != null_fd:
+                os.dup2(null_fd, fd)
 
-        pid = os.getpid()
-        with open(self.pid_file, 'w+') as fp:
-            fp.write("%s\n" % pid)
+        if self._handover_pid is None and not self._write_pid_file():
+            # Another "start" won the race since our _already_running().
+            self.logger.error("Pid file %s is locked by a running daemon",
+                              self.pid_file)
+            sys.exit(1)
+        # Otherwise the previous daemon keeps the pid file until we are
+        # ready, see notify_ready().
 
-        def handler(*args):
-            raise BaseException("SIGTERM was caught")
-        signal.signal(signal.SIGTERM, handler)
+        signal.signal(signal.SIGTERM, self._handle_sigterm)
+        signal.signal(SIGUSR2, self._handover)
+        signal.signal(SIGUSR1, self._handle_sigusr1)
+        signal.signal(SIGHUP, self._handle_sighup)
         # atexit functions are "not called when the program is killed by a
         # signal not handled by Python". But since SIGTERM is now handled, the
         # atexit functions do get called.
         atexit.register(self._shutdown)
 
+    def _handle_sigterm(self, *args):
+        self.shutdown_requested.set()
+        if self.raise_on_sigterm:
+            raise BaseException("SIGTERM was caught")
+
+    def _handle_sighup(self, *args):
+        self._reload_requested.set()
+
+    def _start_signal_thread(self):
+        thread = threading.Thread(target=self._serve_signals,
+                                  name='succubus-signals')
+        thread.daemon = True
+        thread.start()
+
+    def _serve_signals(self):
+        """Do what signal handlers asked for, until shutdown is requested
+
+        A handler interrupts the main thread wherever it is, possibly while
+        it holds a lock that logging needs, so handlers only set a
+        PipeEvent that this thread waits for.
+        """
+        actions = {self._reload_requested: self.reload,
+                   self._profile_requested: self.toggle_profiler}
+        events = list(actions) + [self.shutdown_requested]
+        while True:
+            for event in wait_for_any(events):
+                if event is self.shutdown_requested:
+                    return
+                event.clear()
+                try:
+                    actions[event]()
+                except Exception:
+                    self.logger.exception("Error handling a signal:")
+
+    def _handle_sigusr1(self, *args):
+        self._profile_requested.set()
+
+    def _wait_for_ready(self, read_fd, start_time):
+        """Wait for the readiness message of the daemon, return the exit code
+
+        The daemon writes its pid to the pipe once it is ready. If it dies
+        before that, all write ends get closed and we read EOF.
+        """
+        data = b''
+        deadline = start_time + self.startup_timeout
+        while not data.endswith(b'\n'):
+            remaining = deadline - time.time()
+            if remaining <= 0 or not select.select([read_fd], [], [], remaining)[0]:
+                message = 'Daemon did not become ready within {0} seconds\n'
+                sys.stderr.write(message.format(self.startup_timeout))
+                return 1
+            chunk = os.read(read_fd, 64)
+            if not chunk:
+                sys.stderr.write('Daemon failed to start, see its log for details\n')
+                return 1
+            data += chunk
+        self.startup_duration = time.time() - start_time
+        message = "Daemon (pid {0}) ready after {1:.3f} seconds\n"
+        sys.stdout.write(message.format(int(data), self.startup_duration))
+        return 0
+
+    def notify_ready(self):
+        """Tell the "start" action that the daemon is up and serving
+
+        By default, this happens automatically just before self.run() is
+        called. Set self.wait_for_ready to True and call this from run() once
+        your daemon has finished its own initialisation (e.g. bound its
+        sockets). Calling it more than once is harmless.
+        """
+        if self._ready_fd is None:
+            return
+        if self._handover_pid is not None:
+            # The previous daemon still holds the lock, replace the file
+            # anyway. It stops as soon as "start" sees us ready.
+            self._write_pid_file(replace=True)
+        pid = self._daemon_pid()
+        try:
+            os.write(self._ready_fd, ("%d\n" % pid).encode('ascii'))
+        except OSError:
+            # "start" already gave up waiting.
+            pass
+        finally:
+            os.close(self._ready_fd)
+            self._ready_fd = None
+        if 'NOTIFY_SOCKET' in os.environ:
+            from succubus.watchdog import sd_notify
+            sd_notify('READY=1\nMAINPID=%d' % pid)
+        # Arms the watchdog.
+        self.heartbeat()
+
+    def _daemon_pid(self):
+        """Return the pid that "stop" and "status" know the daemon by
+
+        A supervised daemon is known by the pid of its supervisor, as long
+        as that is alive.
+        """
+        if self._supervisor_pid is not None and os.getppid() == self._supervisor_pid:
+            return self._supervisor_pid
+        return os.getpid()
+
+    def _write_pid_file(self, replace=False):
+        """Atomically create the pid file and keep it locked while we live
+
+        The file is written under a temporary name and locked before it is
+        moved into place, so nobody ever sees it partially written or
+        unlocked. Returns False if the existing pid file is locked by a
+        running daemon, unless replace is True.
+        """
+        pid = os.getpid()
+        content = "%d\n" % pid
+        start_time = _process_start_time(pid)
+        if start_time is not None:
+            content += "start_time=%d\n" % start_time
+        temp_file = "%s.%d.tmp" % (self.pid_file, pid)
+        fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, content.encode('ascii'))
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if replace:
+                os.rename(temp_file, self.pid_file)
+            elif not self._move_to_pid_file(temp_file):
+                os.close(fd)
+                return False
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        self._pid_file_fd = fd
+        return True
+
+    def _move_to_pid_file(self, temp_file):
+        """Move temp_file to self.pid_file unless a running daemon owns that"""
+        while True:
+            try:
+                # Unlike rename(), link() fails if the pid file exists.
+                os.link(temp_file, self.pid_file)
+                return True
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+            try:
+                fd = os.open(self.pid_file, os.O_RDONLY)
+            except OSError as err:
+                if err.errno == errno.ENOENT:
+                    continue
+                raise
+            try:
+                for _ in range(10):
+                    if _try_lock(fd, fcntl.LOCK_EX):
+                        break
+                    # Maybe just "status" probing the lock, try again.
+                    time.sleep(0.01)
+                else:
+                    return False
+                # The pid file is stale. If it is still the file we locked,
+                # nobody else can replace it before we do.
+                try:
+                    if os.stat(self.pid_file).st_ino == os.fstat(fd).st_ino:
+                        os.rename(temp_file, self.pid_file)
+                        return True
+                except OSError as err:
+                    if err.errno != errno.ENOENT:
+                        raise
+            finally:
+                os.close(fd)
+
     def delpid(self):
         """Remove the pid_file from filesystem"""
         os.remove(self.pid_file)
 
+    def _delpid_if_owned(self, pid):
+        """Remove the pid file unless it belongs to another process by now
+
+        After a zero-downtime restart, the pid file names the new daemon
+        while the old one is still shutting down.
+        """
+        try:
+            with open(self.pid_file) as fp:
+                owner = _parse_pid_file(fp.read())[0]
+        except (IOError, ValueError):
+            return
+        if owner is None or owner == pid:
+            self.delpid()
+
+    def listen_socket(self, name, address, family=socket.AF_INET,
+                      type=socket.SOCK_STREAM, backlog=128):
+        """Return a listening socket that survives zero-downtime restarts
+
+        On a normal start, this creates, binds and listens on a new socket.
+        After a zero-downtime restart, the socket registered under the same
+        name by the previous daemon process is inherited instead, so no
+        connection is refused while the daemon is replaced. Call this before
+        notify_ready().
+        """
+        fd = self._inherited_fds.pop(name, None)
+        if fd is not None:
+            sock = socket.fromfd(fd, family, type)
+            os.close(fd)
+        else:
+            sock = socket.socket(family, type)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(address)
+            sock.listen(backlog)
+        self.listeners[name] = sock
+        return sock
+
+    def _handover(self, *args):
+        """SIGUSR2 handler: start a new daemon process that inherits our sockets
+
+        The new process is double-forked so that it does not become our
+        child. It runs "start" in handover mode: it waits until the new
+        daemon is ready and then stops this process.
+        """
+        listen_fds = ','.join('%s=%d' % (name, sock.fileno())
+                              for name, sock in self.listeners.items())
+        env = dict(os.environ)
+        env['SUCCUBUS_LISTEN_FDS'] = listen_fds
+        env['SUCCUBUS_HANDOVER_PID'] = str(os.getpid())
+        args = [sys.executable, self._argv[0], 'start'] + self._argv[1:]
+        pid = os.fork()
+        if pid > 0:
+            os.waitpid(pid, 0)
+            return
+        try:
+            if os.fork() == 0:
+                for sock in self.listeners.values():
+                    _set_inheritable(sock.fileno())
+                os.execve(sys.executable, args, env)
+        finally:
+            os._exit(0)
+
     def _already_running(self):
+        """Return True if the daemon named in the pid file is running
+
+        Sets self.pid and self.pid_start_time. A running daemon holds a lock
+        on its pid file, so a stale pid file is recognized even if its pid
+        has been reused by now.
+        """
+        self.pid = self.pid_start_time = None
         try:
-            self.pid = int(open(self.pid_file).read().strip())
-        except IOError:
-            self.pid = None
+            fd = os.open(self.pid_file, os.O_RDONLY)
+        except OSError:
             return False
-        if psutil.pid_exists(self.pid):
+        try:
+            self.pid, self.pid_start_time = _parse_pid_file(
+                os.read(fd, 4096).decode('ascii'))
+            locked = not _try_lock(fd, fcntl.LOCK_SH)
+        finally:
+            os.close(fd)
+        if locked:
             return True
-        return False
+        if self.pid_start_time is not None:
+            # Written by a daemon that held the lock until it died.
+            return False
+        # Pid file of an older version of succubus, which did not lock it.
+        return self.pid is not None and _pid_exists(self.pid)
+
+    def _register(self):
+        """Write the registry entry read by the succubus command"""
+        if not self.registry_dir or not os.path.isdir(self.registry_dir):
+            return
+        import json
+        entry = {'name': self.name,
+                 'pid_file': self.pid_file,
+                 # Like _handover(): the script need not be executable.
+                 'python': sys.executable,
+                 'command': self._argv,
+                 'status_file': self.status_file if self.enable_status_file else None,
+                 'control_socket': (self.control_socket_path
+                                    if self.enable_control_socket else None)}
+        path = os.path.join(self.registry_dir, self.name + '.json')
+        temp_file = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            with open(temp_file, 'w') as entry_file:
+                json.dump(entry, entry_file)
+            os.rename(temp_file, path)
+        except (IOError, OSError) as err:
+            sys.stderr.write('Could not register in %s: %s\n' % (self.registry_dir, err))
+
+    def _pid_reused(self):
+        """Return True if self.pid now belongs to a different process"""
+        if self.pid_start_time is None:
+            return False
+        start_time = _process_start_time(self.pid)
+        return start_time is not None and start_time != self.pid_start_time
 
     def start(self):
         """Start the daemon"""
-        if self._already_running():
+        if self._handover_pid is None and self._already_running():
             message = 'pid file %s already exists. Daemon already running?\n'
             sys.stderr.write(message % self.pid_file)
             return 0
+        self._register()
+        if self.user is None:
+            self.user = self.config.get('user')
+        if self.group is None:
+            self.group = self.config.get('group')
         self.set_gid()
         self.set_uid()
         # Create log files (if configured) with the new user/group. Creating
@@ -192,36 +995,122 @@ class Daemon(object):
         # Create pid file with new user/group. This ensures we will be able
         # to delete the file when shutting down.
         self.daemonize()
+        from succubus.statusfile import StatusFile
+        self._status = StatusFile(
+            self.status_file if self.enable_status_file else None,
+            os.getpid(), time.time())
+        if self.watchdog_interval is not None:
+            from succubus import watchdog
+            self._heartbeat = watchdog.Heartbeat(self.watchdog_interval)
+            if not self.supervise:
+                watchdog.Watchdog(self).start()
+        if self.supervise:
+            from succubus.supervisor import Supervisor
+            self._supervisor = Supervisor(self)
+            exit_code = self._supervisor.run()
+            if exit_code is not None:
+                return exit_code
+        self.started_at = time.time()
+        if self.enable_status_file:
+            from succubus.statusfile import StatusUpdater
+            StatusUpdater(self).start()
+        if self.enable_control_socket:
+            from succubus import control
+            self._control_server = control.ControlServer(
+                self.control_socket_path, self.control_commands)
+            self._control_server.start()
+        if self.metrics_address is not None:
+            from succubus.metrics import MetricsServer
+            self._metrics_server = MetricsServer(self.metrics_address,
+                                                 self.metrics)
+            self._metrics_server.start()
+        self._start_signal_thread()
         try:
-            self.run()
+            self._preload()
+            self._run()
         except Exception:
             self.logger.exception('Exception while running the daemon:')
             return 1
         return 0
 
     def reliable_kill(self):
+        start = time.time()
         try:
-            os.kill(self.pid, SIGTERM)
-            for _ in range(int(self.shutdown_timeout * 10)):
-                os.kill(self.pid, 0)
-                time.sleep(0.1)
+            if self._pid_reused():
+                # The daemon is gone and its pid was given to another process.
+                exited = True
+            else:
+                os.kill(self.pid, SIGTERM)
+                exited = self._wait_for_exit(self.shutdown_timeout)
         except OSError as err:
             err = str(err)
             if 'No such process' in err:
-                if os.path.exists(self.pid_file):
-                    self.delpid()
-                return 0
+                exited = True
             else:
                 print(err)
+                self.shutdown_duration = time.time() - start
                 return 1
 
-        # No 'no such process' exception -> process is still running.
-        sys.stderr.write('Had to kill the process with SIGKILL')
-        os.kill(self.pid, SIGKILL)
+        if not exited and self._pid_reused():
+            # The pidfd was opened after the daemon had exited already.
+            exited = True
+        if not exited:
+            # Process is still running.
+            sys.stderr.write('Had to kill the process with SIGKILL')
+            os.kill(self.pid, SIGKILL)
+            try:
+                # SIGKILL cannot be ignored, but it takes a moment until the
+                # process is gone. It had no chance to remove its pid file.
+                exited = self._wait_for_exit(1)
+            except OSError:
+                exited = True
+            self.shutdown_duration = time.time() - start
+            if exited:
+                self._delpid_if_owned(self.pid)
+            return 0
+
+        self.shutdown_duration = time.time() - start
+        self._delpid_if_owned(self.pid)
+        message = "Daemon (pid {0}) stopped after {1:.3f} seconds\n"
+        sys.stdout.write(message.format(self.pid, self.shutdown_duration))
         return 0
 
+    def _wait_for_exit(self, timeout):
+        """Wait until self.pid has terminated or timeout seconds have passed
+
+        Returns True if the process terminated in time. Where the kernel
+        supports pidfds, this wakes up the moment the process exits. Otherwise
+        the process is polled with exponential backoff. Raises OSError if the
+        process does not exist (anymore).
+        """
+        pidfd = _pidfd_open(self.pid)
+        if pidfd is not None:
+            try:
+                poller = select.poll()
+                poller.register(pidfd, select.POLLIN)
+                return bool(poller.poll(timeout * 1000))
+            finally:
+                os.close(pidfd)
+
+        deadline = time.time() + timeout
+        interval = 0.001
+        while True:
+            os.kill(self.pid, 0)
+            if self._pid_reused():
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, 0.1)
+
     def stop(self):
         """Stop the daemon"""
+        status = self._query_control_socket('status')
+        if status is not None:
+            # The pid reported by the daemon itself cannot be stale.
+            self.pid = status['pid']
+            return self.reliable_kill()
         if self._already_running():
             return self.reliable_kill()
         else:
@@ -232,9 +1121,42 @@ class Daemon(object):
 
     def restart(self):
         """Restart the daemon"""
+        if self.zero_downtime_restart and self._already_running():
+            return self._handover_restart()
         self.stop()
         self.start()
 
+    def _handover_restart(self):
+        """Replace the running daemon without closing its listening sockets
+
+        The running daemon is asked (via SIGUSR2) to start its successor.
+        We are done when the old process has exited and the pid file names
+        the new one.
+        """
+        old_pid = self.pid
+        try:
+            os.kill(old_pid, SIGUSR2)
+            exited = self._wait_for_exit(self.startup_timeout +
+                                         self.shutdown_timeout)
+        except OSError as err:
+            exited = 'No such process' in str(err)
+        if not exited or not self._already_running() or self.pid == old_pid:
+            sys.stderr.write('Zero-downtime restart of pid %d failed\n' % old_pid)
+            return 1
+        message = "Daemon (pid {0}) replaced by pid {1}\n"
+        sys.stdout.write(message.format(old_pid, self.pid))
+        return 0
+
+    def _run(self):
+        """Do the work of the daemonized process
+
+        Subclasses that manage child processes (see PreforkDaemon) override
+        this to supervise them instead of running self.run() directly.
+        """
+        if not self.wait_for_ready:
+            self.notify_ready()
+        self.run()
+
     def run(self):
         """Placeholder for later overwriting"""
         raise NotImplementedError
@@ -242,9 +1164,184 @@ class Daemon(object):
     def status(self):
         """Determine the status of the daemon"""
         my_name = os.path.basename(sys.argv[0])
-        if self._already_running():
+        status = self._query_control_socket('status')
+        if status is not None:
+            self.pid = status['pid']
+        running = status is not None or self._already_running()
+        if running:
             message = "{0} (pid  {1}) is running...\n".format(my_name, self.pid)
-            sys.stdout.write(message)
-            return 0
-        sys.stdout.write("{0} is stopped\n".format(my_name))
-        return 3
+        else:
+            message = "{0} is stopped\n".format(my_name)
+        sys.stdout.write(message)
+        self._print_supervisor_state(running)
+        if running and '--verbose' in sys.argv[1:]:
+            self._print_status_file()
+        return 0 if running else 3
+
+    def _print_supervisor_state(self, running):
+        if not os.path.exists(self.supervisor_state_file):
+            return
+        from succubus.supervisor import read_state
+        state = read_state(self.supervisor_state_file)
+        if state is None or state['gave_up'] == running:
+            # Left over from an earlier run.
+            return
+        if state['gave_up']:
+            message = "Supervisor gave up after {0} restarts, last exit: {1}\n"
+        else:
+            message = "Supervised, restarted {0} times, last exit: {1}\n"
+        sys.stdout.write(message.format(state['restarts'], state['last_exit'] or 'none'))
+
+    def _print_status_file(self):
+        from succubus.statusfile import read
+        status = read(self.status_file)
+        if status is None or not _pid_exists(status['pid']):
+            sys.stdout.write("No status file, set enable_status_file to get one\n")
+            return
+        now = time.time()
+        lines = ["Uptime: %.0f seconds" % (now - status['started_at'])]
+        if status['heartbeat'] is not None:
+            lines.append("Last heartbeat: %.1f seconds ago" % (now - status['heartbeat']))
+        lines.append("Loop iterations: %d" % status['iterations'])
+        if status['updated_at'] is not None:
+            lines.append("Queue depth: %d" % status['queue_depth'])
+            lines.append("Resident memory: %.1f MiB" % (status['rss'] / 2 ** 20))
+        for name, value in sorted(status['counters'].items()):
+            lines.append("%s: %d" % (name, value))
+        sys.stdout.write(''.join(line + '\n' for line in lines))
+
+    def register_command(self, name, function):
+        """Make function available as command name on the control socket
+
+        The function is called in the control socket thread with the
+        arguments sent by the client and must return something that can be
+        serialized as JSON.
+        """
+        self.control_commands[name] = function
+
+    def control(self, command, *args):
+        """Send a command to the running daemon, return its result
+
+        Raises socket.error if the daemon does not serve a control socket
+        and control.ControlError if the command failed.
+        """
+        from succubus import control
+        return control.request(self.control_socket_path, command, args)
+
+    def _query_control_socket(self, command):
+        """Like control(), but return None if the daemon cannot be reached"""
+        if not os.path.exists(self.control_socket_path):
+            return None
+        from succubus import control
+        try:
+            return self.control(command)
+        except (socket.error, ValueError, control.ControlError):
+            return None
+
+    def reload(self):
+        """Re-read the configuration in the running daemon
+
+        Called on SIGHUP and by the "reload" control command, in background
+        threads while run() goes on, one reload at a time. The new
+        configuration is loaded with load_configuration() and checked with
+        validate_configuration(). If either raises, the old configuration
+        stays in place. Returns True if the new configuration is in use.
+        """
+        with self._reload_lock:
+            return self._reload()
+
+    def _reload(self):
+        start_time = time.time()
+        old = self.config
+        self._pending_config = (threading.current_thread(), {})
+        try:
+            try:
+                self.load_configuration()
+                new = self.config
+                self.validate_configuration(new)
+            finally:
+                self._pending_config = None
+            if new != old:
+                self.config = new
+                self.on_config_changed(old, new)
+        except Exception:
+            self.config = old
+            self.reload_failures.inc()
+            self.logger.exception("Reload failed, keeping the old configuration:")
+            return False
+        duration = time.time() - start_time
+        self.reload_duration.observe(duration)
+        self.logger.info("Reloaded configuration in %.3f seconds", duration)
+        return True
+
+    def reload_running(self):
+        """Make the running daemon reload its configuration
+
+        Uses the control socket if there is one, to report the outcome.
+        Otherwise the daemon gets SIGHUP.
+        """
+        if os.path.exists(self.control_socket_path):
+            from succubus import control
+            try:
+                result = self.control('reload')
+            except (socket.error, ValueError, control.ControlError):
+                result = None
+            if result is not None:
+                if not result['reloaded']:
+                    sys.stderr.write("Daemon (pid {0}) rejected the new "
+                                     "configuration\n".format(result['pid']))
+                    return 1
+                message = "Daemon (pid {0}) reloaded its configuration in {1:.3f} seconds\n"
+                sys.stdout.write(message.format(result['pid'], result['duration']))
+                return 0
+        if not self._already_running():
+            sys.stderr.write('Daemon not running, nothing to do.\n')
+            return 3
+        os.kill(self.pid, SIGHUP)
+        sys.stdout.write("Sent SIGHUP to daemon (pid {0})\n".format(self.pid))
+        return 0
+
+    def _control_status(self):
+        return {'pid': self._daemon_pid(),
+                'uptime': time.time() - self.started_at,
+                'threads': threading.active_count()}
+
+    def _control_stop(self):
+        # The reply is sent before the main thread gets to handle SIGTERM.
+        # A supervisor stops its child, but would restart a child that
+        # stopped on its own.
+        pid = self._daemon_pid()
+        os.kill(pid, SIGTERM)
+        return {'pid': pid}
+
+    def _control_reload(self):
+        start_time = time.time()
+        reloaded = self.reload()
+        return {'pid': self._daemon_pid(),
+                'reloaded': reloaded,
+                'duration': time.time() - start_time}
+
+    def _control_profile(self):
+        return {'pid': os.getpid(),
+                'profiling': self.toggle_profiler(),
+                'output': self.profile_file()}
+
+    def _control_stats(self):
+        import psutil
+        process = psutil.Process()
+        with process.oneshot():
+            memory = process.memory_info()
+            cpu = process.cpu_times()
+            stats = {'pid': process.pid,
+                     'uptime': time.time() - self.started_at,
+                     'rss': memory.rss,
+                     'vms': memory.vms,
+                     'cpu_user': cpu.user,
+                     'cpu_system': cpu.system,
+                     'num_fds': process.num_fds(),
+                     'num_threads': process.num_threads()}
+        if self.log_handler is not None:
+            stats['log_dropped'] = self.log_handler.dropped
+        if self.log_filter is not None:
+            stats['log_suppressed'] = self.log_filter.suppressed
+        return stats
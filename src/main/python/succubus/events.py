@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import errno
+import fcntl
+import os
+import select
+import threading
+
+
+class PipeEvent(object):
+    """A threading.Event that is safe to set from a signal handler
+
+    threading.Event.set() takes a lock, so calling it from a signal handler
+    deadlocks if the main thread was interrupted while holding that lock.
+    PipeEvent.set() only sets a flag and writes one byte to a pipe.
+
+    The read end of the pipe (fileno()) becomes readable when the event is
+    set and stays readable, so a PipeEvent can be passed to select(),
+    poll() or a selectors based loop along with sockets. The pipe is only
+    created when it is first needed.
+    """
+
+    def __init__(self):
+        self._flag = False
+        self._fds = None
+        self._lock = threading.Lock()
+
+    def _pipe(self):
+        if self._fds is None:
+            with self._lock:
+                if self._fds is None:
+                    fds = os.pipe()
+                    for fd in fds:
+                        _set_nonblocking(fd)
+                    self._fds = fds
+        return self._fds
+
+    def fileno(self):
+        return self._pipe()[0]
+
+    def is_set(self):
+        return self._flag
+
+    def set(self):
+        if self._flag:
+            return
+        self._flag = True
+        # Without a pipe nobody waits for it yet. wait() checks the flag
+        # after creating the pipe.
+        fds = self._fds
+        if fds is not None:
+            try:
+                os.write(fds[1], b'\0')
+            except OSError:
+                pass
+
+    def clear(self):
+        """Reset the event; only safe if no other thread waits for it"""
+        self._flag = False
+        if self._fds is not None:
+            try:
+                while os.read(self._fds[0], 4096):
+                    pass
+            except OSError:
+                pass
+
+    def wait(self, timeout=None):
+        """Wait until the event is set or timeout seconds have passed
+
+        Returns whether the event is set, like threading.Event.wait().
+        """
+        return bool(wait_for_any([self], timeout))
+
+    def close(self):
+        if self._fds is not None:
+            for fd in self._fds:
+                os.close(fd)
+            self._fds = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def _set_nonblocking(fd):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+
+def wait_for_any(events, timeout=None):
+    """Wait until one of the PipeEvents is set, return those that are set
+
+    Returns an empty list after timeout seconds (None waits forever).
+    """
+    fds = [event.fileno() for event in events]
+    ready = [event for event in events if event.is_set()]
+    if ready:
+        return ready
+    try:
+        if hasattr(select, 'poll'):
+            poller = select.poll()
+            for fd in fds:
+                poller.register(fd, select.POLLIN)
+            poller.poll(None if timeout is None else max(timeout, 0) * 1000)
+        else:
+            select.select(fds, [], [], timeout)
+    except (OSError, select.error) as err:
+        # Python 2 does not retry after a signal handler ran.
+        if err.args[0] != errno.EINTR:
+            raise
+    return [event for event in events if event.is_set()]
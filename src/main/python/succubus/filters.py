@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import logging
+import time
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:
+    _monotonic = time.time
+
+
+class RateLimitFilter(logging.Filter):
+    """Rate limit log records per logger and message template
+
+    Every (logger name, unformatted message) pair gets a token bucket that
+    holds up to burst tokens and refills at rate tokens per second. A record
+    that finds its bucket empty is suppressed. The next record of the same
+    kind that gets through carries the number of suppressed records in its
+    suppressed_similar attribute, which QueueingHandler turns into a
+    "(N similar messages suppressed)" note. The message itself is left
+    alone, since other handlers see the same record. Records that were
+    suppressed at the very end are reported by log_suppressed().
+
+    At most max_keys buckets are kept. When there are more, buckets with
+    nothing to report are dropped first, then the least recently used ones,
+    whose suppressed records then only show up in self.suppressed.
+
+    The buckets are not protected by a lock, so concurrent threads may get a
+    few more records through than configured. In exchange, the per-record
+    cost is a dict lookup and some arithmetic.
+    """
+
+    def __init__(self, rate=10, burst=50, max_keys=10000):
+        super(RateLimitFilter, self).__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.suppressed = 0
+        # Maps (name, msg) -> [tokens, last update, suppressed count]
+        self._buckets = {}
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = _monotonic()
+        try:
+            bucket = self._buckets.get(key)
+        except TypeError:
+            # The message is an unhashable object, let it pass.
+            return True
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune()
+            self._buckets[key] = [self.burst - 1, now, 0]
+            return True
+
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            bucket[2] += 1
+            self.suppressed += 1
+            return False
+        bucket[0] = tokens - 1
+        if bucket[2]:
+            record.suppressed_similar = bucket[2]
+            bucket[2] = 0
+        return True
+
+    def _prune(self):
+        """Make room for new buckets, keeping at most half of max_keys"""
+        for key in [key for key, bucket in self._buckets.items() if not bucket[2]]:
+            del self._buckets[key]
+        excess = len(self._buckets) - self.max_keys // 2
+        if excess > 0:
+            # Messages that keep changing while being suppressed would
+            # otherwise grow the dict without limit.
+            by_age = sorted(self._buckets.items(), key=lambda item: item[1][1])
+            for key, _ in by_age[:excess]:
+                del self._buckets[key]
+
+    def log_suppressed(self):
+        """Log a summary for every kind of record still being suppressed"""
+        for (name, msg), bucket in list(self._buckets.items()):
+            if bucket[2]:
+                count, bucket[2] = bucket[2], 0
+                logging.getLogger(name).warning(
+                    "%d similar messages suppressed: %s", count, msg)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Control and query all succubus daemons on a host with one command
+
+Daemons register themselves on "start" in a registry directory (default:
+/var/lib/succubus/registry, or $SUCCUBUS_REGISTRY) if that directory
+exists. Each daemon gets a JSON file there with its name, pid file, and the
+interpreter and command line that control it. "succubus status" reads the pid files and
+checks them against a single listing of /proc, without starting an
+interpreter per daemon. start, stop and restart run the daemons' own
+commands, several at a time.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import argparse
+import fnmatch
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from succubus.daemonize import _parse_pid_file, _process_start_time
+
+DEFAULT_REGISTRY = '/var/lib/succubus/registry'
+ACTIONS = ('start', 'stop', 'restart', 'status')
+# What json returns for strings, unicode on Python 2.
+_text = type(u'')
+
+
+def default_registry():
+    return os.environ.get('SUCCUBUS_REGISTRY', DEFAULT_REGISTRY)
+
+
+def discover(registry_dir, patterns=None):
+    """Return the registered daemons whose names match any of patterns
+
+    Entries are sorted by name. Unreadable and malformed entries are skipped.
+    """
+    try:
+        names = os.listdir(registry_dir)
+    except OSError:
+        return []
+    entries = []
+    for file_name in sorted(names):
+        if not file_name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(registry_dir, file_name)) as entry_file:
+                entry = json.load(entry_file)
+        except (IOError, OSError, ValueError):
+            continue
+        if not _valid(entry):
+            continue
+        if patterns and not any(fnmatch.fnmatchcase(entry['name'], pattern)
+                                for pattern in patterns):
+            continue
+        entries.append(entry)
+    return entries
+
+
+def _valid(entry):
+    return (isinstance(entry, dict) and
+            isinstance(entry.get('name'), _text) and
+            isinstance(entry.get('pid_file'), _text) and
+            isinstance(entry.get('command'), list) and
+            len(entry['command']) > 0)
+
+
+def live_pids():
+    """Return the pids of all processes, from one listing of /proc"""
+    return set(int(name) for name in os.listdir('/proc') if name.isdigit())
+
+
+def daemon_state(entry, pids):
+    """Return the state of a registered daemon as a dict
+
+    A daemon is running if the pid in its pid file is alive and, if the pid
+    file records it, still has the same start time (so a reused pid does
+    not count).
+    """
+    state = {'name': entry['name'], 'running': False, 'pid': None,
+             'uptime': None, 'rss': None}
+    try:
+        with open(entry['pid_file']) as pid_file:
+            pid, start_time = _parse_pid_file(pid_file.read())
+    except (IOError, OSError, ValueError):
+        return state
+    if pid not in pids:
+        return state
+    if start_time is not None and _process_start_time(pid) != start_time:
+        return state
+    state['running'] = True
+    state['pid'] = pid
+    if entry.get('status_file'):
+        from succubus import statusfile
+        status = statusfile.read(entry['status_file'])
+        if status is not None and status['pid'] == pid:
+            state['uptime'] = time.time() - status['started_at']
+            state['rss'] = status['rss']
+    return state
+
+
+def run_action(entry, action, timeout):
+    """Run the daemon's own command with action, return (exit code, output)
+
+    The script is run with the interpreter that registered it, so it does
+    not need to be executable.
+    """
+    command = [entry['command'][0], action] + entry['command'][1:]
+    if entry.get('python'):
+        command.insert(0, entry['python'])
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT,
+                                   universal_newlines=True)
+    except OSError as err:
+        return 127, str(err)
+    # communicate() has no timeout on Python 2.
+    timed_out = []
+
+    def kill():
+        timed_out.append(True)
+        process.kill()
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    try:
+        output = process.communicate()[0]
+    finally:
+        timer.cancel()
+    if timed_out:
+        output += 'Timed out after %s seconds' % timeout
+    return process.returncode, output.strip()
+
+
+def _format_table(rows, columns):
+    widths = [max([len(column)] + [len(row[i]) for row in rows])
+              for i, column in enumerate(columns)]
+    lines = []
+    for row in [columns] + rows:
+        lines.append('  '.join(cell.ljust(width)
+                               for cell, width in zip(row, widths)).rstrip())
+    return '\n'.join(lines) + '\n'
+
+
+def _format_rows(results):
+    rows = []
+    for result in results:
+        row = [result['name'],
+               'running' if result['running'] else 'stopped',
+               str(result['pid']) if result['pid'] else '-',
+               '%.0fs' % result['uptime'] if result['uptime'] is not None else '-',
+               '%.1fM' % (result['rss'] / 2 ** 20) if result['rss'] else '-']
+        if 'exit_code' in result:
+            last_line = result['output'].splitlines()[-1:] or ['']
+            row += [str(result['exit_code']), last_line[0]]
+        rows.append(row)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='succubus',
+        description='Control and query the succubus daemons on this host.')
+    parser.add_argument('action', choices=ACTIONS)
+    parser.add_argument('patterns', nargs='*', metavar='pattern',
+                        help='shell pattern for daemon names (default: all)')
+    parser.add_argument('--registry', default=default_registry(),
+                        help='registry directory (default: %(default)s)')
+    parser.add_argument('--json', action='store_true',
+                        help='print JSON instead of a table')
+    parser.add_argument('-j', '--parallel', type=int, default=8,
+                        help='daemons to start/stop at a time (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=60,
+                        help='seconds to wait for each daemon (default: %(default)s)')
+    # Allows options between the patterns, e.g. "status web-* --json db-*".
+    parse = getattr(parser, 'parse_intermixed_args', parser.parse_args)
+    args = parse(argv)
+
+    entries = discover(args.registry, args.patterns)
+    if not entries:
+        sys.stderr.write('No daemons registered in %s match\n' % args.registry)
+        return 1
+
+    outcomes = {}
+    if args.action != 'status':
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(max(args.parallel, 1))
+        try:
+            codes = pool.map(lambda entry: run_action(entry, args.action, args.timeout),
+                             entries)
+        finally:
+            pool.close()
+        outcomes = dict((entry['name'], code) for entry, code in zip(entries, codes))
+
+    pids = live_pids()
+    results = []
+    for entry in entries:
+        result = daemon_state(entry, pids)
+        if entry['name'] in outcomes:
+            result['exit_code'], result['output'] = outcomes[entry['name']]
+        results.append(result)
+
+    if args.json:
+        sys.stdout.write(json.dumps(results, indent=2, sort_keys=True) + '\n')
+    else:
+        columns = ['NAME', 'STATE', 'PID', 'UPTIME', 'RSS']
+        if outcomes:
+            columns += ['EXIT', 'OUTPUT']
+        sys.stdout.write(_format_table(_format_rows(results), columns))
+
+    if outcomes:
+        return 0 if all(code == 0 for code, _ in outcomes.values()) else 1
+    return 0 if all(result['running'] for result in results) else 3
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import copy
+import logging
+import os
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class QueueingHandler(logging.Handler):
+    """Logging handler that does not block the caller
+
+    Records are put on a bounded in-memory queue, a background thread takes
+    them from there and passes them on to the wrapped handlers. When the
+    queue is full, overflow='drop' discards the record (and counts it in
+    self.dropped), while overflow='block' waits for free space.
+
+    The background thread is started lazily by the first record, and again
+    in every forked child process, so the handler can be set up before the
+    daemon forks.
+    """
+
+    def __init__(self, handlers, capacity=10000, overflow='drop'):
+        if overflow not in ('drop', 'block'):
+            raise ValueError("overflow must be 'drop' or 'block', not %r" % overflow)
+        super(QueueingHandler, self).__init__()
+        self.handlers = list(handlers)
+        self.capacity = capacity
+        self.overflow = overflow
+        self.dropped = 0
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._closed = False
+
+    def _start_thread(self):
+        self._pid = os.getpid()
+        self._queue = queue.Queue(self.capacity)
+        self._thread = threading.Thread(target=self._ship, args=(self._queue,),
+                                        name='succubus-logging')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def prepare(self, record):
+        """Make the record safe for handing it to another thread
+
+        Like logging.handlers.QueueHandler, merge the arguments into the
+        message and render the traceback right away, so that no mutable
+        objects or frames are kept alive in the queue. This is done on a
+        copy, other handlers still get the original record. The count set
+        by RateLimitFilter is appended to the message.
+        """
+        msg = record.getMessage()
+        record = copy.copy(record)
+        suppressed = getattr(record, 'suppressed_similar', 0)
+        if suppressed:
+            msg = "{0} ({1} similar messages suppressed)".format(msg, suppressed)
+            record.suppressed_similar = 0
+        record.msg = msg
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        if self._closed:
+            self._dispatch(record)
+            return
+        if self._pid != os.getpid():
+            self._start_thread()
+        try:
+            record = self.prepare(record)
+            if self.overflow == 'block':
+                self._queue.put(record)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def _dispatch(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _ship(self, records):
+        while True:
+            record = records.get()
+            if record is None:
+                return
+            try:
+                self._dispatch(record)
+            except Exception:
+                self.handleError(record)
+
+    def close(self, timeout=10):
+        """Ship all queued records, then close the wrapped handlers
+
+        Gives up after timeout seconds; records that have not been shipped
+        by then are lost.
+        """
+        if not self._closed:
+            self._closed = True
+            if self._thread is not None and self._pid == os.getpid():
+                try:
+                    self._queue.put(None, timeout=timeout)
+                    self._thread.join(timeout)
+                except queue.Full:
+                    pass
+            for handler in self.handlers:
+                handler.close()
+        super(QueueingHandler, self).close()
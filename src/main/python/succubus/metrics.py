@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Counters, gauges and histograms, rendered in the Prometheus text format
+
+Updating a metric is a plain attribute update without any locking, so it is
+cheap enough for the hot path. Under heavy contention from many threads an
+increment may occasionally get lost, which is acceptable for monitoring.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import bisect
+import os
+import socket
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class Counter(object):
+    """A value that only goes up"""
+    type = 'counter'
+
+    def __init__(self, name, help=''):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        return [(self.name, '', self.value)]
+
+
+class Gauge(Counter):
+    """A value that can go up and down"""
+    type = 'gauge'
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class GaugeFamily(object):
+    """Gauges of the same name that differ in their labels"""
+    type = 'gauge'
+
+    def __init__(self, name, help=''):
+        self.name = name
+        self.help = help
+        self.values = OrderedDict()
+
+    def set(self, labels, value):
+        """Set the gauge for labels, a dict like {'worker': 0}"""
+        key = '{%s}' % ','.join('%s="%s"' % (name, labels[name])
+                                for name in sorted(labels))
+        self.values[key] = value
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self.values.items()]
+
+
+class Histogram(object):
+    """Count observations (e.g. latencies) in configurable buckets"""
+    type = 'histogram'
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, help='', buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # One more slot for observations above the largest bucket.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        """Context manager that observes the duration of its block"""
+        return _Timer(self)
+
+    def samples(self):
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            samples.append((self.name + '_bucket', '{le="%s"}' % bound, cumulative))
+        samples.append((self.name + '_bucket', '{le="+Inf"}', self.count))
+        samples.append((self.name + '_sum', '', self.sum))
+        samples.append((self.name + '_count', '', self.count))
+        return samples
+
+
+class _Timer(object):
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(time.time() - self.start)
+
+
+class Registry(object):
+    """The set of metrics a daemon exposes
+
+    Besides the metrics created with counter(), gauge() and histogram(),
+    collectors added with add_collector() are called whenever the metrics
+    are rendered. They return a list of freshly computed metrics, which is
+    useful for values that are expensive to keep up to date.
+    """
+
+    def __init__(self):
+        self._metrics = OrderedDict()
+        self._collectors = []
+
+    def _get_or_create(self, cls, name, help, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, help, **kwargs)
+        elif type(metric) is not cls:
+            raise ValueError("Metric %s already registered as %s" % (name, metric.type))
+        return metric
+
+    def counter(self, name, help=''):
+        return self._get_or_create(Counter, name, help)
+
+    def gauge(self, name, help=''):
+        return self._get_or_create(Gauge, name, help)
+
+    def histogram(self, name, help='', buckets=Histogram.DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help, buckets=buckets)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def collect(self):
+        metrics = list(self._metrics.values())
+        for collector in self._collectors:
+            metrics.extend(collector())
+        return metrics
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.collect():
+            if metric.help:
+                lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type))
+            for name, labels, value in metric.samples():
+                lines.append('%s%s %r' % (name, labels, float(value)))
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        """Return all samples as a JSON serializable dict"""
+        return OrderedDict((name + labels, value)
+                           for metric in self.collect()
+                           for name, labels, value in metric.samples())
+
+
+def process_collector(started_at):
+    """Return a collector for CPU, memory and fd usage of this process"""
+    def collect():
+        import psutil
+        process = psutil.Process()
+        with process.oneshot():
+            cpu = process.cpu_times()
+            cpu_seconds = Counter('process_cpu_seconds_total',
+                                  'Total user and system CPU time in seconds.')
+            cpu_seconds.inc(cpu.user + cpu.system)
+            rss = Gauge('process_resident_memory_bytes',
+                        'Resident memory size in bytes.')
+            rss.set(process.memory_info().rss)
+            fds = Gauge('process_open_fds', 'Number of open file descriptors.')
+            fds.set(process.num_fds())
+        metrics = [cpu_seconds, rss, fds]
+        if started_at() is not None:
+            uptime = Gauge('succubus_uptime_seconds',
+                           'Seconds since the daemon was started.')
+            uptime.set(time.time() - started_at())
+            metrics.append(uptime)
+        return metrics
+    return collect
+
+
+def _create_server(address, registry):
+    """Create the HTTP server for MetricsServer
+
+    http.server is slow to import, so it is only imported when a daemon
+    actually serves its metrics.
+    """
+    try:
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        from socketserver import UnixStreamServer
+    except ImportError:
+        from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+        from SocketServer import UnixStreamServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class UnixHTTPServer(UnixStreamServer):
+        def get_request(self):
+            request, _ = self.socket.accept()
+            # BaseHTTPRequestHandler expects a (host, port) client address.
+            return request, ('localhost', 0)
+
+    if isinstance(address, tuple):
+        return HTTPServer(address, MetricsHandler)
+    if os.path.exists(address):
+        os.remove(address)
+    return UnixHTTPServer(address, MetricsHandler)
+
+
+class MetricsServer(object):
+    """Serve a Registry over HTTP in a background thread
+
+    address is either a (host, port) tuple or the path of a unix domain
+    socket.
+    """
+
+    def __init__(self, address, registry):
+        self.address = address
+        self.registry = registry
+        self._server = None
+
+    def start(self):
+        self._server = _create_server(self.address, self.registry)
+        thread = threading.Thread(target=self._server.serve_forever,
+                                  name='succubus-metrics')
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def server_address(self):
+        return self._server.server_address
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        if self._server.address_family == socket.AF_UNIX:
+            try:
+                os.remove(self.address)
+            except OSError:
+                pass
+        self._server = None
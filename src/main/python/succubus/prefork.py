@@ -0,0 +1,461 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import errno
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from signal import SIGTERM, SIGKILL, SIGCHLD, SIGHUP, SIGUSR1
+
+from succubus.daemonize import Daemon
+from succubus.events import PipeEvent
+from succubus.metrics import Gauge, GaugeFamily
+
+
+# Signals the master collects with sigtimedwait().
+_MASTER_SIGNALS = [SIGTERM, SIGCHLD, SIGHUP, SIGUSR1]
+
+
+class PreforkDaemon(Daemon):
+    """Daemon that runs self.run() in a pool of pre-forked worker processes
+
+    The daemonized process becomes a master: it owns the pid file, forks
+    self.workers children that each call self.run(), respawns workers that
+    die and fans SIGTERM out to all of them when the daemon is stopped.
+    Because "stop" and "status" only talk to the master, they work exactly
+    like they do for a plain Daemon.
+
+    self.shutdown() is called in every worker when it terminates. The master
+    itself only removes the pid file.
+
+    The configuration is reloaded (on SIGHUP or the "reload" control
+    command) by the master. If it changed, the workers are replaced one by
+    one, like recycled workers, by fresh forks that inherit it.
+
+    The profiler (SIGUSR1 or the "profile" control command) is toggled in
+    all workers, each of which writes its own output file.
+
+    The master waits for signals with sigtimedwait(), so PreforkDaemon
+    needs Python 3.3 or newer.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if not hasattr(signal, 'sigtimedwait'):
+            raise RuntimeError("PreforkDaemon needs Python 3.3 or newer")
+        workers = kwargs.pop('workers', None)
+        super(PreforkDaemon, self).__init__(*args, **kwargs)
+        self.workers = workers or multiprocessing.cpu_count()
+        # Minimum number of seconds between two forks for the same worker
+        # slot, so that a run() that crashes right away cannot turn the
+        # master into a fork bomb.
+        self.respawn_delay = 1
+        # Index of this worker (0 .. self.workers - 1), None in the master.
+        self.worker_id = None
+        # Maps pid -> worker_id for all running workers (master only).
+        self.worker_pids = {}
+        self._spawned_at = {}
+        # Workers are replaced by a fresh process once they use more than
+        # max_worker_rss bytes of resident memory, have reported
+        # max_worker_units units of work with self.unit_done(), or have run
+        # for max_worker_age seconds. None disables a limit. The limits are
+        # checked every recycle_interval seconds.
+        self.max_worker_rss = None
+        self.max_worker_units = None
+        self.max_worker_age = None
+        self.recycle_interval = 5
+        self.recycles = self.metrics.counter(
+            'succubus_worker_recycles_total', 'Workers replaced because they '
+            'reached max_worker_rss, max_worker_units or max_worker_age, or '
+            'after a reload.')
+        # Maps pid -> time.time() of the fork, for max_worker_age.
+        self._worker_started = {}
+        # Shared with the workers: one unit counter per process. There are
+        # two per slot, for a worker and the replacement that is started
+        # before it exits. Maps pid -> index of its counter.
+        self._unit_counts = None
+        self._unit_counter = None
+        self._worker_counters = {}
+        self._free_counters = []
+        # (pid, deadline) of the worker that is being recycled.
+        self._recycling = None
+        self._next_recycle_check = 0
+        # Incremented when a reload changes the configuration. Workers forked
+        # earlier are recycled. Maps pid -> generation of the configuration.
+        self._config_generation = 0
+        self._worker_generation = {}
+        # When the current configuration started to be rolled out.
+        self._rollout_started = None
+        # True while the workers run the profiler, so that workers forked
+        # in the meantime join in.
+        self._profiling_workers = False
+        self.metrics.add_collector(self._collect_worker_metrics)
+
+    def daemonize(self):
+        super(PreforkDaemon, self).daemonize()
+        # Block the signals the master waits for before any thread (control
+        # socket, metrics) is started. Threads inherit the signal mask, and
+        # a thread that does not block them would swallow them. A
+        # supervisor (see succubus.supervisor) unblocks them for itself and
+        # hands the mask on to the master it forks.
+        signal.pthread_sigmask(signal.SIG_BLOCK, _MASTER_SIGNALS)
+
+    def _run(self):
+        """Supervise the worker processes until SIGTERM is received
+
+        SIGTERM, SIGCHLD, SIGHUP and SIGUSR1 are blocked and collected with
+        sigtimedwait() instead of being handled asynchronously, so the master
+        never gets interrupted in the middle of forking or reaping a worker.
+        """
+        signal.pthread_sigmask(signal.SIG_BLOCK, _MASTER_SIGNALS)
+        self._unit_counts = multiprocessing.RawArray('Q', 2 * self.workers)
+        self._free_counters = list(range(2 * self.workers))
+        try:
+            while True:
+                self._reap_workers()
+                timeout = self._spawn_workers()
+                # The daemon is ready as soon as the first workers are forked.
+                self.notify_ready()
+                recycle_timeout = self._recycle_workers()
+                if timeout is None or (recycle_timeout is not None and
+                                       recycle_timeout < timeout):
+                    timeout = recycle_timeout
+                if self._heartbeat is not None:
+                    self.heartbeat()
+                    interval = self.watchdog_interval / 2
+                    if timeout is None or interval < timeout:
+                        timeout = interval
+                if timeout is None:
+                    info = signal.sigwaitinfo(_MASTER_SIGNALS)
+                else:
+                    info = signal.sigtimedwait(_MASTER_SIGNALS, timeout)
+                if info is not None and info.si_signo == SIGTERM:
+                    break
+                if info is not None and info.si_signo == SIGHUP:
+                    self.reload()
+                if info is not None and info.si_signo == SIGUSR1:
+                    self.toggle_profiler()
+        finally:
+            self._stop_workers()
+
+    def _start_signal_thread(self):
+        # The master collects its signals with sigtimedwait() in _run().
+        if self.worker_id is not None:
+            super(PreforkDaemon, self)._start_signal_thread()
+
+    def _spawn_workers(self):
+        """Fork a worker for every empty slot
+
+        Returns the number of seconds until a slot that is still waiting for
+        its respawn_delay may be filled, or None if all slots are busy.
+        """
+        busy = set(self.worker_pids.values())
+        now = time.time()
+        next_spawn = None
+        for worker_id in range(self.workers):
+            if worker_id in busy:
+                continue
+            delay = (self._spawned_at.get(worker_id, now - self.respawn_delay) +
+                     self.respawn_delay - now)
+            if delay > 0:
+                if next_spawn is None or delay < next_spawn:
+                    next_spawn = delay
+                continue
+            self._spawn_worker(worker_id)
+        return next_spawn
+
+    def _collect_worker_metrics(self):
+        workers = Gauge('succubus_workers', 'Running worker processes.')
+        workers.set(len(self.worker_pids))
+        private = GaugeFamily('succubus_worker_private_memory_bytes',
+                              'Memory used by this worker only (USS).')
+        shared = GaugeFamily('succubus_worker_shared_memory_bytes',
+                             'Resident memory shared with other processes.')
+        for worker_id, memory in self.worker_memory().items():
+            private.set({'worker': worker_id}, memory['private'])
+            shared.set({'worker': worker_id}, memory['shared'])
+        return [workers, private, shared]
+
+    def worker_memory(self):
+        """Return worker_id -> memory usage of each worker, in bytes
+
+        'private' memory is used by this worker alone (USS), 'shared' memory
+        (the rest of its RSS) is shared with the master and the other
+        workers, e.g. what preload() loaded. 'pss' is the worker's
+        proportional share of its RSS. The sum of all private memory plus
+        the master's RSS is what the daemon really costs.
+        """
+        import psutil
+        memory = {}
+        for pid, worker_id in list(self.worker_pids.items()):
+            try:
+                info = psutil.Process(pid).memory_full_info()
+            except psutil.Error:
+                # Exited or not accessible, it is reaped soon.
+                continue
+            memory[worker_id] = {'pid': pid,
+                                 'rss': info.rss,
+                                 'pss': info.pss,
+                                 'private': info.uss,
+                                 'shared': info.rss - info.uss}
+        return memory
+
+    def _control_stats(self):
+        stats = super(PreforkDaemon, self)._control_stats()
+        # JSON object keys are strings.
+        stats['workers'] = dict((str(worker_id), memory) for worker_id, memory
+                                in self.worker_memory().items())
+        return stats
+
+    def _spawn_worker(self, worker_id, recycle=False):
+        if worker_id in self._spawned_at and not recycle:
+            self.restarts.inc()
+        counter = self._free_counters.pop() if self._free_counters else None
+        if counter is not None:
+            self._unit_counts[counter] = 0
+        # The heap was frozen once after preload(). Freezing it again here
+        # would move the master's garbage into the permanent generation
+        # with every respawn, where it is never collected.
+        pid = os.fork()
+        if pid == 0:
+            self._worker_main(worker_id, counter)
+        self.worker_pids[pid] = worker_id
+        self._worker_generation[pid] = self._config_generation
+        self._spawned_at[worker_id] = self._worker_started[pid] = time.time()
+        if counter is not None:
+            self._worker_counters[pid] = counter
+        self.logger.info("Started worker %d with pid %d", worker_id, pid)
+        return pid
+
+    def unit_done(self, count=1):
+        """Count units of work (requests, jobs...) done by this worker
+
+        Only needed for max_worker_units. This is a plain write to shared
+        memory, cheap enough to call for every request.
+        """
+        if self._unit_counter is not None:
+            self._unit_counts[self._unit_counter] += count
+
+    def _outdated(self, pid):
+        """Return True if the worker was forked before the last reload"""
+        generation = self._worker_generation.get(pid, self._config_generation)
+        return generation < self._config_generation
+
+    def _recycle_reason(self, pid, now):
+        """Return why the worker with pid should be recycled, or None"""
+        if self._outdated(pid):
+            return "configuration reloaded"
+        if (self.max_worker_age is not None and
+                now - self._worker_started.get(pid, now) > self.max_worker_age):
+            return "older than %s seconds" % self.max_worker_age
+        counter = self._worker_counters.get(pid)
+        if (self.max_worker_units is not None and counter is not None and
+                self._unit_counts[counter] >= self.max_worker_units):
+            return "%d units of work done" % self._unit_counts[counter]
+        if self.max_worker_rss is not None:
+            import psutil
+            try:
+                rss = psutil.Process(pid).memory_info().rss
+            except psutil.Error:
+                return None
+            if rss > self.max_worker_rss:
+                return "%d bytes resident memory" % rss
+        return None
+
+    def _recycle_workers(self):
+        """Replace one worker that reached its limits, if there is any
+
+        The replacement is forked before the old worker gets SIGTERM, and
+        only one worker is recycled at a time, so the daemon never runs
+        with less than self.workers workers. Workers that were forked before
+        the configuration was reloaded are replaced right away. Returns the
+        number of seconds until the next check, or None if there is nothing
+        to check.
+        """
+        outdated = [pid for pid in self.worker_pids if self._outdated(pid)]
+        if (self.max_worker_rss is None and self.max_worker_units is None and
+                self.max_worker_age is None and not outdated and
+                self._recycling is None and self._rollout_started is None):
+            return None
+        now = time.time()
+        if self._recycling is not None:
+            pid, deadline = self._recycling
+            if pid not in self.worker_pids:
+                self._recycling = None
+            elif now > deadline:
+                self.logger.warning("Had to kill recycled worker %d (pid %d) "
+                                    "with SIGKILL", self.worker_pids[pid], pid)
+                try:
+                    os.kill(pid, SIGKILL)
+                except OSError:
+                    pass
+                self._recycling = None
+        if self._rollout_started is not None and not outdated and self._recycling is None:
+            self.logger.info("Rolled out the configuration to all workers in "
+                             "%.1f seconds", now - self._rollout_started)
+            self._rollout_started = None
+        # A reload is rolled out without waiting for the next check.
+        if self._recycling is None and (outdated or now >= self._next_recycle_check):
+            self._next_recycle_check = now + self.recycle_interval
+            for pid, worker_id in sorted(self.worker_pids.items()):
+                reason = self._recycle_reason(pid, now)
+                if reason is not None:
+                    self.logger.info("Recycling worker %d (pid %d): %s",
+                                     worker_id, pid, reason)
+                    self.recycles.inc()
+                    self._spawn_worker(worker_id, recycle=True)
+                    try:
+                        os.kill(pid, SIGTERM)
+                    except OSError:
+                        pass
+                    self._recycling = (pid, now + self.shutdown_timeout)
+                    break
+        if self._recycling is not None:
+            # SIGCHLD wakes up the master earlier if the old worker exits.
+            return max(self._recycling[1] - now, 0)
+        return max(self._next_recycle_check - now, 0)
+
+    def reload(self):
+        """Reload the configuration in the master, then replace the workers"""
+        old = self.config
+        reloaded = super(PreforkDaemon, self).reload()
+        if reloaded and self.config != old:
+            self._config_generation += 1
+            self._rollout_started = time.time()
+            # Wake up the master loop in case the control socket thread
+            # called us.
+            os.kill(os.getpid(), SIGCHLD)
+        return reloaded
+
+    def toggle_profiler(self):
+        if self.worker_id is not None:
+            return super(PreforkDaemon, self).toggle_profiler()
+        # The master only waits for signals, profile the workers instead.
+        self._profiling_workers = not self._profiling_workers
+        for pid in list(self.worker_pids):
+            try:
+                os.kill(pid, SIGUSR1)
+            except OSError:
+                pass
+        return self._profiling_workers
+
+    def _control_profile(self):
+        return {'pid': os.getpid(),
+                'profiling': self.toggle_profiler(),
+                'workers': sorted(self.worker_pids)}
+
+    def _worker_main(self, worker_id, counter=None):
+        """Run self.run() in a freshly forked worker, never returns
+
+        The worker leaves with os._exit() so that the atexit handlers
+        inherited from the master (which would delete the pid file) are
+        not called.
+        """
+        self.worker_id = worker_id
+        self.worker_pids = {}
+        self._unit_counter = counter
+        # The watchdog watches the master, heartbeat() is a no-op in workers.
+        self._heartbeat = None
+        # SIGTERM for this worker must not wake up the master or its siblings.
+        self.shutdown_requested = PipeEvent()
+        if self._ready_fd is not None:
+            # Readiness is reported by the master only.
+            os.close(self._ready_fd)
+            self._ready_fd = None
+        if self._pid_file_fd is not None:
+            # The pid file lock belongs to the master.
+            os.close(self._pid_file_fd)
+            self._pid_file_fd = None
+        self._tune_worker_gc()
+        if self._profiling_workers:
+            super(PreforkDaemon, self).toggle_profiler()
+        exit_code = 0
+        try:
+            try:
+                # SIGUSR1 toggles the profiler of this worker, SIGHUP stays
+                # blocked: the master reloads the configuration.
+                self._start_signal_thread()
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, [SIGTERM, SIGCHLD, SIGUSR1])
+                self.run()
+            except Exception:
+                self.logger.exception('Exception in worker %d:', worker_id)
+                exit_code = 1
+            except BaseException:
+                # SIGTERM was caught with raise_on_sigterm, this is a
+                # regular shutdown.
+                pass
+            deadline = time.time() + self.shutdown_timeout * 0.8
+            self._stop_scheduler(deadline)
+            try:
+                self.shutdown()
+            except Exception:
+                self.logger.exception("Error in worker shutdown:")
+            self._stop_process_pool(deadline)
+            self._stop_profiler()
+        finally:
+            self._flush_logging(time.time() + self.shutdown_timeout * 0.8)
+            logging.shutdown()
+            os._exit(exit_code)
+
+    def _reap_workers(self):
+        """Collect the exit status of all workers that have terminated"""
+        while self.worker_pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as err:
+                if err.errno == errno.ECHILD:
+                    return
+                raise
+            if pid == 0:
+                return
+            worker_id = self.worker_pids.pop(pid, None)
+            self._worker_started.pop(pid, None)
+            self._worker_generation.pop(pid, None)
+            counter = self._worker_counters.pop(pid, None)
+            if counter is not None:
+                self._free_counters.append(counter)
+            if worker_id is None:
+                continue
+            if self._recycling is not None and self._recycling[0] == pid:
+                self.logger.info("Recycled worker %d (pid %d) exited with "
+                                 "status %d", worker_id, pid, status)
+                self._recycling = None
+            else:
+                self.logger.warning("Worker %d (pid %d) exited with status %d",
+                                    worker_id, pid, status)
+
+    def _stop_workers(self):
+        """Send SIGTERM to all workers and wait for them to terminate
+
+        Workers get 80% of self.shutdown_timeout, leaving the master enough
+        time to clean up before "stop" resorts to SIGKILL. Workers that are
+        still alive after that are killed.
+        """
+        for pid in list(self.worker_pids):
+            try:
+                os.kill(pid, SIGTERM)
+            except OSError:
+                pass
+        deadline = time.time() + self.shutdown_timeout * 0.8
+        while True:
+            self._reap_workers()
+            remaining = deadline - time.time()
+            if not self.worker_pids or remaining <= 0:
+                break
+            signal.sigtimedwait([SIGCHLD], remaining)
+        for pid in list(self.worker_pids):
+            self.logger.warning("Had to kill worker %d (pid %d) with SIGKILL",
+                                self.worker_pids.pop(pid), pid)
+            try:
+                os.kill(pid, SIGKILL)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+
+    def _shutdown(self):
+        # self.shutdown() already ran in every worker.
+        self._cleanup(time.time() + self.shutdown_timeout * 0.2)
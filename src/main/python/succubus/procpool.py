@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Offload CPU bound work to worker processes
+
+Threads of one process share the GIL, so CPU bound work only uses more than
+one core when it runs in other processes. Payloads are usually pickled and
+sent through a pipe to those, which costs two copies and a lot of time for
+megabytes of data. ProcessPool.shared() puts them into shared memory
+instead, and only the name of the block is sent to the worker.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import multiprocessing
+import signal
+import threading
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    resource_tracker = shared_memory = None
+
+
+class ProcessPool(object):
+    """A fixed number of forked worker processes
+
+    Functions submitted to the pool must be picklable (defined at module
+    level), like their arguments and return values. SharedMemory blocks
+    created with shared() are passed by name, the worker attaches to the
+    same memory and can read and write it without copying.
+    """
+
+    def __init__(self, processes=None, initializer=None):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.initializer = initializer
+        self._pool = None
+        self._blocks = {}
+
+    def start(self):
+        if shared_memory is not None:
+            # Workers attaching to a block would start a resource tracker
+            # of their own otherwise, which unlinks the block when the
+            # worker exits.
+            resource_tracker.ensure_running()
+        # Forking lets the workers run functions defined in the daemon
+        # script, and they inherit the user and group of the daemon.
+        if hasattr(multiprocessing, 'get_context'):
+            context = multiprocessing.get_context('fork')
+        else:
+            # Before Python 3.4, the only start method on POSIX is fork.
+            context = multiprocessing
+        self._pool = context.Pool(self.processes, initializer=self._init_worker)
+
+    def _init_worker(self):
+        # Inherited from the daemon, whose SIGTERM handler only sets an
+        # event. Workers must die on SIGTERM, or stop() could not end them.
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if hasattr(signal, 'pthread_sigmask'):
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, [signal.SIGTERM])
+        if self.initializer is not None:
+            self.initializer()
+
+    def shared(self, data=None, size=None):
+        """Return a new SharedMemory block of size bytes, or a copy of data
+
+        Pass the block to submit() or apply() instead of the data, and read
+        or write it through block.buf. Release it with release(), blocks
+        that are still around are released by stop().
+        """
+        if shared_memory is None:
+            raise RuntimeError("Shared memory needs Python 3.8 or newer")
+        if data is not None:
+            data = memoryview(data).cast('B')
+            size = data.nbytes
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        if data is not None:
+            block.buf[:size] = data
+        self._blocks[block.name] = block
+        return block
+
+    def release(self, block):
+        """Free a block created by shared()"""
+        self._blocks.pop(block.name, None)
+        block.close()
+        block.unlink()
+
+    def submit(self, function, *args):
+        """Call function(*args) in a worker, return a multiprocessing AsyncResult"""
+        if self._pool is None:
+            raise RuntimeError("The process pool is not running")
+        return self._pool.apply_async(_call, (function, args))
+
+    def apply(self, function, *args, **kwargs):
+        """Call function(*args) in a worker and return its result
+
+        Waits at most timeout seconds (keyword argument, default: forever),
+        then raises multiprocessing.TimeoutError.
+        """
+        return self.submit(function, *args).get(kwargs.get('timeout'))
+
+    def map(self, function, iterable, chunksize=None):
+        """Like map(), but the calls are spread over the workers"""
+        if self._pool is None:
+            raise RuntimeError("The process pool is not running")
+        return self._pool.map(function, iterable, chunksize)
+
+    def stop(self, timeout=None):
+        """Let the workers finish submitted work, kill them after timeout seconds"""
+        if self._pool is not None:
+            self._pool.close()
+            # Pool.join() has no timeout.
+            joiner = threading.Thread(target=self._pool.join)
+            joiner.daemon = True
+            joiner.start()
+            joiner.join(timeout)
+            if joiner.is_alive():
+                self._pool.terminate()
+                joiner.join()
+            self._pool = None
+        for block in list(self._blocks.values()):
+            self.release(block)
+
+
+def _call(function, args):
+    """Run in a worker: call function, then detach from the shared blocks"""
+    try:
+        return function(*args)
+    finally:
+        for arg in args:
+            if shared_memory is not None and isinstance(arg, shared_memory.SharedMemory):
+                try:
+                    arg.close()
+                except BufferError:
+                    # function kept a view of the memory, leave it mapped.
+                    pass
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Sampling profiler for a running daemon
+
+A background thread looks at the stacks of all other threads at a fixed
+interval and counts how often each stack was seen. The result is written in
+the collapsed stack format ("thread;outer;...;inner count" per line) that
+flamegraph.pl, speedscope and similar tools read. Nothing runs while the
+profiler is stopped.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import collections
+import os
+import sys
+import threading
+
+
+class Profiler(threading.Thread):
+    """Sample all threads every interval seconds until stop() is called"""
+
+    def __init__(self, path, interval=0.01):
+        super(Profiler, self).__init__(name='succubus-profiler')
+        self.daemon = True
+        self.path = path
+        self.interval = interval
+        # Maps collapsed stack -> number of samples.
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        # Formatting frames is the expensive part, so labels are cached.
+        self._labels = {}
+
+    def run(self):
+        own_ident = threading.current_thread().ident
+        while not self._stopped.wait(self.interval):
+            names = dict((thread.ident, thread.name)
+                         for thread in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident != own_ident:
+                    name = names.get(ident, 'thread-%d' % ident)
+                    self.stacks[self._collapse(name, frame)] += 1
+            self.samples += 1
+
+    def _collapse(self, thread_name, frame):
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = '%s (%s:%d)' % (code.co_name,
+                                        os.path.basename(code.co_filename),
+                                        code.co_firstlineno)
+                self._labels[code] = label
+            labels.append(label)
+            frame = frame.f_back
+        labels.append(thread_name)
+        return ';'.join(reversed(labels))
+
+    def stop(self, timeout=None):
+        """Stop sampling and write the collapsed stacks to self.path"""
+        self._stopped.set()
+        self.join(timeout)
+        self.write()
+
+    def write(self):
+        temp_file = '%s.tmp' % self.path
+        with open(temp_file, 'w') as output:
+            for stack, count in sorted(self.stacks.items()):
+                output.write('%s %d\n' % (stack, count))
+        os.rename(temp_file, self.path)
@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Run periodic and cron-like jobs without hand-written sleep loops
+
+Jobs are kept in a heap ordered by their next deadline, and the scheduler
+sleeps exactly until the earliest one, no matter how many jobs there are.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import datetime
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+from succubus.events import PipeEvent, wait_for_any
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:
+    _monotonic = time.time
+
+
+def _parse_cron_field(field, minimum, maximum):
+    """Return the set of values matched by one field of a cron expression"""
+    values = set()
+    for item in field.split(','):
+        step = 1
+        if '/' in item:
+            item, step = item.split('/', 1)
+            step = int(step)
+            if step < 1:
+                raise ValueError("Invalid step in cron field %r" % field)
+        if item == '*':
+            start, end = minimum, maximum
+        elif '-' in item:
+            start, end = [int(value) for value in item.split('-', 1)]
+        else:
+            start = int(item)
+            # "5/15" means "from 5 to the end, every 15".
+            end = maximum if step > 1 else start
+        if not minimum <= start <= end <= maximum:
+            raise ValueError("Cron field %r out of range %d-%d" % (field, minimum, maximum))
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule(object):
+    """A classic five-field cron expression: minute hour day month weekday
+
+    Fields support "*", lists ("1,15"), ranges ("1-5") and steps ("*/10").
+    Weekdays go from 0 (Sunday) to 6, 7 is Sunday as well. Like cron, a
+    time matches if day of month or weekday matches when both are
+    restricted. Times are local time.
+    """
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("Cron expression needs 5 fields: %r" % expression)
+        self.expression = expression
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        self.weekdays = set(day % 7 for day in _parse_cron_field(fields[4], 0, 7))
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    def _day_matches(self, when):
+        day = when.day in self.days
+        # datetime counts weekdays from Monday = 0, cron from Sunday = 0.
+        weekday = (when.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return weekday
+        if self._any_weekday:
+            return day
+        return day or weekday
+
+    def next_after(self, when):
+        """Return the first matching datetime after when"""
+        when = when.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        # Skip whole months, days and hours at a time. Give up after a few
+        # years, which only happens for impossible dates like "0 0 30 2 *".
+        limit = when.replace(year=when.year + 5)
+        while when < limit:
+            if when.month not in self.months:
+                year, month = divmod(when.month, 12)
+                when = when.replace(year=when.year + year, month=month + 1, day=1,
+                                    hour=0, minute=0)
+            elif not self._day_matches(when):
+                when = (when + datetime.timedelta(days=1)).replace(hour=0, minute=0)
+            elif when.hour not in self.hours:
+                when = (when + datetime.timedelta(hours=1)).replace(minute=0)
+            elif when.minute not in self.minutes:
+                when += datetime.timedelta(minutes=1)
+            else:
+                return when
+        raise ValueError("Cron expression %r never matches" % self.expression)
+
+
+class Job(object):
+    """A function the Scheduler calls periodically
+
+    Interval jobs are due every interval seconds, counted from their
+    previous deadline instead of from when the previous run finished, so
+    they do not drift. Runs that were missed (because the scheduler or the
+    job itself was busy) are coalesced into one, self.missed counts them.
+    Every run is delayed by a random amount of up to jitter seconds.
+    """
+
+    def __init__(self, function, interval=None, cron=None, jitter=0,
+                 blocking=False, name=None):
+        self.function = function
+        self.interval = interval
+        self.cron = cron
+        self.jitter = jitter
+        self.blocking = blocking
+        self.name = name or getattr(function, '__name__', repr(function))
+        self.runs = 0
+        self.missed = 0
+        self.cancelled = False
+        # Deadline without jitter (monotonic clock), and with it.
+        self.base = None
+        self.deadline = None
+        # Set while a blocking job is queued or running on the thread pool.
+        self.busy = False
+
+    def cancel(self):
+        """Do not run this job again"""
+        self.cancelled = True
+
+    def schedule(self, now, first=None):
+        """Compute the next deadline after the one that just became due"""
+        if self.cron is not None:
+            wall_now = datetime.datetime.now()
+            next_run = self.cron.next_after(wall_now)
+            self.base = now + (next_run - wall_now).total_seconds()
+        elif self.base is None:
+            self.base = now + (self.interval if first is None else first)
+        else:
+            periods = int((now - self.base) // self.interval) + 1
+            self.missed += periods - 1
+            self.base += periods * self.interval
+        self.deadline = self.base
+        if self.jitter:
+            self.deadline += random.uniform(0, self.jitter)
+
+    def __repr__(self):
+        return '<Job %s>' % self.name
+
+
+class _ThreadPool(object):
+    """A fixed number of threads started on first use"""
+
+    def __init__(self, size):
+        self.size = size
+        self._queue = queue.Queue()
+        self._threads = []
+
+    def submit(self, function):
+        if not self._threads:
+            for number in range(self.size):
+                thread = threading.Thread(target=self._work,
+                                          name='succubus-scheduler-%d' % number)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        self._queue.put(function)
+
+    def _work(self):
+        while True:
+            function = self._queue.get()
+            if function is None:
+                return
+            function()
+
+    def stop(self, timeout=None):
+        """Let the threads finish what is queued, wait up to timeout seconds"""
+        deadline = None if timeout is None else _monotonic() + timeout
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            remaining = None if deadline is None else max(deadline - _monotonic(), 0)
+            thread.join(remaining)
+        self._threads = []
+
+
+class Scheduler(object):
+    """Call Jobs when they are due, until stop() is called or stop_event is set
+
+    Jobs run one after another in the thread that called run(). Jobs added
+    with blocking=True run on a pool of max_workers threads instead, so a
+    slow job cannot delay the others. A blocking job is never queued again
+    while it is still queued or running. Exceptions raised by a job are
+    logged, the job is run again at its next deadline.
+    """
+
+    def __init__(self, max_workers=4, stop_event=None):
+        self.max_workers = max_workers
+        # run() also returns when this PipeEvent is set.
+        self.stop_event = stop_event
+        self.logger = logging.getLogger(__name__)
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = PipeEvent()
+        self._stopped = False
+        self._pool = _ThreadPool(max_workers)
+
+    def every(self, interval, function, jitter=0, blocking=False, first=None,
+              name=None):
+        """Call function every interval seconds, return the Job
+
+        The first call happens after first seconds, by default after one
+        interval.
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive, not %r" % interval)
+        job = Job(function, interval=interval, jitter=jitter,
+                  blocking=blocking, name=name)
+        job.schedule(_monotonic(), first)
+        self._push(job)
+        return job
+
+    def cron(self, expression, function, jitter=0, blocking=False, name=None):
+        """Call function whenever the cron expression matches, return the Job"""
+        job = Job(function, cron=CronSchedule(expression), jitter=jitter,
+                  blocking=blocking, name=name)
+        job.schedule(_monotonic())
+        self._push(job)
+        return job
+
+    @property
+    def jobs(self):
+        with self._lock:
+            return [job for _, _, job in sorted(self._heap) if not job.cancelled]
+
+    def _push(self, job):
+        with self._lock:
+            heapq.heappush(self._heap, (job.deadline, next(self._counter), job))
+        # The new job may be due before the one run() is waiting for.
+        self._wakeup.set()
+
+    def _pop_due(self):
+        """Return the due jobs (rescheduled already) and the time to sleep"""
+        due = []
+        with self._lock:
+            now = _monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, job = heapq.heappop(self._heap)
+                if job.cancelled:
+                    continue
+                job.schedule(now)
+                due.append(job)
+            for job in due:
+                heapq.heappush(self._heap, (job.deadline, next(self._counter), job))
+            timeout = self._heap[0][0] - now if self._heap else None
+        return due, timeout
+
+    def _stopping(self):
+        return self._stopped or (self.stop_event is not None and
+                                 self.stop_event.is_set())
+
+    def run(self):
+        """Run jobs as they become due until stop() is called"""
+        events = [self._wakeup]
+        if self.stop_event is not None:
+            events.append(self.stop_event)
+        while not self._stopping():
+            self._wakeup.clear()
+            due, timeout = self._pop_due()
+            for job in due:
+                if self._stopping():
+                    break
+                if not job.blocking:
+                    self._execute(job)
+                elif job.busy:
+                    job.missed += 1
+                else:
+                    job.busy = True
+                    self._pool.submit(lambda job=job: self._execute(job))
+            if not due:
+                wait_for_any(events, timeout)
+
+    def _execute(self, job):
+        try:
+            job.function()
+        except Exception:
+            self.logger.exception("Error in scheduled job %s:", job.name)
+        finally:
+            job.runs += 1
+            job.busy = False
+
+    def stop(self, timeout=None):
+        """Make run() return, wait up to timeout seconds for running jobs"""
+        self._stopped = True
+        self._wakeup.set()
+        self._pool.stop(timeout)
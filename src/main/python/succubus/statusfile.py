@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Live status of a running daemon in a memory-mapped file
+
+The daemon updates the file in place through a shared mapping, which is a
+plain memory write without any system call. Readers (``status --verbose``,
+monitoring agents) map the same file and read it without talking to the
+daemon.
+
+The layout is fixed, in native byte order (standard sizes, no padding):
+
+====== ==== ===========================================================
+offset size field
+====== ==== ===========================================================
+0      4    magic b'SUCS'
+4      4    layout version (uint32, currently 1)
+8      8    pid (int64)
+16     8    started_at, seconds since the epoch (double)
+24     8    last heartbeat, seconds since the epoch, 0 if none (double)
+32     8    last update of rss and queue depth (double)
+40     8    loop iterations, i.e. heartbeats (uint64)
+48     8    queue depth (int64)
+56     8    resident memory in bytes (uint64)
+64     32n  counters: name (24 bytes, NUL padded UTF-8), value (int64)
+====== ==== ===========================================================
+
+Fields are written one at a time, so a reader sees every field either
+before or after an update, but not all fields from the same instant.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b'SUCS'
+VERSION = 1
+HEADER = struct.Struct('=4sIqdddQqQ')
+COUNTER = struct.Struct('=24sq')
+COUNTERS = 32
+
+_TIME = struct.Struct('=d')
+_UINT = struct.Struct('=Q')
+_INT = struct.Struct('=q')
+_HEARTBEAT_OFFSET = 24
+_UPDATED_OFFSET = 32
+_ITERATIONS_OFFSET = 40
+_QUEUE_DEPTH_OFFSET = 48
+_RSS_OFFSET = 56
+
+
+def read(path):
+    """Return the contents of a status file as a dict, or None
+
+    Returns None if the file does not exist or is not a status file.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        size = os.fstat(fd).st_size
+        if size < HEADER.size:
+            return None
+        memory = mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+    try:
+        (magic, version, pid, started_at, heartbeat, updated_at, iterations,
+         queue_depth, rss) = HEADER.unpack_from(memory, 0)
+        if magic != MAGIC or version != VERSION:
+            return None
+        counters = {}
+        for offset in range(HEADER.size, size - COUNTER.size + 1, COUNTER.size):
+            name, value = COUNTER.unpack_from(memory, offset)
+            name = name.rstrip(b'\0')
+            if name:
+                counters[name.decode('utf-8', 'replace')] = value
+    finally:
+        memory.close()
+    return {'pid': pid,
+            'started_at': started_at,
+            'heartbeat': heartbeat or None,
+            'updated_at': updated_at or None,
+            'iterations': iterations,
+            'queue_depth': queue_depth,
+            'rss': rss,
+            'counters': counters}
+
+
+class StatusCounter(object):
+    """One named counter in a status file"""
+
+    def __init__(self, memory, offset):
+        self._memory = memory
+        self._offset = offset
+
+    def inc(self, amount=1):
+        value = _INT.unpack_from(self._memory, self._offset)[0]
+        _INT.pack_into(self._memory, self._offset, value + amount)
+
+    def set(self, value):
+        _INT.pack_into(self._memory, self._offset, value)
+
+    @property
+    def value(self):
+        return _INT.unpack_from(self._memory, self._offset)[0]
+
+
+class StatusFile(object):
+    """The writing side of a status file
+
+    With path None, the status is kept in anonymous memory only, so that
+    code writing to it does not need to care whether the file is enabled.
+    The mapping is shared with forked processes.
+    """
+
+    def __init__(self, path, pid, started_at, counters=COUNTERS):
+        self.path = path
+        # Only the creator removes the file, not forked children.
+        self._owner = os.getpid()
+        size = HEADER.size + counters * COUNTER.size
+        if path is None:
+            self._memory = mmap.mmap(-1, size)
+        else:
+            temp_file = '%s.%d.tmp' % (path, os.getpid())
+            fd = os.open(temp_file, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                os.ftruncate(fd, size)
+                self._memory = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        HEADER.pack_into(self._memory, 0, MAGIC, VERSION, pid, started_at,
+                         0, 0, 0, 0, 0)
+        self._counters = {}
+        self._lock = threading.Lock()
+        if path is not None:
+            # Readers never see a half-initialized file.
+            os.rename(temp_file, path)
+
+    def beat(self):
+        """Record a heartbeat and count one loop iteration"""
+        _TIME.pack_into(self._memory, _HEARTBEAT_OFFSET, time.time())
+        iterations = _UINT.unpack_from(self._memory, _ITERATIONS_OFFSET)[0]
+        _UINT.pack_into(self._memory, _ITERATIONS_OFFSET, iterations + 1)
+
+    def update(self, rss, queue_depth):
+        _UINT.pack_into(self._memory, _RSS_OFFSET, rss)
+        _INT.pack_into(self._memory, _QUEUE_DEPTH_OFFSET, queue_depth)
+        _TIME.pack_into(self._memory, _UPDATED_OFFSET, time.time())
+
+    def counter(self, name):
+        """Return the StatusCounter called name, allocating it if needed
+
+        Raises ValueError if the name is too long or all slots are taken.
+        """
+        counter = self._counters.get(name)
+        if counter is not None:
+            return counter
+        encoded = name.encode('utf-8')
+        if len(encoded) > COUNTER.size - _INT.size:
+            raise ValueError("Counter name %r is too long" % name)
+        with self._lock:
+            for offset in range(HEADER.size, len(self._memory), COUNTER.size):
+                slot_name = COUNTER.unpack_from(self._memory, offset)[0].rstrip(b'\0')
+                # A forked process may have allocated it already.
+                if slot_name == encoded or not slot_name:
+                    if not slot_name:
+                        COUNTER.pack_into(self._memory, offset, encoded, 0)
+                    counter = StatusCounter(self._memory,
+                                            offset + COUNTER.size - _INT.size)
+                    self._counters[name] = counter
+                    return counter
+        raise ValueError("No room for another counter in the status file")
+
+    def close(self):
+        """Remove the file, if this process created it"""
+        if self.path is not None and os.getpid() == self._owner:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class StatusUpdater(threading.Thread):
+    """Write the daemon's resident memory and queue depth every second
+
+    These need system calls or locks, which keeps them off the hot path.
+    """
+
+    interval = 1
+
+    def __init__(self, daemon):
+        super(StatusUpdater, self).__init__(name='succubus-status')
+        self.daemon = True
+        self.succubus_daemon = daemon
+
+    def run(self):
+        import psutil
+        process = psutil.Process()
+        daemon = self.succubus_daemon
+        while True:
+            try:
+                daemon._status.update(process.memory_info().rss,
+                                      daemon.queue_depth())
+            except Exception:
+                daemon.logger.exception("Could not update the status file:")
+            if daemon.shutdown_requested.wait(self.interval):
+                return
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Restart a crashed daemon from a supervising parent process
+
+With Daemon.supervise set, the daemonized process (the one named in the pid
+file) does not call run() itself. It forks a child that does, and forks a
+new one whenever the child dies with a non-zero exit status or a signal.
+Restarts are delayed with exponential backoff and jitter, and when the
+daemon crashes too often within a time window, the supervisor gives up.
+
+If the daemon has a watchdog_interval, the supervisor also restarts a child
+that stopped sending heartbeats. It sends SIGABRT, on which faulthandler in
+the child writes the stacks of all threads, even if a C extension holds the
+GIL. The supervisor then logs them.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import collections
+import json
+import os
+import random
+import signal
+import tempfile
+import time
+
+try:
+    import faulthandler
+except ImportError:
+    # Python 2: a hung child is still restarted, just without its stacks.
+    faulthandler = None
+
+from succubus.events import PipeEvent, wait_for_any
+
+
+_HANDLED_SIGNALS = [signal.SIGCHLD, signal.SIGTERM, signal.SIGHUP,
+                    signal.SIGUSR1, signal.SIGUSR2]
+
+
+def describe_exit(status):
+    """Describe a wait status from os.waitpid() in words"""
+    if os.WIFSIGNALED(status):
+        number = os.WTERMSIG(status)
+        try:
+            name = signal.Signals(number).name
+        except (AttributeError, ValueError):
+            name = 'signal %d' % number
+        return 'killed by %s' % name
+    return 'exit code %d' % os.WEXITSTATUS(status)
+
+
+def read_state(path):
+    """Return the state written by a Supervisor, or None"""
+    try:
+        with open(path) as state_file:
+            return json.load(state_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+class Supervisor(object):
+    """Run the daemon in child processes, one after the other"""
+
+    def __init__(self, daemon):
+        self.daemon = daemon
+        self.state_file = daemon.supervisor_state_file
+        self.restarts = 0
+        self.last_exit = None
+        self.child_pid = None
+        self.gave_up = False
+        # Times of the restarts within the last daemon.restart_window seconds.
+        self._recent_restarts = collections.deque()
+        # Crashes since the child last ran for longer than the maximum
+        # backoff, which determine the next delay.
+        self._consecutive_crashes = 0
+        self._child_exited = PipeEvent()
+        # Signal mask of the daemon before run() unblocked the signals.
+        self._sigmask = None
+        # faulthandler in the child writes here when it crashes or hangs.
+        self._dump_file = tempfile.TemporaryFile()
+
+    def run(self):
+        """Supervise children until shutdown, return the exit code
+
+        Returns None in the child, which then goes on to run the daemon.
+        """
+        signal.signal(signal.SIGCHLD, self._handle_sigchld)
+        # The supervisor must not raise on SIGTERM (raise_on_sigterm is
+        # meant for run()), nor hand its sockets over on SIGUSR2.
+        signal.signal(signal.SIGTERM, self._handle_sigterm)
+        signal.signal(signal.SIGUSR2, signal.SIG_IGN)
+        # The configuration is reloaded, and profiling done, by the child.
+        signal.signal(signal.SIGHUP, self._forward_signal)
+        signal.signal(signal.SIGUSR1, self._forward_signal)
+        # PreforkDaemon blocks the signals its master collects with
+        # sigtimedwait(). Here they must reach the handlers above, the
+        # child gets the blocked mask back in _fork().
+        if hasattr(signal, 'pthread_sigmask'):
+            self._sigmask = signal.pthread_sigmask(signal.SIG_UNBLOCK, _HANDLED_SIGNALS)
+        shutdown_requested = self.daemon.shutdown_requested
+        while True:
+            started = time.time()
+            if self.daemon._heartbeat is not None:
+                self.daemon._heartbeat.reset()
+            self.child_pid = self._fork()
+            if self.child_pid == 0:
+                return None
+            self._write_state()
+            status = self._wait_for_child()
+            if status is None:
+                self.daemon.logger.info("Stopping supervised daemon (pid %d)",
+                                        self.child_pid)
+                self._stop_child()
+                return 0
+            if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+                self.daemon.logger.info("Supervised daemon (pid %d) exited",
+                                        self.child_pid)
+                return 0
+            self.last_exit = describe_exit(status)
+            self.daemon.logger.error("Supervised daemon (pid %d) crashed: %s",
+                                     self.child_pid, self.last_exit)
+            self._log_dump()
+            delay = self._next_delay(time.time() - started)
+            if delay is None:
+                self.daemon.logger.error(
+                    "Daemon crashed %d times within %s seconds, giving up",
+                    self.daemon.restart_limit + 1, self.daemon.restart_window)
+                self.gave_up = True
+                self.child_pid = None
+                self._write_state()
+                return 1
+            self.daemon.logger.info("Restarting daemon in %.1f seconds", delay)
+            if shutdown_requested.wait(delay):
+                return 0
+            self.restarts += 1
+            self.daemon.restarts.inc()
+
+    def _handle_sigchld(self, *args):
+        self._child_exited.set()
+
+    def _handle_sigterm(self, *args):
+        self.daemon.shutdown_requested.set()
+
+    def _forward_signal(self, signum, frame):
+        if self.child_pid:
+            try:
+                os.kill(self.child_pid, signum)
+            except OSError:
+                pass
+
+    def _fork(self):
+        supervisor_pid = os.getpid()
+        pid = os.fork()
+        if pid == 0:
+            self.daemon._supervisor_pid = supervisor_pid
+            if self._sigmask is not None:
+                signal.pthread_sigmask(signal.SIG_SETMASK, self._sigmask)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, self.daemon._handle_sigterm)
+            signal.signal(signal.SIGUSR2, signal.SIG_DFL)
+            signal.signal(signal.SIGHUP, self.daemon._handle_sighup)
+            signal.signal(signal.SIGUSR1, self.daemon._handle_sigusr1)
+            self.daemon._supervisor = None
+            # SIGTERM for the child must not wake up the supervisor, nor
+            # may the child swallow wakeups meant for the supervisor.
+            self.daemon.shutdown_requested.close()
+            self.daemon.shutdown_requested = PipeEvent()
+            self._child_exited.close()
+            if self.daemon._pid_file_fd is not None:
+                # The pid file lock belongs to the supervisor. An orphaned
+                # child must not keep the daemon "running".
+                os.close(self.daemon._pid_file_fd)
+                self.daemon._pid_file_fd = None
+            if faulthandler is not None:
+                faulthandler.enable(self._dump_file, all_threads=True)
+        return pid
+
+    def _next_delay(self, runtime):
+        """Return the seconds to wait before the next restart, or None to give up"""
+        now = time.time()
+        while (self._recent_restarts and
+               self._recent_restarts[0] < now - self.daemon.restart_window):
+            self._recent_restarts.popleft()
+        if len(self._recent_restarts) >= self.daemon.restart_limit:
+            return None
+        self._recent_restarts.append(now)
+        if runtime > self.daemon.restart_backoff_max:
+            self._consecutive_crashes = 0
+        delay = min(self.daemon.restart_backoff * 2 ** self._consecutive_crashes,
+                    self.daemon.restart_backoff_max)
+        self._consecutive_crashes += 1
+        # Keep supervisors that were started together from restarting in
+        # lockstep.
+        return random.uniform(delay / 2, delay)
+
+    def _poll_child(self):
+        """Return the wait status of the child if it has exited, else None"""
+        self._child_exited.clear()
+        pid, status = os.waitpid(self.child_pid, os.WNOHANG)
+        return status if pid == self.child_pid else None
+
+    def _wait_for_child(self):
+        """Wait for the child to exit, return None if shutdown was requested first
+
+        A child that missed its heartbeat is killed.
+        """
+        events = [self._child_exited, self.daemon.shutdown_requested]
+        heartbeat = self.daemon._heartbeat
+        timeout = None if heartbeat is None else heartbeat.interval / 4
+        while True:
+            status = self._poll_child()
+            if status is not None:
+                return status
+            if self.daemon.shutdown_requested.is_set():
+                return None
+            silence = None if heartbeat is None else heartbeat.missed()
+            if silence is not None:
+                self.daemon.logger.error(
+                    "Supervised daemon (pid %d) sent no heartbeat for %.1f "
+                    "seconds, killing it", self.child_pid, silence)
+                return self._kill_child(signal.SIGABRT, timeout=5)
+            wait_for_any(events, timeout)
+
+    def _kill_child(self, signum, timeout):
+        """Send signum to the child, SIGKILL after timeout, return its wait status"""
+        try:
+            os.kill(self.child_pid, signum)
+        except OSError:
+            pass
+        deadline = time.time() + timeout
+        while True:
+            status = self._poll_child()
+            if status is not None:
+                return status
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                os.kill(self.child_pid, signal.SIGKILL)
+                return os.waitpid(self.child_pid, 0)[1]
+            self._child_exited.wait(remaining)
+
+    def _log_dump(self):
+        """Log what faulthandler wrote for the child that just died"""
+        self._dump_file.seek(0)
+        dump = self._dump_file.read().decode('utf-8', 'replace').strip()
+        self._dump_file.seek(0)
+        self._dump_file.truncate()
+        if dump:
+            self.daemon.logger.error("Stacks of all threads of pid %d:\n%s",
+                                     self.child_pid, dump)
+
+    def _stop_child(self):
+        """Forward SIGTERM to the child, kill it if it does not exit in time"""
+        status = self._kill_child(signal.SIGTERM, self.daemon.shutdown_timeout * 0.8)
+        if os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGKILL:
+            self.daemon.logger.warning(
+                "Had to kill supervised daemon (pid %d) with SIGKILL",
+                self.child_pid)
+
+    def _write_state(self):
+        """Atomically replace the state file read by "status" """
+        state = {'supervisor_pid': os.getpid(),
+                 'child_pid': self.child_pid,
+                 'restarts': self.restarts,
+                 'last_exit': self.last_exit,
+                 'gave_up': self.gave_up}
+        temp_file = '%s.%d.tmp' % (self.state_file, os.getpid())
+        try:
+            with open(temp_file, 'w') as state_file:
+                json.dump(state, state_file)
+            os.rename(temp_file, self.state_file)
+        except (IOError, OSError):
+            self.daemon.logger.exception("Could not write %s:", self.state_file)
+
+    def close(self):
+        """Remove the state file, unless it tells that we gave up"""
+        self._dump_file.close()
+        if not self.gave_up:
+            try:
+                os.remove(self.state_file)
+            except OSError:
+                pass
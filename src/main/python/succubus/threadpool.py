@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, absolute_import, division
+
+import multiprocessing
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from succubus.daemonize import Daemon
+from succubus.events import PipeEvent, wait_for_any
+from succubus.metrics import Gauge
+
+
+class ThreadPoolDaemon(Daemon):
+    """Daemon that handles work items on a pool of threads
+
+    Instead of run(), implement get_work() and handle(). get_work() is
+    called in the main thread and returns the next work item, or None if
+    there is no work right now (it is then called again after
+    self.poll_interval seconds). handle(item) is called in one of
+    self.threads threads.
+
+    At most self.queue_size fetched items wait for a free thread. While
+    that many are waiting, get_work() is not called, so the work source
+    sees backpressure instead of the daemon buffering without limit.
+
+    On SIGTERM, get_work() is not called anymore. The items fetched so far
+    are still handled, for at most 0.8 * self.shutdown_timeout seconds,
+    then shutdown() is called.
+    """
+
+    def __init__(self, *args, **kwargs):
+        threads = kwargs.pop('threads', None)
+        queue_size = kwargs.pop('queue_size', None)
+        super(ThreadPoolDaemon, self).__init__(*args, **kwargs)
+        # Like concurrent.futures.ThreadPoolExecutor, for I/O bound work.
+        self.threads = threads or min(32, multiprocessing.cpu_count() + 4)
+        self.queue_size = self.threads if queue_size is None else queue_size
+        self.poll_interval = 1
+        self.work_latency = self.metrics.histogram(
+            'succubus_work_latency_seconds',
+            'Seconds from fetching a work item until it was handled.')
+        self.work_errors = self.metrics.counter(
+            'succubus_work_errors_total', 'Work items whose handler failed.')
+        self.metrics.add_collector(self._collect_queue_metrics)
+        self._work_queue = queue.Queue()
+        # Items fetched but not handled yet, limited to threads + queue_size.
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._capacity = PipeEvent()
+
+    def get_work(self):
+        """Return the next work item, or None if there is none right now"""
+        raise NotImplementedError
+
+    def handle(self, item):
+        """Process one work item, called in a pool thread"""
+        raise NotImplementedError
+
+    def queue_depth(self):
+        return self._work_queue.qsize()
+
+    def _collect_queue_metrics(self):
+        depth = Gauge('succubus_work_queue_depth',
+                      'Work items waiting for a free thread.')
+        depth.set(self._work_queue.qsize())
+        in_flight = Gauge('succubus_work_in_flight',
+                          'Work items fetched but not handled yet.')
+        in_flight.set(self._in_flight)
+        return [depth, in_flight]
+
+    def _run(self):
+        threads = []
+        for number in range(self.threads):
+            thread = threading.Thread(target=self._work,
+                                      name='succubus-worker-%d' % number)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        if not self.wait_for_ready:
+            self.notify_ready()
+        try:
+            self._fetch_work()
+        finally:
+            self._drain(threads, time.time() + self.shutdown_timeout * 0.8)
+
+    def _fetch_work(self):
+        """Call get_work() and queue its items until shutdown is requested"""
+        while self._reserve():
+            # Stops when all threads are stuck, or get_work() is.
+            self.heartbeat()
+            try:
+                item = self.get_work()
+            except Exception:
+                self.logger.exception("Error while fetching work:")
+                item = None
+            if item is None:
+                self._release()
+                self.wait(self.poll_interval)
+                continue
+            self._work_queue.put((time.time(), item))
+
+    def _reserve(self):
+        """Wait for room for one more item, return False on shutdown"""
+        limit = self.threads + self.queue_size
+        while not self.shutdown_requested.is_set():
+            with self._lock:
+                if self._in_flight < limit:
+                    self._in_flight += 1
+                    return True
+                self._capacity.clear()
+            wait_for_any([self._capacity, self.shutdown_requested])
+        return False
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._capacity.set()
+
+    def _work(self):
+        while True:
+            entry = self._work_queue.get()
+            if entry is None:
+                return
+            fetched_at, item = entry
+            try:
+                self.handle(item)
+            except Exception:
+                self.work_errors.inc()
+                self.logger.exception("Error while handling a work item:")
+            finally:
+                self.work_latency.observe(time.time() - fetched_at)
+                self._release()
+
+    def _drain(self, threads, deadline):
+        """Let the threads handle all queued items, but not beyond deadline"""
+        for _ in threads:
+            self._work_queue.put(None)
+        for thread in threads:
+            thread.join(max(deadline - time.time(), 0))
+        if self._in_flight:
+            self.logger.warning("%d work items were not handled within the "
+                                "shutdown timeout", self._in_flight)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Detect a daemon that hangs, and speak systemd's sd_notify protocol
+
+The daemon calls Daemon.heartbeat() regularly. The time of the last
+heartbeat is kept in shared memory, so that the supervising parent (see
+succubus.supervisor) can read it as well as a thread in the daemon itself.
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import mmap
+import os
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+try:
+    import faulthandler
+except ImportError:
+    # Python 2
+    faulthandler = None
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:
+    _monotonic = time.time
+
+
+def sd_notify(message):
+    """Send message (e.g. 'READY=1') to systemd, return False if not possible
+
+    Does nothing unless $NOTIFY_SOCKET is set. The service needs
+    NotifyAccess=all, because the daemon is not the process systemd started.
+    """
+    address = os.environ.get('NOTIFY_SOCKET')
+    if not address:
+        return False
+    if address.startswith('@'):
+        # Abstract namespace socket.
+        address = '\0' + address[1:]
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        sock.sendto(message.encode('utf-8'), address)
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+def dump_stacks():
+    """Return the stack traces of all threads as formatted by faulthandler
+
+    faulthandler writes to a file descriptor, so the traces take a detour
+    through a temporary file. Without faulthandler (Python 2), the traces
+    are formatted with the traceback module.
+    """
+    if faulthandler is None:
+        names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            stacks.append('Thread %s (%s):\n%s' % (
+                ident, names.get(ident, '?'), ''.join(traceback.format_stack(frame))))
+        return '\n'.join(stacks)
+    with tempfile.TemporaryFile() as dump_file:
+        faulthandler.dump_traceback(dump_file, all_threads=True)
+        dump_file.seek(0)
+        return dump_file.read().decode('utf-8', 'replace')
+
+
+class Heartbeat(object):
+    """Time of the last heartbeat, in memory shared with forked processes
+
+    The watch is armed by the first heartbeat, so loading data before
+    run() cannot be mistaken for a hang.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._memory = mmap.mmap(-1, 8)
+        self._last_notify = 0
+        self.notify = bool(os.environ.get('NOTIFY_SOCKET'))
+
+    def beat(self):
+        now = _monotonic()
+        struct.pack_into('d', self._memory, 0, now)
+        # systemd wants WATCHDOG=1 at least every WATCHDOG_USEC, sending it
+        # twice per interval is plenty.
+        if self.notify and now - self._last_notify >= self.interval / 2:
+            self._last_notify = now
+            sd_notify('WATCHDOG=1')
+
+    def reset(self):
+        """Disarm the watch until the next heartbeat"""
+        struct.pack_into('d', self._memory, 0, 0)
+
+    def silence(self):
+        """Seconds since the last heartbeat, None before the first one"""
+        last = struct.unpack_from('d', self._memory, 0)[0]
+        if last == 0:
+            return None
+        return _monotonic() - last
+
+    def missed(self):
+        """Return the seconds of silence if the heartbeat is overdue, else None"""
+        silence = self.silence()
+        if silence is not None and silence > self.interval:
+            return silence
+        return None
+
+
+class Watchdog(threading.Thread):
+    """Kill the daemon from within when its heartbeat stops
+
+    Used when no supervisor watches the daemon. The thread needs the GIL,
+    so it cannot help against a C extension that hangs while holding it.
+    """
+
+    def __init__(self, daemon):
+        super(Watchdog, self).__init__(name='succubus-watchdog')
+        self.daemon = True
+        self.succubus_daemon = daemon
+
+    def run(self):
+        daemon = self.succubus_daemon
+        heartbeat = daemon._heartbeat
+        while not daemon.shutdown_requested.wait(heartbeat.interval / 4):
+            silence = heartbeat.missed()
+            if silence is not None:
+                daemon.logger.error("No heartbeat for %.1f seconds, killing the "
+                                    "daemon. Stacks of all threads:\n%s",
+                                    silence, dump_stacks())
+                daemon._flush_logging(time.time() + 1)
+                os.kill(os.getpid(), signal.SIGKILL)
+                return
@@ -0,0 +1,53 @@
+"""Coroutine daemons for asyncdaemon_tests
+
+Kept apart because Python < 3.7 cannot even compile them.
+"""
+from __future__ import print_function, absolute_import, division
+
+import asyncio
+import os
+import signal
+
+from succubus import AsyncDaemon
+
+
+class EventDaemon(AsyncDaemon):
+    def __init__(self, *args, **kwargs):
+        super(EventDaemon, self).__init__(*args, **kwargs)
+        self.events = []
+
+
+class SimpleDaemon(EventDaemon):
+    async def run(self):
+        await asyncio.sleep(0)
+        self.events.append("run")
+
+    async def shutdown(self):
+        self.events.append("shutdown")
+
+
+class SigtermDaemon(EventDaemon):
+    async def run(self):
+        asyncio.get_running_loop().call_soon(
+            os.kill, os.getpid(), signal.SIGTERM)
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.events.append("cancelled")
+            raise
+
+    async def shutdown(self):
+        self.events.append("shutdown")
+
+
+class SlowShutdownDaemon(EventDaemon):
+    async def run(self):
+        pass
+
+    async def shutdown(self):
+        await asyncio.sleep(60)
+
+
+class FailingDaemon(EventDaemon):
+    async def run(self):
+        raise ZeroDivisionError
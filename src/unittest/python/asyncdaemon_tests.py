@@ -0,0 +1,51 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase, skipIf
+from mock import patch, Mock
+import sys
+
+if sys.version_info >= (3, 7):
+    import asyncdaemon_fixtures
+
+
+@skipIf(sys.version_info < (3, 7), "AsyncDaemon needs Python 3.7+")
+class TestAsyncDaemon(TestCase):
+    def setUp(self):
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['foo', 'bar']
+
+    def tearDown(self):
+        self.mock_sys_context.__exit__()
+
+    def make_daemon(self, daemon_class):
+        daemon = daemon_class(pid_file="foo")
+        daemon.logger = Mock()
+        return daemon
+
+    def test_run_coroutine_is_executed(self):
+        daemon = self.make_daemon(asyncdaemon_fixtures.SimpleDaemon)
+
+        daemon._run()
+
+        self.assertEqual(daemon.events, ["run", "shutdown"])
+
+    def test_sigterm_cancels_tasks_and_awaits_shutdown(self):
+        daemon = self.make_daemon(asyncdaemon_fixtures.SigtermDaemon)
+
+        daemon._run()
+
+        self.assertEqual(daemon.events, ["cancelled", "shutdown"])
+
+    def test_slow_shutdown_is_aborted_after_timeout(self):
+        daemon = self.make_daemon(asyncdaemon_fixtures.SlowShutdownDaemon)
+        daemon.shutdown_timeout = 0.05
+
+        daemon._run()
+
+        self.assertTrue(daemon.logger.error.called)
+
+    def test_exception_in_run_is_propagated(self):
+        daemon = self.make_daemon(asyncdaemon_fixtures.FailingDaemon)
+
+        self.assertRaises(ZeroDivisionError, daemon._run)
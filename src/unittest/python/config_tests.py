@@ -0,0 +1,118 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase
+from mock import patch
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from succubus import config
+
+
+class TestMerge(TestCase):
+    def test_nested_dicts_are_merged(self):
+        base = {'db': {'host': 'a', 'port': 1}, 'debug': False}
+
+        merged = config.merge(base, {'db': {'host': 'b'}, 'debug': True})
+
+        self.assertEqual(merged, {'db': {'host': 'b', 'port': 1}, 'debug': True})
+        self.assertEqual(base['db']['host'], 'a')
+
+    def test_environment_overrides_nested_keys(self):
+        environ = {'FOO_DB__PORT': '5432', 'FOO_NAME': 'bar', 'OTHER': 'x'}
+
+        result = config.apply_env({'db': {'host': 'a'}}, 'FOO_', environ)
+
+        self.assertEqual(result, {'db': {'host': 'a', 'port': 5432}, 'name': 'bar'})
+
+
+class TestLoadFiles(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.cache_file = os.path.join(self.temp_dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, content, age=60):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w') as config_file:
+            config_file.write(content)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_later_files_take_precedence(self):
+        base = self.write('base.json', json.dumps({'a': 1, 'b': {'c': 2}}))
+        local = self.write('local.json', json.dumps({'b': {'c': 3}}))
+        missing = os.path.join(self.temp_dir, 'missing.json')
+
+        result = config.load_files([base, local, missing])
+
+        self.assertEqual(result, {'a': 1, 'b': {'c': 3}})
+
+    def test_yaml_files_are_supported(self):
+        try:
+            import yaml  # noqa: F401
+        except ImportError:
+            self.skipTest("PyYAML is not installed")
+        path = self.write('base.yml', 'a:\n  b: [1, 2]\n')
+
+        self.assertEqual(config.load_files([path]), {'a': {'b': [1, 2]}})
+
+    def test_file_must_contain_mapping(self):
+        path = self.write('list.json', '[1, 2]')
+
+        self.assertRaises(ValueError, config.load_files, [path])
+
+    @patch("succubus.config._parse")
+    def test_unchanged_files_are_not_parsed_again(self, mock_parse):
+        path = self.write('base.json', '{}')
+        mock_parse.return_value = {'a': 1}
+
+        config.load_files([path], self.cache_file)
+        result = config.load_files([path], self.cache_file)
+
+        self.assertEqual(result, {'a': 1})
+        self.assertEqual(mock_parse.call_count, 1)
+
+    def test_changed_files_are_parsed_again(self):
+        path = self.write('base.json', '{"a": 1}')
+        config.load_files([path], self.cache_file)
+
+        self.write('base.json', '{"a": 22}', age=30)
+
+        self.assertEqual(config.load_files([path], self.cache_file), {'a': 22})
+
+    def test_modification_time_without_nanoseconds(self):
+        class Python2Stat(object):
+            st_mtime = 1000.5
+
+        self.assertEqual(config._mtime_ns(Python2Stat()), 1000500000000)
+
+    @patch("succubus.config._parse")
+    def test_freshly_modified_files_are_not_cached(self, mock_parse):
+        path = self.write('base.json', '{}', age=0)
+        mock_parse.return_value = {'a': 1}
+
+        config.load_files([path], self.cache_file)
+        config.load_files([path], self.cache_file)
+
+        self.assertEqual(mock_parse.call_count, 2)
+
+    def test_broken_cache_is_ignored(self):
+        path = self.write('base.json', '{"a": 1}')
+        with open(self.cache_file, 'w') as cache:
+            cache.write('garbage')
+
+        self.assertEqual(config.load_files([path], self.cache_file), {'a': 1})
+
+    def test_load_applies_environment(self):
+        path = self.write('base.json', '{"a": 1}')
+
+        with patch.dict(os.environ, {'TEST_A': '2'}):
+            result = config.load([path], env_prefix='TEST_')
+
+        self.assertEqual(result, {'a': 2})
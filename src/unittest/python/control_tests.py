@@ -0,0 +1,86 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase
+import json
+import os
+import shutil
+import socket
+import tempfile
+
+from succubus import control
+
+
+class TestControlServer(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.path = os.path.join(self.temp_dir, 'control.sock')
+        self.server = control.ControlServer(self.path, {
+            'echo': lambda *args: list(args),
+            'fail': lambda: 1 / 0,
+        })
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def test_handle_executes_command(self):
+        line = json.dumps({'command': 'echo', 'args': [1, 'two']})
+
+        response = json.loads(self.server.handle(line))
+
+        self.assertEqual(response, {'ok': True, 'result': [1, 'two']})
+
+    def test_handle_reports_unknown_command(self):
+        response = json.loads(self.server.handle('{"command": "nope"}'))
+
+        self.assertFalse(response['ok'])
+        self.assertIn("Unknown command: nope", response['error'])
+
+    def test_handle_reports_exceptions(self):
+        response = json.loads(self.server.handle('{"command": "fail"}'))
+
+        self.assertFalse(response['ok'])
+        self.assertIn("ZeroDivisionError", response['error'])
+
+    def test_handle_reports_garbage(self):
+        response = json.loads(self.server.handle('garbage'))
+
+        self.assertFalse(response['ok'])
+
+    def test_request_roundtrip(self):
+        self.server.start()
+
+        self.assertEqual(control.request(self.path, 'echo', ['x']), ['x'])
+        self.assertRaises(control.ControlError, control.request, self.path, 'fail')
+
+    def test_socket_is_only_accessible_by_owner(self):
+        # Like in the daemon process.
+        old_umask = os.umask(0)
+        try:
+            self.server.start()
+            umask = os.umask(0)
+        finally:
+            os.umask(old_umask)
+
+        self.assertEqual(os.stat(self.path).st_mode & 0o077, 0)
+        self.assertEqual(umask, 0)
+
+    def test_request_fails_if_nobody_listens(self):
+        self.assertRaises(socket.error, control.request, self.path, 'echo')
+
+    def test_stop_removes_socket(self):
+        self.server.start()
+
+        self.server.stop()
+
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_stop_keeps_socket_of_successor(self):
+        self.server.start()
+        successor = control.ControlServer(self.path, {})
+        successor.start()
+
+        self.server.stop()
+
+        self.assertTrue(os.path.exists(self.path))
+        successor.stop()
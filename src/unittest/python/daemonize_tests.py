@@ -2,13 +2,24 @@ from __future__ import print_function, absolute_import, division
 
 from unittest2 import TestCase
 from mock import patch, call, Mock
+import errno
+import fcntl
+import itertools
 import os
+import shutil
 import signal
 import six
+import socket
 import subprocess
+import sys
 import tempfile
+import threading
+import time
 
 from succubus import Daemon
+from succubus.control import ControlServer
+from succubus.daemonize import (_parse_listen_fds, _parse_pid_file, _process_start_time,
+                                 _set_inheritable)
 
 
 
@@ -148,9 +159,37 @@ class TestDaemonize(TestCase):
         finally:
             os.unlink(fake_pidfile.name)
 
+    @patch("succubus.daemonize.os.kill")
+    def test_already_running_detects_process_of_other_user(self, mock_kill):
+        mock_kill.side_effect = OSError(errno.EPERM, "Operation not permitted")
+        fake_pidfile = tempfile.NamedTemporaryFile()
+        try:
+            fake_pidfile.write(six.b("1\n"))
+            fake_pidfile.flush()
+
+            daemon = Daemon(pid_file=fake_pidfile.name)
+            self.assertEqual(daemon._already_running(), True)
+            mock_kill.assert_called_once_with(1, 0)
+        finally:
+            os.unlink(fake_pidfile.name)
+
+    @patch("succubus.daemonize.os.kill")
+    def test_already_running_never_signals_a_process_group(self, mock_kill):
+        fake_pidfile = tempfile.NamedTemporaryFile()
+        try:
+            fake_pidfile.write(six.b("0\n"))
+            fake_pidfile.flush()
+
+            daemon = Daemon(pid_file=fake_pidfile.name)
+            self.assertEqual(daemon._already_running(), False)
+            mock_kill.assert_not_called()
+        finally:
+            os.unlink(fake_pidfile.name)
+
+    @patch("succubus.daemonize._pidfd_open", return_value=None)
     @patch("succubus.daemonize.time.sleep")
     @patch("succubus.daemonize.os.kill")
-    def test_reliable_kill_actually_kills(self, mock_kill, mock_sleep):
+    def test_reliable_kill_actually_kills(self, mock_kill, mock_sleep, mock_pidfd_open):
         fake_pidfile = tempfile.NamedTemporaryFile()
         daemon = Daemon(pid_file=fake_pidfile.name)
         daemon.pid = 1234
@@ -173,23 +212,30 @@ class TestDaemonize(TestCase):
         expected_check_call = call(1234, 0)
         mock_kill.assert_has_calls([expected_kill_call, expected_check_call, expected_check_call])
 
+    @patch("succubus.daemonize._pidfd_open", return_value=None)
+    @patch("succubus.daemonize.time.time")
     @patch("succubus.daemonize.time.sleep")
     @patch("succubus.daemonize.os.kill")
-    def test_reliable_kill_kills_stuck_processes(self, mock_kill, mock_sleep):
+    def test_reliable_kill_kills_stuck_processes(self, mock_kill, mock_sleep,
+                                                 mock_time, mock_pidfd_open):
         """When a process ignores SIGTERM, it must be killed with SIGKILL"""
         daemon = Daemon(pid_file="foo")
         daemon.pid = 1234
 
         mock_kill.side_effect = None
+        mock_time.side_effect = itertools.count(0, 5)
 
         retval = daemon.reliable_kill()
 
         self.assertEqual(retval, 0)
         mock_kill.assert_any_call(1234, signal.SIGKILL)
+        self.assertGreaterEqual(daemon.shutdown_duration, daemon.shutdown_timeout)
 
+    @patch("succubus.daemonize._pidfd_open", return_value=None)
     @patch("succubus.daemonize.time.sleep")
     @patch("succubus.daemonize.os.kill")
-    def test_reliable_kill_reports_permission_problems(self, mock_kill, mock_sleep):
+    def test_reliable_kill_reports_permission_problems(self, mock_kill, mock_sleep,
+                                                       mock_pidfd_open):
         """If the process cannot be killed, an error must be reported
 
         This typically happens when the user does not have sufficient
@@ -204,6 +250,38 @@ class TestDaemonize(TestCase):
 
         self.assertEqual(retval, 1)
 
+    @patch("succubus.daemonize.time.sleep")
+    def test_reliable_kill_backs_off_exponentially_without_pidfd(self, mock_sleep):
+        daemon = Daemon(pid_file="foo")
+        daemon.pid = 1234
+
+        with patch("succubus.daemonize._pidfd_open", return_value=None):
+            with patch("succubus.daemonize.os.kill") as mock_kill:
+                mock_kill.side_effect = [None] * 4 + [OSError("No such process")]
+                retval = daemon.reliable_kill()
+
+        self.assertEqual(retval, 0)
+        intervals = [args[0] for args, _ in mock_sleep.call_args_list]
+        self.assertEqual(intervals, [0.001, 0.002, 0.004])
+
+    def test_reliable_kill_waits_for_exit_with_pidfd(self):
+        if not hasattr(os, 'pidfd_open'):
+            self.skipTest("pidfd_open() is not supported on this platform")
+        fake_pidfile = tempfile.NamedTemporaryFile(delete=False)
+        process = subprocess.Popen(['sleep', '10'])
+        try:
+            daemon = Daemon(pid_file=fake_pidfile.name)
+            daemon.pid = process.pid
+
+            retval = daemon.reliable_kill()
+
+            self.assertEqual(retval, 0)
+            self.assertLess(daemon.shutdown_duration, 1)
+            self.assertFalse(os.path.exists(fake_pidfile.name))
+        finally:
+            process.kill()
+            process.wait()
+
     def test_stop_terminates_a_running_process(self):
         daemon = Daemon(pid_file="foo")
 
@@ -253,9 +331,663 @@ class TestDaemonize(TestCase):
         daemon._already_running.assert_called_once_with()
         self.assertEqual(retval, 3)
 
+    def test_sigterm_requests_shutdown(self):
+        daemon = Daemon(pid_file="foo")
+
+        daemon._handle_sigterm(signal.SIGTERM, None)
+
+        self.assertTrue(daemon.shutdown_requested.is_set())
+        self.assertTrue(daemon.wait(0))
+
+    def test_sigterm_can_raise_like_older_versions(self):
+        daemon = Daemon(pid_file="foo")
+        daemon.raise_on_sigterm = True
+
+        self.assertRaises(BaseException, daemon._handle_sigterm, signal.SIGTERM, None)
+        self.assertTrue(daemon.shutdown_requested.is_set())
+
+    def test_wait_times_out_without_shutdown_request(self):
+        daemon = Daemon(pid_file="foo")
+
+        self.assertFalse(daemon.wait(0.01))
+
+    def test_scheduler_stops_on_shutdown_request(self):
+        daemon = Daemon(pid_file="foo")
+        daemon.scheduler.every(3600, lambda: None)
+        thread = threading.Thread(target=daemon.scheduler.run)
+        thread.start()
+
+        daemon._handle_sigterm(signal.SIGTERM, None)
+        thread.join(1)
+
+        self.assertFalse(thread.is_alive())
+
+    def test_scheduler_is_stopped_before_shutdown(self):
+        daemon = Daemon(pid_file="foo")
+        daemon._cleanup = Mock()
+        calls = []
+        daemon.scheduler.stop = lambda timeout: calls.append('stop scheduler')
+        daemon.shutdown = lambda: calls.append('shutdown')
+
+        daemon._shutdown()
+
+        self.assertEqual(calls, ['stop scheduler', 'shutdown'])
+
+    @patch("succubus.daemonize.gc")
+    def test_preload_runs_without_gc_and_is_frozen(self, mock_gc):
+        daemon = Daemon(pid_file="foo")
+        daemon.preload = Mock(side_effect=lambda: mock_gc.preload())
+
+        daemon._preload()
+
+        self.assertEqual([name for name, _, _ in mock_gc.mock_calls],
+                         ['disable', 'preload', 'freeze', 'enable'])
+
+    def test_process_pool_needs_running_daemon(self):
+        daemon = Daemon(pid_file="foo")
+
+        self.assertRaises(RuntimeError, getattr, daemon, 'process_pool')
+
+    @patch("succubus.procpool.ProcessPool")
+    def test_process_pool_is_stopped_after_shutdown(self, mock_pool_class):
+        daemon = Daemon(pid_file="foo")
+        daemon.started_at = time.time()
+        daemon.pool_processes = 3
+        daemon._cleanup = Mock()
+        calls = []
+        pool = daemon.process_pool
+        pool.stop.side_effect = lambda timeout: calls.append('stop pool')
+        daemon.shutdown = lambda: calls.append('shutdown')
+
+        daemon._shutdown()
+
+        mock_pool_class.assert_called_once_with(
+            3, initializer=daemon._init_pool_worker)
+        pool.start.assert_called_once_with()
+        self.assertEqual(calls, ['shutdown', 'stop pool'])
+        self.assertEqual(daemon._process_pool, None)
+
+class TestPidFile(TestCase):
+    def setUp(self):
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['foo', 'bar']
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.pid_file = os.path.join(self.temp_dir, 'succubus.pid')
+
+    def tearDown(self):
+        self.mock_sys_context.__exit__()
+        shutil.rmtree(self.temp_dir)
+
+    def new_daemon(self):
+        self.mock_sys.argv = ['foo', 'bar']
+        daemon = Daemon(pid_file=self.pid_file)
+        self.addCleanup(self.close_pid_file, daemon)
+        return daemon
+
+    @staticmethod
+    def close_pid_file(daemon):
+        if daemon._pid_file_fd is not None:
+            os.close(daemon._pid_file_fd)
+
+    def test_pid_file_records_pid_and_start_time(self):
+        daemon = self.new_daemon()
+
+        self.assertTrue(daemon._write_pid_file())
+
+        with open(self.pid_file) as pid_file:
+            content = pid_file.read()
+        self.assertEqual(_parse_pid_file(content),
+                         (os.getpid(), _process_start_time(os.getpid())))
+        self.assertEqual(content.splitlines()[0], str(os.getpid()))
+        self.assertEqual(os.listdir(self.temp_dir), ['succubus.pid'])
+
+    def test_locked_pid_file_means_running(self):
+        self.new_daemon()._write_pid_file()
+        daemon = self.new_daemon()
+
+        self.assertTrue(daemon._already_running())
+        self.assertEqual(daemon.pid, os.getpid())
+
+    def test_second_daemon_does_not_get_the_pid_file(self):
+        self.assertTrue(self.new_daemon()._write_pid_file())
+
+        self.assertFalse(self.new_daemon()._write_pid_file())
+        self.assertEqual(os.listdir(self.temp_dir), ['succubus.pid'])
+
+    def test_stale_pid_file_with_reused_pid_is_not_running(self):
+        # Our own pid stands in for a pid that was reused by another process.
+        with open(self.pid_file, 'w') as pid_file:
+            pid_file.write("%d\nstart_time=%d\n" % (os.getpid(), 1))
+        daemon = self.new_daemon()
+
+        self.assertFalse(daemon._already_running())
+        self.assertTrue(daemon._pid_reused())
+
+    def test_stale_pid_file_is_replaced(self):
+        with open(self.pid_file, 'w') as pid_file:
+            pid_file.write("1\nstart_time=1\n")
+        daemon = self.new_daemon()
+
+        self.assertTrue(daemon._write_pid_file())
+
+        self.assertEqual(self.new_daemon()._already_running(), True)
+        with open(self.pid_file) as pid_file:
+            self.assertEqual(pid_file.readline(), "%d\n" % os.getpid())
+
+    def test_zero_downtime_restart_replaces_locked_pid_file(self):
+        self.new_daemon()._write_pid_file()
+
+        self.assertTrue(self.new_daemon()._write_pid_file(replace=True))
+
+    def test_only_one_of_concurrent_daemons_gets_the_pid_file(self):
+        children = []
+        for _ in range(8):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    won = self.new_daemon()._write_pid_file()
+                    # Keep the lock until all others have tried.
+                    time.sleep(0.5)
+                finally:
+                    os._exit(0 if won else 1)
+            children.append(pid)
+
+        exit_codes = [os.waitpid(pid, 0)[1] for pid in children]
+
+        self.assertEqual(exit_codes.count(0), 1)
+
+    @patch("succubus.daemonize.os.kill")
+    def test_reliable_kill_does_not_kill_reused_pid(self, mock_kill):
+        daemon = self.new_daemon()
+        daemon.pid = os.getpid()
+        daemon.pid_start_time = 1
+
+        self.assertEqual(daemon.reliable_kill(), 0)
+
+        mock_kill.assert_not_called()
+
+
+class TestReadiness(TestCase):
+    def setUp(self):
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['foo', 'bar']
+        self.read_fd, self.write_fd = os.pipe()
+
+    def tearDown(self):
+        self.mock_sys_context.__exit__()
+        for fd in (self.read_fd, self.write_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def test_notify_ready_sends_pid_to_starter(self):
+        daemon = Daemon(pid_file="foo")
+        daemon._ready_fd = self.write_fd
+
+        daemon.notify_ready()
+
+        self.assertEqual(os.read(self.read_fd, 64), six.b("%d\n" % os.getpid()))
+        self.assertEqual(daemon._ready_fd, None)
+        # The write end is closed, the starter reads EOF from now on.
+        self.assertEqual(os.read(self.read_fd, 64), six.b(""))
+
+    @patch("succubus.watchdog.sd_notify")
+    def test_notify_ready_tells_systemd_and_arms_watchdog(self, mock_sd_notify):
+        daemon = Daemon(pid_file="foo")
+        daemon._ready_fd = self.write_fd
+        daemon._heartbeat = Mock()
+
+        with patch.dict(os.environ, {'NOTIFY_SOCKET': '@test'}):
+            daemon.notify_ready()
+
+        mock_sd_notify.assert_called_once_with('READY=1\nMAINPID=%d' % os.getpid())
+        daemon._heartbeat.beat.assert_called_once_with()
+
+    def test_watchdog_interval_defaults_to_systemd_setting(self):
+        with patch.dict(os.environ, {'WATCHDOG_USEC': '30000000'}):
+            daemon = Daemon(pid_file="foo")
+
+        self.assertEqual(daemon.watchdog_interval, 30)
+
+    def test_wait_for_ready_succeeds_and_measures_latency(self):
+        daemon = Daemon(pid_file="foo")
+        os.write(self.write_fd, six.b("1234\n"))
+
+        retval = daemon._wait_for_ready(self.read_fd, time.time())
+
+        self.assertEqual(retval, 0)
+        self.assertGreaterEqual(daemon.startup_duration, 0)
+        self.assertIn("1234", self.mock_sys.stdout.write.call_args[0][0])
+
+    def test_wait_for_ready_detects_failed_startup(self):
+        daemon = Daemon(pid_file="foo")
+        os.close(self.write_fd)
+
+        retval = daemon._wait_for_ready(self.read_fd, time.time())
+
+        self.assertEqual(retval, 1)
+        self.assertEqual(daemon.startup_duration, None)
+
+    def test_wait_for_ready_times_out(self):
+        daemon = Daemon(pid_file="foo")
+        daemon.startup_timeout = 0.05
+
+        retval = daemon._wait_for_ready(self.read_fd, time.time())
+
+        self.assertEqual(retval, 1)
+
+    def test_ready_is_notified_before_run_by_default(self):
+        daemon = Daemon(pid_file="foo")
+        events = []
+        daemon.notify_ready = lambda: events.append("ready")
+        daemon.run = lambda: events.append("run")
+
+        daemon._run()
+
+        self.assertEqual(events, ["ready", "run"])
+
+    def test_run_notifies_ready_itself_if_configured(self):
+        daemon = Daemon(pid_file="foo")
+        daemon.wait_for_ready = True
+        daemon.notify_ready = Mock()
+        daemon.run = Mock()
+
+        daemon._run()
+
+        self.assertEqual(daemon.notify_ready.call_count, 0)
+
+
+class TestZeroDowntimeRestart(TestCase):
+    def setUp(self):
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['foo', 'bar']
+
+    def tearDown(self):
+        self.mock_sys_context.__exit__()
+
+    def test_parse_listen_fds(self):
+        self.assertEqual(_parse_listen_fds("http=3,admin=4"),
+                         {'http': 3, 'admin': 4})
+        self.assertEqual(_parse_listen_fds(""), {})
+
+    @patch("succubus.daemonize.os.set_inheritable", None, create=True)
+    def test_set_inheritable_without_os_support(self):
+        sock = socket.socket()
+        try:
+            fcntl.fcntl(sock.fileno(), fcntl.F_SETFD, fcntl.FD_CLOEXEC)
+
+            _set_inheritable(sock.fileno())
+
+            self.assertFalse(fcntl.fcntl(sock.fileno(), fcntl.F_GETFD) & fcntl.FD_CLOEXEC)
+        finally:
+            sock.close()
+
+    def test_listen_socket_creates_listening_socket(self):
+        daemon = Daemon(pid_file="foo")
+
+        sock = daemon.listen_socket('http', ('127.0.0.1', 0))
+        try:
+            self.assertIs(daemon.listeners['http'], sock)
+            client = socket.create_connection(sock.getsockname())
+            client.close()
+        finally:
+            sock.close()
+
+    def test_listen_socket_inherits_socket_from_previous_daemon(self):
+        old_sock = socket.socket()
+        old_sock.bind(('127.0.0.1', 0))
+        old_sock.listen(1)
+        daemon = Daemon(pid_file="foo")
+        daemon._inherited_fds = {'http': os.dup(old_sock.fileno())}
+
+        sock = daemon.listen_socket('http', ('127.0.0.1', 1))
+        try:
+            self.assertEqual(sock.getsockname(), old_sock.getsockname())
+            self.assertEqual(daemon._inherited_fds, {})
+        finally:
+            sock.close()
+            old_sock.close()
+
+    def test_delpid_if_owned_keeps_pid_file_of_successor(self):
+        fake_pidfile = tempfile.NamedTemporaryFile(delete=False)
+        try:
+            fake_pidfile.write(six.b("4321\n"))
+            fake_pidfile.close()
+            daemon = Daemon(pid_file=fake_pidfile.name)
+
+            daemon._delpid_if_owned(1234)
+            self.assertTrue(os.path.exists(fake_pidfile.name))
+
+            daemon._delpid_if_owned(4321)
+            self.assertFalse(os.path.exists(fake_pidfile.name))
+        finally:
+            if os.path.exists(fake_pidfile.name):
+                os.unlink(fake_pidfile.name)
+
+    def test_restart_uses_handover_if_configured(self):
+        daemon = Daemon(pid_file="foo")
+        daemon.zero_downtime_restart = True
+        daemon._already_running = Mock(return_value=True)
+        daemon._handover_restart = Mock(return_value=0)
+        daemon.stop = Mock()
+
+        retval = daemon.restart()
+
+        self.assertEqual(retval, 0)
+        self.assertEqual(daemon.stop.call_count, 0)
+
+    @patch("succubus.daemonize.os.kill")
+    def test_handover_restart_succeeds_when_pid_file_changed(self, mock_kill):
+        daemon = Daemon(pid_file="foo")
+        daemon.pid = 1234
+        daemon._wait_for_exit = Mock(return_value=True)
+
+        def new_daemon_running():
+            daemon.pid = 4321
+            return True
+        daemon._already_running = new_daemon_running
+
+        retval = daemon._handover_restart()
+
+        self.assertEqual(retval, 0)
+        mock_kill.assert_called_once_with(1234, signal.SIGUSR2)
+
+    @patch("succubus.daemonize.os.kill")
+    def test_handover_restart_fails_if_old_daemon_keeps_running(self, mock_kill):
+        daemon = Daemon(pid_file="foo")
+        daemon.pid = 1234
+        daemon._wait_for_exit = Mock(return_value=False)
+
+        retval = daemon._handover_restart()
+
+        self.assertEqual(retval, 1)
+
+
+class ConfigDaemon(Daemon):
+    """Loads its configuration from self.source"""
+
+    def __init__(self, **kwargs):
+        self.source = {'workers': 2}
+        super(ConfigDaemon, self).__init__(**kwargs)
+        self.logger = Mock()
+        self.changes = []
+        # A running daemon loaded its configuration on start.
+        self.config.get('user')
+
+    def load_configuration(self):
+        self.config.update(self.source)
+
+    def validate_configuration(self, config):
+        if config['workers'] < 1:
+            raise ValueError("workers must be positive")
+
+    def on_config_changed(self, old, new):
+        self.changes.append((old, new))
+
+
+class TestLazyConfiguration(TestCase):
+    def setUp(self):
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['foo', 'status']
+
+    def tearDown(self):
+        self.mock_sys_context.__exit__()
+
+    def test_status_does_not_load_configuration(self):
+        daemon = ConfigDaemon(pid_file="foo")
+        daemon._config = None
+        daemon.load_configuration = Mock()
+        daemon._already_running = Mock(return_value=False)
+
+        daemon.status()
+
+        self.assertEqual(daemon.load_configuration.call_count, 0)
+
+    def test_default_loads_config_files(self):
+        temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        try:
+            config_file = os.path.join(temp_dir, 'foo.json')
+            with open(config_file, 'w') as config:
+                config.write('{"user": "nobody"}')
+            daemon = Daemon(pid_file=os.path.join(temp_dir, 'foo.pid'))
+            daemon.config_files = [config_file]
+
+            self.assertEqual(daemon.config, {'user': 'nobody'})
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_start_takes_user_and_group_from_configuration(self):
+        daemon = ConfigDaemon(pid_file="foo")
+        daemon.config = {'user': 'nobody', 'group': 'nogroup'}
+        daemon._already_running = Mock(return_value=False)
+        daemon.set_gid = Mock(side_effect=SystemExit)
+
+        self.assertRaises(SystemExit, daemon.start)
+
+        self.assertEqual((daemon.user, daemon.group), ('nobody', 'nogroup'))
+
+
+class TestReload(TestCase):
+    def setUp(self):
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['foo', 'bar']
+        self.daemon = ConfigDaemon(pid_file="foo")
+
+    def tearDown(self):
+        self.mock_sys_context.__exit__()
+
+    def test_changed_configuration_is_applied(self):
+        self.daemon.source = {'workers': 4}
+
+        self.assertTrue(self.daemon.reload())
+
+        self.assertEqual(self.daemon.config, {'workers': 4})
+        self.assertEqual(self.daemon.changes, [({'workers': 2}, {'workers': 4})])
+        self.assertEqual(self.daemon.reload_duration.count, 1)
+
+    def test_unchanged_configuration_does_not_call_hook(self):
+        self.assertTrue(self.daemon.reload())
+
+        self.assertEqual(self.daemon.changes, [])
+
+    def test_invalid_configuration_is_rejected(self):
+        old_config = self.daemon.config
+        self.daemon.source = {'workers': 0}
+
+        self.assertFalse(self.daemon.reload())
+
+        self.assertIs(self.daemon.config, old_config)
+        self.assertEqual(self.daemon.changes, [])
+        self.assertEqual(self.daemon.reload_failures.value, 1)
+
+    def test_other_threads_keep_old_configuration_while_loading(self):
+        seen = []
+
+        def load_configuration():
+            self.daemon.config.update({'workers': 0})
+            thread = threading.Thread(
+                target=lambda: seen.append(dict(self.daemon.config)))
+            thread.start()
+            thread.join()
+
+        self.daemon.load_configuration = load_configuration
+
+        self.assertFalse(self.daemon.reload())
+
+        self.assertEqual(seen, [{'workers': 2}])
+        self.assertEqual(self.daemon.config, {'workers': 2})
+
+    def test_load_configuration_may_replace_config(self):
+        self.daemon.load_configuration = lambda: setattr(
+            self.daemon, 'config', {'workers': 3})
+
+        self.assertTrue(self.daemon.reload())
+
+        self.assertEqual(self.daemon.config, {'workers': 3})
+        self.assertEqual(self.daemon.changes, [({'workers': 2}, {'workers': 3})])
+
+    def test_failing_hook_restores_old_configuration(self):
+        self.daemon.source = {'workers': 4}
+        self.daemon.on_config_changed = Mock(side_effect=RuntimeError)
+
+        self.assertFalse(self.daemon.reload())
+
+        self.assertEqual(self.daemon.config, {'workers': 2})
+
+    def test_sighup_reloads_outside_of_signal_handler(self):
+        self.daemon.source = {'workers': 4}
+        self.daemon.logger = Mock()
+        self.daemon._start_signal_thread()
+        reloaded = threading.Event()
+        self.daemon.on_config_changed = lambda old, new: reloaded.set()
+
+        try:
+            self.daemon._handle_sighup(signal.SIGHUP, None)
+            self.assertTrue(reloaded.wait(5))
+        finally:
+            self.daemon.shutdown_requested.set()
+
+        self.assertEqual(self.daemon.config, {'workers': 4})
+        self.assertEqual(self.daemon.logger.info.call_count, 1)
+
+    def test_sighup_handler_only_sets_event(self):
+        self.daemon.reload = Mock()
+
+        self.daemon._handle_sighup(signal.SIGHUP, None)
+
+        self.assertTrue(self.daemon._reload_requested.is_set())
+        self.assertEqual(self.daemon.reload.call_count, 0)
+
+
+class TestControlSocket(TestCase):
+    def setUp(self):
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['foo', 'bar']
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.daemon = Daemon(pid_file=os.path.join(self.temp_dir, 'foo.pid'))
+        self.daemon.started_at = time.time()
+        self.daemon._control_server = ControlServer(
+            self.daemon.control_socket_path, self.daemon.control_commands)
+
+    def tearDown(self):
+        self.daemon._control_server.stop()
+        shutil.rmtree(self.temp_dir)
+        self.mock_sys_context.__exit__()
+
+    def test_control_socket_lives_next_to_pid_file(self):
+        self.assertEqual(self.daemon.control_socket_path,
+                         os.path.join(self.temp_dir, 'foo.sock'))
+
+    def test_status_asks_control_socket(self):
+        self.daemon._control_server.start()
+        self.daemon._already_running = Mock(return_value=False)
+
+        retval = self.daemon.status()
+
+        self.assertEqual(retval, 0)
+        self.assertEqual(self.daemon.pid, os.getpid())
+        self.assertEqual(self.daemon._already_running.call_count, 0)
+
+    def test_stop_uses_pid_reported_by_control_socket(self):
+        self.daemon._control_server.start()
+        self.daemon._already_running = Mock(return_value=False)
+        self.daemon.reliable_kill = Mock(return_value=0)
+
+        retval = self.daemon.stop()
+
+        self.assertEqual(retval, 0)
+        self.assertEqual(self.daemon.pid, os.getpid())
+        self.daemon.reliable_kill.assert_called_once_with()
+
+    @patch("succubus.daemonize.os.kill")
+    def test_supervised_child_reports_and_stops_supervisor(self, mock_kill):
+        self.daemon._supervisor_pid = os.getppid()
+        self.daemon._control_server.start()
+
+        self.assertEqual(self.daemon.control('status')['pid'], os.getppid())
+        self.assertEqual(self.daemon.control('stop')['pid'], os.getppid())
+        mock_kill.assert_called_once_with(os.getppid(), signal.SIGTERM)
+
+    def test_orphaned_child_reports_itself(self):
+        self.daemon._supervisor_pid = 2 ** 22 + 1
+        self.daemon._control_server.start()
+
+        self.assertEqual(self.daemon.control('status')['pid'], os.getpid())
+
+    def test_status_falls_back_to_pid_file_without_control_socket(self):
+        self.daemon._already_running = Mock(return_value=False)
+
+        retval = self.daemon.status()
+
+        self.assertEqual(retval, 3)
+        self.daemon._already_running.assert_called_once_with()
+
+    def test_registered_commands_are_served(self):
+        self.daemon.register_command('double', lambda x: 2 * x)
+        self.daemon._control_server.start()
+
+        self.assertEqual(self.daemon.control('double', 21), 42)
+
+    def test_stats_reports_process_data(self):
+        self.daemon._control_server.start()
+
+        stats = self.daemon.control('stats')
+
+        self.assertEqual(stats['pid'], os.getpid())
+        self.assertGreater(stats['rss'], 0)
+
+    def test_reload_reloads_configuration(self):
+        self.daemon.config = {}
+        self.daemon.load_configuration = Mock()
+        self.daemon.logger = Mock()
+        self.daemon._control_server.start()
+
+        result = self.daemon.control('reload')
+
+        self.daemon.load_configuration.assert_called_once_with()
+        self.assertTrue(result['reloaded'])
+        self.assertEqual(result['pid'], os.getpid())
+
+    def test_reload_action_reports_duration(self):
+        self.daemon.logger = Mock()
+        self.daemon._control_server.start()
+
+        retval = self.daemon.reload_running()
+
+        self.assertEqual(retval, 0)
+        self.assertIn("reloaded its configuration in",
+                      self.mock_sys.stdout.write.call_args[0][0])
+
+    def test_reload_action_reports_rejected_configuration(self):
+        self.daemon.logger = Mock()
+        self.daemon.validate_configuration = Mock(side_effect=ValueError)
+        self.daemon._control_server.start()
+
+        retval = self.daemon.reload_running()
+
+        self.assertEqual(retval, 1)
+
+    @patch("succubus.daemonize.os.kill")
+    def test_reload_action_falls_back_to_sighup(self, mock_kill):
+        self.daemon.pid = 4242
+        self.daemon._already_running = Mock(return_value=True)
+
+        retval = self.daemon.reload_running()
+
+        self.assertEqual(retval, 0)
+        mock_kill.assert_called_once_with(4242, signal.SIGHUP)
+
+
 class TestSetupLogging(TestCase):
-    @patch("succubus.daemonize.SysLogHandler")
-    @patch("succubus.daemonize.logging")
+    @patch("logging.handlers.SysLogHandler")
+    @patch("logging.getLogger")
     def test_logger_exists_and_has_a_handler(self, mock_logging, mock_sysloghandler):
         daemon = Daemon(pid_file="foo")
 
@@ -263,8 +995,8 @@ class TestSetupLogging(TestCase):
 
         self.assertTrue(daemon.logger.handlers)
 
-    @patch("succubus.daemonize.SysLogHandler")
-    @patch("succubus.daemonize.logging")
+    @patch("logging.handlers.SysLogHandler")
+    @patch("logging.getLogger")
     @patch("succubus.daemonize.os")
     def test_uses_dev_log_if_available(self, mock_os, mock_logging, mock_sysloghandler):
         daemon = Daemon(pid_file="foo")
@@ -274,8 +1006,8 @@ class TestSetupLogging(TestCase):
 
         mock_sysloghandler.assert_called_with('/dev/log')
 
-    @patch("succubus.daemonize.SysLogHandler")
-    @patch("succubus.daemonize.logging")
+    @patch("logging.handlers.SysLogHandler")
+    @patch("logging.getLogger")
     @patch("succubus.daemonize.os")
     def test_uses_defaults_if_dev_log_unavailable(self, mock_os, mock_logging, mock_sysloghandler):
         daemon = Daemon(pid_file="foo")
@@ -286,6 +1018,39 @@ class TestSetupLogging(TestCase):
         # SysLogHandler defaults to using UDP to localhost:514
         mock_sysloghandler.assert_called_with()
 
+    @patch("logging.handlers.SysLogHandler")
+    @patch("logging.getLogger")
+    def test_log_queue_is_configurable(self, mock_logging, mock_sysloghandler):
+        daemon = Daemon(pid_file="foo")
+        daemon.config = {'log_queue_size': 5, 'log_overflow': 'block'}
+
+        daemon.setup_logging()
+
+        self.assertEqual(daemon.log_handler.capacity, 5)
+        self.assertEqual(daemon.log_handler.overflow, 'block')
+        self.assertEqual(daemon.log_handler.handlers, [mock_sysloghandler.return_value])
+
+    @patch("logging.handlers.SysLogHandler")
+    @patch("logging.getLogger")
+    def test_rate_limit_is_installed_by_default(self, mock_logging, mock_sysloghandler):
+        daemon = Daemon(pid_file="foo")
+
+        daemon.setup_logging()
+
+        self.assertIn(daemon.log_filter, daemon.log_handler.filters)
+        self.assertEqual(daemon.log_filter.rate, 10)
+
+    @patch("logging.handlers.SysLogHandler")
+    @patch("logging.getLogger")
+    def test_rate_limit_can_be_disabled(self, mock_logging, mock_sysloghandler):
+        daemon = Daemon(pid_file="foo")
+        daemon.config = {'log_rate_limit': None}
+
+        daemon.setup_logging()
+
+        self.assertEqual(daemon.log_filter, None)
+        self.assertEqual(daemon.log_handler.filters, [])
+
     def test_setup_logging_called_at_right_time(self):
         # daemon.setup_logging must be called after daemon.set_uid/set_gid
         # and before daemon.daemonize.
@@ -302,3 +1067,20 @@ class TestSetupLogging(TestCase):
         daemon.set_uid.assert_called()
         daemon.set_gid.assert_called()
         daemon.daemonize.assert_not_called()
+
+
+class TestImports(TestCase):
+    def test_init_script_does_not_import_heavy_modules(self):
+        """"status" and "stop" must not pay for features they do not use"""
+        if sys.version_info < (3, 7):
+            self.skipTest("Lazy imports need module __getattr__ (Python 3.7+)")
+        source_dir = os.path.dirname(os.path.dirname(os.path.abspath(
+            sys.modules['succubus'].__file__)))
+        code = ("import sys, succubus; "
+                "print(' '.join(name for name in ('psutil', 'asyncio', 'logging', "
+                "'http.server', 'json') if name in sys.modules))")
+        env = dict(os.environ, PYTHONPATH=source_dir)
+
+        output = subprocess.check_output([sys.executable, '-c', code], env=env)
+
+        self.assertEqual(output.strip(), six.b(''))
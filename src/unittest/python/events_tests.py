@@ -0,0 +1,83 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase
+import os
+import select
+import signal
+import threading
+import time
+
+from succubus.events import PipeEvent, wait_for_any
+
+
+class TestPipeEvent(TestCase):
+    def setUp(self):
+        self.event = PipeEvent()
+
+    def tearDown(self):
+        self.event.close()
+
+    def test_wait_times_out(self):
+        start = time.time()
+
+        self.assertFalse(self.event.wait(0.05))
+
+        self.assertGreaterEqual(time.time() - start, 0.04)
+
+    def test_set_wakes_up_waiting_threads(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.event.wait(5)))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+
+        self.event.set()
+        for thread in threads:
+            thread.join(1)
+
+        self.assertEqual(results, [True, True, True])
+
+    def test_fileno_becomes_readable_and_stays_readable(self):
+        self.assertEqual(select.select([self.event], [], [], 0)[0], [])
+
+        self.event.set()
+        self.event.set()
+
+        self.assertEqual(select.select([self.event], [], [], 0)[0], [self.event])
+        self.assertEqual(select.select([self.event], [], [], 0)[0], [self.event])
+
+    def test_clear_resets_event(self):
+        self.event.fileno()
+        self.event.set()
+
+        self.event.clear()
+
+        self.assertFalse(self.event.is_set())
+        self.assertEqual(select.select([self.event], [], [], 0)[0], [])
+
+    def test_set_before_pipe_exists(self):
+        self.event.set()
+
+        self.assertTrue(self.event.wait(0))
+        self.assertTrue(self.event.wait())
+
+    def test_can_be_set_from_signal_handler(self):
+        previous = signal.signal(signal.SIGUSR1, lambda *args: self.event.set())
+        try:
+            os.kill(os.getpid(), signal.SIGUSR1)
+
+            self.assertTrue(self.event.wait(1))
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+
+
+class TestWaitForAny(TestCase):
+    def test_returns_events_that_are_set(self):
+        first, second = PipeEvent(), PipeEvent()
+        threading.Timer(0.05, second.set).start()
+
+        self.assertEqual(wait_for_any([first, second], 5), [second])
+
+    def test_returns_nothing_on_timeout(self):
+        self.assertEqual(wait_for_any([PipeEvent(), PipeEvent()], 0.01), [])
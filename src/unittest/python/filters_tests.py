@@ -0,0 +1,92 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase
+from mock import patch
+import logging
+
+from succubus.filters import RateLimitFilter
+
+
+def make_record(msg, *args, **kwargs):
+    return logging.LogRecord(kwargs.get('name', 'test'), logging.ERROR,
+                             __file__, 1, msg, args, None)
+
+
+class TestRateLimitFilter(TestCase):
+    def setUp(self):
+        self.monotonic_context = patch("succubus.filters._monotonic")
+        self.mock_monotonic = self.monotonic_context.__enter__()
+        self.mock_monotonic.return_value = 1000.0
+
+    def tearDown(self):
+        self.monotonic_context.__exit__()
+
+    def test_burst_passes_then_records_are_suppressed(self):
+        log_filter = RateLimitFilter(rate=1, burst=3)
+
+        results = [log_filter.filter(make_record("boom %d", i)) for i in range(5)]
+
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual(log_filter.suppressed, 2)
+
+    def test_different_templates_have_separate_buckets(self):
+        log_filter = RateLimitFilter(rate=1, burst=1)
+
+        self.assertTrue(log_filter.filter(make_record("first %d", 1)))
+        self.assertTrue(log_filter.filter(make_record("second %d", 1)))
+        self.assertTrue(log_filter.filter(make_record("first %d", 1, name='other')))
+        self.assertFalse(log_filter.filter(make_record("first %d", 2)))
+
+    def test_bucket_refills_and_reports_suppressed_records(self):
+        log_filter = RateLimitFilter(rate=2, burst=1)
+        log_filter.filter(make_record("boom %d", 1))
+        log_filter.filter(make_record("boom %d", 2))
+        log_filter.filter(make_record("boom %d", 3))
+
+        self.mock_monotonic.return_value = 1000.5
+        record = make_record("boom %d", 4)
+
+        self.assertTrue(log_filter.filter(record))
+        self.assertEqual(record.suppressed_similar, 2)
+        self.assertEqual(record.getMessage(), "boom 4")
+
+    def test_log_suppressed_reports_pending_counts(self):
+        log_filter = RateLimitFilter(rate=1, burst=1)
+        for i in range(4):
+            log_filter.filter(make_record("boom %d", i, name='succubus.test'))
+
+        with patch("succubus.filters.logging.getLogger") as mock_get_logger:
+            log_filter.log_suppressed()
+            log_filter.log_suppressed()
+
+        mock_get_logger.assert_called_once_with('succubus.test')
+        mock_get_logger.return_value.warning.assert_called_once_with(
+            "%d similar messages suppressed: %s", 3, "boom %d")
+
+    def test_number_of_buckets_is_bounded(self):
+        log_filter = RateLimitFilter(rate=1, burst=1, max_keys=10)
+
+        for i in range(25):
+            log_filter.filter(make_record("message %d" % i))
+
+        self.assertLessEqual(len(log_filter._buckets), 10)
+
+    def test_suppressed_buckets_are_bounded(self):
+        log_filter = RateLimitFilter(rate=1, burst=1, max_keys=10)
+
+        for i in range(25):
+            # Every message is suppressed at least once.
+            log_filter.filter(make_record("message %d" % i))
+            log_filter.filter(make_record("message %d" % i))
+            self.mock_monotonic.return_value += 0.001
+
+        self.assertLessEqual(len(log_filter._buckets), 10)
+        self.assertIn(('test', "message 24"), log_filter._buckets)
+        self.assertNotIn(('test', "message 0"), log_filter._buckets)
+        self.assertEqual(log_filter.suppressed, 25)
+
+    def test_unhashable_messages_pass(self):
+        log_filter = RateLimitFilter(rate=1, burst=1)
+
+        self.assertTrue(log_filter.filter(make_record({'a': 1})))
+        self.assertTrue(log_filter.filter(make_record({'a': 1})))
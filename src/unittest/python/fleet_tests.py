@@ -0,0 +1,154 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase
+from mock import patch
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from succubus import Daemon
+from succubus import fleet
+from succubus.daemonize import _process_start_time
+
+
+class TestFleet(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.registry = os.path.join(self.temp_dir, 'registry')
+        os.mkdir(self.registry)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def register(self, name, pid=None, start_time=None, command=None):
+        pid_file = os.path.join(self.temp_dir, name + '.pid')
+        if pid is not None:
+            with open(pid_file, 'w') as pid_file_object:
+                pid_file_object.write('%d\n' % pid)
+                if start_time is not None:
+                    pid_file_object.write('start_time=%d\n' % start_time)
+        entry = {'name': name, 'pid_file': pid_file,
+                 'command': command or ['/bin/true'], 'status_file': None}
+        with open(os.path.join(self.registry, name + '.json'), 'w') as entry_file:
+            json.dump(entry, entry_file)
+        return entry
+
+    def test_discover_filters_by_pattern(self):
+        self.register('web-1')
+        self.register('web-2')
+        self.register('worker')
+        with open(os.path.join(self.registry, 'broken.json'), 'w') as broken:
+            broken.write('{')
+        with open(os.path.join(self.registry, 'nameless.json'), 'w') as nameless:
+            json.dump({'pid_file': '/tmp/x.pid', 'command': ['x']}, nameless)
+
+        names = [entry['name'] for entry in fleet.discover(self.registry, ['web-*'])]
+
+        self.assertEqual(names, ['web-1', 'web-2'])
+        self.assertEqual(len(fleet.discover(self.registry)), 3)
+
+    def test_state_is_checked_against_proc(self):
+        own_start_time = _process_start_time(os.getpid())
+        running = self.register('running', os.getpid(), own_start_time)
+        reused = self.register('reused', os.getpid(), own_start_time + 1)
+        stopped = self.register('stopped')
+
+        pids = fleet.live_pids()
+
+        self.assertIn(os.getpid(), pids)
+        self.assertTrue(fleet.daemon_state(running, pids)['running'])
+        self.assertFalse(fleet.daemon_state(reused, pids)['running'])
+        self.assertFalse(fleet.daemon_state(stopped, pids)['running'])
+
+    def test_action_runs_daemon_command(self):
+        entry = self.register('echo', command=['/bin/echo', '--foo=42'])
+
+        self.assertEqual(fleet.run_action(entry, 'start', 5), (0, 'start --foo=42'))
+
+    def test_action_runs_script_with_registered_python(self):
+        script = os.path.join(self.temp_dir, 'daemon.py')
+        with open(script, 'w') as script_file:
+            script_file.write('import sys\nprint(" ".join(sys.argv[1:]))\n')
+        entry = self.register('script', command=[script, '--foo=42'])
+        entry['python'] = sys.executable
+
+        self.assertEqual(fleet.run_action(entry, 'stop', 5), (0, 'stop --foo=42'))
+
+    def test_action_times_out(self):
+        entry = self.register('sleep', command=['/bin/sleep'])
+
+        exit_code, output = fleet.run_action(entry, '10', 0.1)
+
+        self.assertNotEqual(exit_code, 0)
+        self.assertEqual(output, 'Timed out after 0.1 seconds')
+
+    def test_action_reports_missing_command(self):
+        entry = self.register('missing', command=[os.path.join(self.temp_dir, 'nope')])
+
+        self.assertEqual(fleet.run_action(entry, 'stop', 5)[0], 127)
+
+    @patch("succubus.fleet.sys.stdout")
+    def test_status_prints_json(self, mock_stdout):
+        self.register('running', os.getpid())
+        self.register('stopped')
+
+        retval = fleet.main(['status', '--json', '--registry', self.registry])
+
+        self.assertEqual(retval, 3)
+        results = json.loads(mock_stdout.write.call_args[0][0])
+        self.assertEqual([(r['name'], r['running']) for r in results],
+                         [('running', True), ('stopped', False)])
+
+    @patch("succubus.fleet.sys.stdout")
+    def test_action_prints_table(self, mock_stdout):
+        self.register('a', command=['/bin/echo'])
+        self.register('b', command=['/bin/false'])
+
+        retval = fleet.main(['stop', '-j', '2', '--registry', self.registry])
+
+        self.assertEqual(retval, 1)
+        lines = mock_stdout.write.call_args[0][0].splitlines()
+        self.assertEqual(lines[0].split(),
+                         ['NAME', 'STATE', 'PID', 'UPTIME', 'RSS', 'EXIT', 'OUTPUT'])
+        self.assertEqual(lines[1].split(), ['a', 'stopped', '-', '-', '-', '0', 'stop'])
+        self.assertEqual(lines[2].split(), ['b', 'stopped', '-', '-', '-', '1'])
+
+    @patch("succubus.fleet.sys.stderr")
+    def test_no_match_is_an_error(self, mock_stderr):
+        self.assertEqual(fleet.main(['status', 'x*', '--registry', self.registry]), 1)
+
+
+class TestRegistration(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['/usr/bin/foo', 'start', '--foo=42']
+        self.mock_sys.executable = '/usr/bin/python'
+
+    def tearDown(self):
+        self.mock_sys_context.__exit__()
+        shutil.rmtree(self.temp_dir)
+
+    def test_start_registers_daemon(self):
+        daemon = Daemon(pid_file=os.path.join(self.temp_dir, 'foo.pid'))
+        daemon.registry_dir = self.temp_dir
+
+        daemon._register()
+
+        entries = fleet.discover(self.temp_dir)
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['name'], 'foo')
+        self.assertEqual(entries[0]['pid_file'], daemon.pid_file)
+        self.assertEqual(entries[0]['command'], ['/usr/bin/foo', '--foo=42'])
+        self.assertEqual(entries[0]['python'], '/usr/bin/python')
+
+    def test_no_registration_without_registry(self):
+        daemon = Daemon(pid_file=os.path.join(self.temp_dir, 'foo.pid'))
+        daemon.registry_dir = os.path.join(self.temp_dir, 'missing')
+
+        daemon._register()
+
+        self.assertEqual(os.listdir(self.temp_dir), [])
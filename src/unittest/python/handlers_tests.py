@@ -0,0 +1,133 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase
+from mock import patch
+import logging
+import sys
+import threading
+
+from succubus.handlers import QueueingHandler
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super(ListHandler, self).__init__()
+        self.records = []
+        self.closed = False
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def close(self):
+        self.closed = True
+        super(ListHandler, self).close()
+
+
+class BlockedHandler(ListHandler):
+    """Stands in for a syslog that does not accept records"""
+    def __init__(self):
+        super(BlockedHandler, self).__init__()
+        self.unblock = threading.Event()
+
+    def emit(self, record):
+        self.unblock.wait()
+        super(BlockedHandler, self).emit(record)
+
+
+def make_record(msg, *args, **kwargs):
+    return logging.LogRecord('test', kwargs.get('level', logging.ERROR),
+                             __file__, 1, msg, args, kwargs.get('exc_info'))
+
+
+class TestQueueingHandler(TestCase):
+    def test_records_are_shipped_by_background_thread(self):
+        target = ListHandler()
+        handler = QueueingHandler([target])
+
+        handler.handle(make_record("hello %s", "world"))
+        handler.close()
+
+        self.assertEqual([r.getMessage() for r in target.records], ["hello world"])
+        self.assertNotEqual(handler._thread.ident, threading.current_thread().ident)
+        self.assertTrue(target.closed)
+
+    def test_suppressed_count_is_shipped_without_touching_the_record(self):
+        target = ListHandler()
+        handler = QueueingHandler([target])
+        record = make_record("hello %s", "world")
+        record.suppressed_similar = 3
+
+        handler.handle(record)
+        handler.close()
+
+        self.assertEqual([r.getMessage() for r in target.records],
+                         ["hello world (3 similar messages suppressed)"])
+        self.assertEqual(record.getMessage(), "hello world")
+
+    def test_level_of_wrapped_handler_is_respected(self):
+        target = ListHandler()
+        target.setLevel(logging.ERROR)
+        handler = QueueingHandler([target])
+
+        handler.handle(make_record("debug", level=logging.DEBUG))
+        handler.handle(make_record("error", level=logging.ERROR))
+        handler.close()
+
+        self.assertEqual([r.getMessage() for r in target.records], ["error"])
+
+    def test_full_queue_drops_and_counts_records(self):
+        target = BlockedHandler()
+        handler = QueueingHandler([target], capacity=2)
+
+        # The first record is taken off the queue by the (blocked) thread,
+        # the next two fill the queue.
+        handler.handle(make_record("first"))
+        while not handler._queue.empty():
+            pass
+        for _ in range(5):
+            handler.handle(make_record("more"))
+
+        self.assertEqual(handler.dropped, 3)
+        target.unblock.set()
+        handler.close()
+        self.assertEqual(len(target.records), 3)
+
+    def test_close_gives_up_after_timeout(self):
+        target = BlockedHandler()
+        handler = QueueingHandler([target])
+        handler.handle(make_record("stuck"))
+
+        handler.close(timeout=0.05)
+
+        self.assertTrue(handler._thread.is_alive())
+        target.unblock.set()
+
+    def test_exception_info_is_rendered_before_queueing(self):
+        target = ListHandler()
+        handler = QueueingHandler([target])
+        try:
+            raise ZeroDivisionError
+        except ZeroDivisionError:
+            record = make_record("failed", exc_info=sys.exc_info())
+
+        handler.handle(record)
+        handler.close()
+
+        self.assertEqual(target.records[0].exc_info, None)
+        self.assertIn("ZeroDivisionError", target.records[0].exc_text)
+
+    def test_thread_is_restarted_in_forked_child(self):
+        target = ListHandler()
+        handler = QueueingHandler([target])
+        handler.handle(make_record("parent"))
+        parent_thread = handler._thread
+
+        with patch("succubus.handlers.os.getpid", return_value=-1):
+            handler.handle(make_record("child"))
+            child_thread = handler._thread
+            handler.close()
+
+        self.assertIsNot(parent_thread, child_thread)
+
+    def test_rejects_unknown_overflow_policy(self):
+        self.assertRaises(ValueError, QueueingHandler, [], overflow='explode')
@@ -0,0 +1,151 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+from succubus.metrics import (Counter, Gauge, GaugeFamily, Histogram,
+                              MetricsServer, Registry, process_collector)
+
+
+def http_get(address, path='/metrics'):
+    if isinstance(address, tuple):
+        conn = socket.create_connection(address)
+    else:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(address)
+    conn.sendall(('GET %s HTTP/1.0\r\n\r\n' % path).encode('ascii'))
+    data = b''
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    conn.close()
+    return data.decode('utf-8')
+
+
+class TestMetrics(TestCase):
+    def test_counter_and_gauge(self):
+        counter = Counter('requests_total')
+        gauge = Gauge('queue_depth')
+
+        counter.inc()
+        counter.inc(2)
+        gauge.inc(5)
+        gauge.dec()
+        self.assertEqual(counter.value, 3)
+        self.assertEqual(gauge.value, 4)
+        gauge.set(1.5)
+        self.assertEqual(gauge.samples(), [('queue_depth', '', 1.5)])
+
+    def test_gauge_family_renders_labels(self):
+        family = GaugeFamily('worker_memory_bytes')
+
+        family.set({'worker': 0, 'kind': 'private'}, 10)
+        family.set({'worker': 1, 'kind': 'private'}, 20)
+        family.set({'worker': 0, 'kind': 'private'}, 30)
+
+        self.assertEqual(family.samples(), [
+            ('worker_memory_bytes', '{kind="private",worker="0"}', 30),
+            ('worker_memory_bytes', '{kind="private",worker="1"}', 20)])
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('latency_seconds', buckets=(0.1, 1))
+
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.samples(), [
+            ('latency_seconds_bucket', '{le="0.1"}', 2),
+            ('latency_seconds_bucket', '{le="1"}', 3),
+            ('latency_seconds_bucket', '{le="+Inf"}', 4),
+            ('latency_seconds_sum', '', 5.65),
+            ('latency_seconds_count', '', 4),
+        ])
+
+    def test_histogram_times_blocks(self):
+        histogram = Histogram('latency_seconds')
+
+        with histogram.time():
+            pass
+
+        self.assertEqual(histogram.count, 1)
+
+    def test_registry_returns_existing_metric(self):
+        registry = Registry()
+
+        self.assertIs(registry.counter('a'), registry.counter('a'))
+        self.assertRaises(ValueError, registry.gauge, 'a')
+
+    def test_prometheus_text_format(self):
+        registry = Registry()
+        registry.counter('requests_total', 'Handled requests.').inc(7)
+
+        text = registry.to_prometheus()
+
+        self.assertEqual(text, "# HELP requests_total Handled requests.\n"
+                               "# TYPE requests_total counter\n"
+                               "requests_total 7.0\n")
+
+    def test_collectors_are_called_on_every_collection(self):
+        registry = Registry()
+        calls = []
+
+        def collector():
+            calls.append(1)
+            gauge = Gauge('dynamic')
+            gauge.set(len(calls))
+            return [gauge]
+        registry.add_collector(collector)
+
+        registry.to_dict()
+        self.assertEqual(registry.to_dict(), {'dynamic': 2})
+
+    def test_process_collector(self):
+        registry = Registry()
+        started_at = time.time() - 10
+        registry.add_collector(process_collector(lambda: started_at))
+
+        samples = registry.to_dict()
+
+        self.assertGreater(samples['process_resident_memory_bytes'], 0)
+        self.assertGreater(samples['process_open_fds'], 0)
+        self.assertGreaterEqual(samples['succubus_uptime_seconds'], 10)
+        self.assertIn('process_cpu_seconds_total', samples)
+
+
+class TestMetricsServer(TestCase):
+    def setUp(self):
+        self.registry = Registry()
+        self.registry.gauge('answer').set(42)
+
+    def test_serves_metrics_over_tcp(self):
+        server = MetricsServer(('127.0.0.1', 0), self.registry)
+        server.start()
+        try:
+            response = http_get(server.server_address)
+            not_found = http_get(server.server_address, '/nope')
+        finally:
+            server.stop()
+
+        self.assertIn("200", response.splitlines()[0])
+        self.assertIn("answer 42.0", response)
+        self.assertIn("404", not_found.splitlines()[0])
+
+    def test_serves_metrics_over_unix_socket(self):
+        temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        path = os.path.join(temp_dir, 'metrics.sock')
+        server = MetricsServer(path, self.registry)
+        server.start()
+        try:
+            response = http_get(path)
+        finally:
+            server.stop()
+            self.assertFalse(os.path.exists(path))
+            shutil.rmtree(temp_dir)
+
+        self.assertIn("answer 42.0", response)
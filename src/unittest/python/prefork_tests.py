@@ -0,0 +1,340 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase, skipIf
+from mock import patch, Mock
+import multiprocessing
+import os
+import signal
+import sys
+
+from succubus import PreforkDaemon
+
+
+class TestPythonVersion(TestCase):
+    @patch("succubus.prefork.signal", spec=[])
+    def test_old_python_is_rejected(self, mock_signal):
+        with patch("succubus.daemonize.sys") as mock_sys:
+            mock_sys.argv = ['foo', 'bar']
+            self.assertRaises(RuntimeError, PreforkDaemon, pid_file="foo")
+
+
+@skipIf(sys.version_info < (3, 3), "PreforkDaemon needs Python 3.3+")
+class TestPreforkDaemon(TestCase):
+    def setUp(self):
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['foo', 'bar']
+
+    def tearDown(self):
+        self.mock_sys_context.__exit__()
+
+    def make_daemon(self, workers=2):
+        daemon = PreforkDaemon(pid_file="foo", workers=workers)
+        daemon.logger = Mock()
+        return daemon
+
+    def test_usage_without_arguments(self):
+        self.mock_sys.argv = ['foo']
+
+        daemon = PreforkDaemon(pid_file="foo")
+
+        self.assertEqual(daemon.param1, None)
+        self.assertEqual(daemon.action(), 2)
+
+    @patch("succubus.prefork.multiprocessing.cpu_count")
+    def test_defaults_to_one_worker_per_cpu(self, mock_cpu_count):
+        mock_cpu_count.return_value = 7
+
+        daemon = PreforkDaemon(pid_file="foo")
+
+        self.assertEqual(daemon.workers, 7)
+
+    @patch("succubus.prefork.os.fork")
+    def test_spawn_workers_fills_all_slots(self, mock_fork):
+        daemon = self.make_daemon(workers=3)
+        mock_fork.side_effect = [101, 102, 103]
+
+        retval = daemon._spawn_workers()
+
+        self.assertEqual(retval, None)
+        self.assertEqual(daemon.worker_pids, {101: 0, 102: 1, 103: 2})
+
+    @patch("succubus.prefork.os.fork")
+    def test_spawn_workers_only_fills_empty_slots(self, mock_fork):
+        daemon = self.make_daemon(workers=2)
+        daemon.worker_pids = {101: 0}
+        mock_fork.return_value = 102
+
+        daemon._spawn_workers()
+
+        self.assertEqual(mock_fork.call_count, 1)
+        self.assertEqual(daemon.worker_pids, {101: 0, 102: 1})
+
+    @patch("succubus.prefork.os.fork")
+    def test_respawned_workers_are_counted(self, mock_fork):
+        daemon = self.make_daemon(workers=2)
+        daemon._spawned_at = {0: 0}
+        mock_fork.side_effect = [101, 102]
+
+        daemon._spawn_workers()
+
+        self.assertEqual(daemon.restarts.value, 1)
+        self.assertEqual(daemon.metrics.to_dict()['succubus_workers'], 2)
+
+    @patch("succubus.prefork.time.time")
+    @patch("succubus.prefork.os.fork")
+    def test_spawn_workers_throttles_respawn(self, mock_fork, mock_time):
+        daemon = self.make_daemon(workers=1)
+        daemon.respawn_delay = 1
+        daemon._spawned_at = {0: 100.0}
+        mock_time.return_value = 100.25
+
+        retval = daemon._spawn_workers()
+
+        self.assertEqual(mock_fork.call_count, 0)
+        self.assertEqual(retval, 0.75)
+
+    @patch("succubus.prefork.os.waitpid")
+    def test_reap_workers_forgets_dead_workers(self, mock_waitpid):
+        daemon = self.make_daemon()
+        daemon.worker_pids = {101: 0, 102: 1}
+        mock_waitpid.side_effect = [(101, 9), (0, 0)]
+
+        daemon._reap_workers()
+
+        self.assertEqual(daemon.worker_pids, {102: 1})
+
+    @patch("succubus.prefork.signal.sigtimedwait")
+    @patch("succubus.prefork.os.waitpid")
+    @patch("succubus.prefork.os.kill")
+    def test_stop_workers_fans_out_sigterm(self, mock_kill, mock_waitpid,
+                                           mock_sigtimedwait):
+        daemon = self.make_daemon()
+        daemon.worker_pids = {101: 0, 102: 1}
+        mock_waitpid.side_effect = [(101, 0), (102, 0)]
+
+        daemon._stop_workers()
+
+        mock_kill.assert_any_call(101, signal.SIGTERM)
+        mock_kill.assert_any_call(102, signal.SIGTERM)
+        self.assertEqual(mock_kill.call_count, 2)
+        self.assertEqual(daemon.worker_pids, {})
+
+    @patch("succubus.prefork.time.time")
+    @patch("succubus.prefork.os.waitpid")
+    @patch("succubus.prefork.os.kill")
+    def test_stop_workers_kills_stuck_workers(self, mock_kill, mock_waitpid,
+                                              mock_time):
+        daemon = self.make_daemon()
+        daemon.worker_pids = {101: 0}
+        mock_waitpid.return_value = (0, 0)
+        mock_time.side_effect = [0, 100]
+
+        daemon._stop_workers()
+
+        mock_kill.assert_any_call(101, signal.SIGKILL)
+        self.assertEqual(daemon.worker_pids, {})
+
+    @patch("succubus.prefork.os.fork")
+    @patch("succubus.daemonize.gc.freeze", create=True)
+    def test_heap_is_not_frozen_again_for_every_fork(self, mock_freeze, mock_fork):
+        daemon = self.make_daemon(workers=2)
+        mock_fork.side_effect = [101, 102, 103]
+
+        daemon._spawn_workers()
+        daemon._spawn_worker(0, recycle=True)
+
+        self.assertEqual(mock_fork.call_count, 3)
+        mock_freeze.assert_not_called()
+
+    @patch("succubus.prefork.os._exit")
+    @patch("succubus.daemonize.gc.set_threshold")
+    def test_worker_gc_can_be_tuned(self, mock_set_threshold, mock_exit):
+        daemon = self.make_daemon()
+        daemon.worker_gc_threshold = (50000, 50, 50)
+        daemon.run = Mock()
+
+        daemon._worker_main(0)
+
+        mock_set_threshold.assert_called_once_with(50000, 50, 50)
+        daemon.run.assert_called_once_with()
+
+    @patch("psutil.Process")
+    def test_worker_memory_reports_private_and_shared_memory(self, mock_process):
+        import psutil
+        daemon = self.make_daemon()
+        daemon.worker_pids = {101: 0, 102: 1}
+        worker = Mock()
+        worker.memory_full_info.return_value = Mock(rss=100, pss=60, uss=20)
+        gone = Mock()
+        gone.memory_full_info.side_effect = psutil.NoSuchProcess(102)
+        mock_process.side_effect = lambda pid: worker if pid == 101 else gone
+
+        memory = daemon.worker_memory()
+
+        self.assertEqual(memory, {0: {'pid': 101, 'rss': 100, 'pss': 60,
+                                      'private': 20, 'shared': 80}})
+        _, private, shared = daemon._collect_worker_metrics()
+        self.assertEqual(private.samples(),
+                         [('succubus_worker_private_memory_bytes', '{worker="0"}', 20)])
+        self.assertEqual(shared.samples(),
+                         [('succubus_worker_shared_memory_bytes', '{worker="0"}', 80)])
+
+    @patch("succubus.prefork.signal.pthread_sigmask")
+    @patch("succubus.daemonize.Daemon.daemonize")
+    def test_master_blocks_signals_before_starting_threads(self, mock_daemonize,
+                                                           mock_sigmask):
+        daemon = self.make_daemon()
+
+        daemon.daemonize()
+
+        mock_daemonize.assert_called_once_with()
+        mock_sigmask.assert_called_once_with(
+            signal.SIG_BLOCK,
+            [signal.SIGTERM, signal.SIGCHLD, signal.SIGHUP, signal.SIGUSR1])
+
+    def make_recycling_daemon(self, **limits):
+        daemon = self.make_daemon(workers=2)
+        for name, value in limits.items():
+            setattr(daemon, name, value)
+        daemon._unit_counts = multiprocessing.RawArray('Q', 4)
+        daemon._free_counters = [2, 3]
+        daemon.worker_pids = {101: 0, 102: 1}
+        daemon._worker_counters = {101: 0, 102: 1}
+        daemon._worker_started = {101: 1000.0, 102: 1000.0}
+        return daemon
+
+    def test_unit_done_counts_in_shared_memory(self):
+        daemon = self.make_recycling_daemon()
+        daemon._unit_counter = 1
+
+        daemon.unit_done()
+        daemon.unit_done(4)
+
+        self.assertEqual(list(daemon._unit_counts), [0, 5, 0, 0])
+
+    @patch("succubus.prefork.os.kill")
+    @patch("succubus.prefork.os.fork")
+    def test_worker_is_replaced_before_it_is_stopped(self, mock_fork, mock_kill):
+        daemon = self.make_recycling_daemon(max_worker_units=10)
+        daemon._unit_counts[1] = 10
+        calls = []
+        mock_fork.side_effect = lambda: calls.append('fork') or 103
+        mock_kill.side_effect = lambda pid, sig: calls.append(('kill', pid, sig))
+
+        daemon._recycle_workers()
+
+        self.assertEqual(calls, ['fork', ('kill', 102, signal.SIGTERM)])
+        self.assertEqual(daemon.worker_pids, {101: 0, 102: 1, 103: 1})
+        self.assertEqual(daemon._worker_counters[103], 3)
+        self.assertEqual(daemon.recycles.value, 1)
+        self.assertEqual(daemon.restarts.value, 0)
+        daemon.logger.info.assert_any_call("Recycling worker %d (pid %d): %s",
+                                           1, 102, "10 units of work done")
+
+    @patch("succubus.prefork.time.time")
+    @patch("succubus.prefork.os.kill")
+    @patch("succubus.prefork.os.fork")
+    def test_only_one_worker_is_recycled_at_a_time(self, mock_fork, mock_kill,
+                                                   mock_time):
+        daemon = self.make_recycling_daemon(max_worker_age=60)
+        mock_time.return_value = 2000.0
+        mock_fork.side_effect = [103, 104]
+
+        daemon._recycle_workers()
+        daemon._next_recycle_check = 0
+        daemon._recycle_workers()
+
+        self.assertEqual(mock_fork.call_count, 1)
+        mock_kill.assert_called_once_with(101, signal.SIGTERM)
+
+        # Once the old worker is gone, the next one is recycled.
+        del daemon.worker_pids[101]
+        daemon._recycle_workers()
+
+        self.assertEqual(mock_fork.call_count, 2)
+        mock_kill.assert_called_with(102, signal.SIGTERM)
+
+    @patch("psutil.Process")
+    def test_workers_are_recycled_on_memory_growth(self, mock_process):
+        daemon = self.make_recycling_daemon(max_worker_rss=1000)
+        mock_process.return_value.memory_info.return_value = Mock(rss=1001)
+
+        self.assertEqual(daemon._recycle_reason(101, 1000.0),
+                         "1001 bytes resident memory")
+        mock_process.return_value.memory_info.return_value = Mock(rss=999)
+        self.assertEqual(daemon._recycle_reason(101, 1000.0), None)
+
+    @patch("succubus.prefork.time.time")
+    @patch("succubus.prefork.os.kill")
+    def test_stuck_recycled_worker_is_killed(self, mock_kill, mock_time):
+        daemon = self.make_recycling_daemon(max_worker_age=3600)
+        daemon._recycling = (101, 1010.0)
+        mock_time.return_value = 1011.0
+
+        daemon._recycle_workers()
+
+        mock_kill.assert_called_once_with(101, signal.SIGKILL)
+        self.assertEqual(daemon._recycling, None)
+
+    @patch("succubus.prefork.os.waitpid")
+    def test_reaping_recycled_worker_frees_its_counter(self, mock_waitpid):
+        daemon = self.make_recycling_daemon()
+        daemon._recycling = (101, 1010.0)
+        mock_waitpid.side_effect = [(101, 0), (0, 0)]
+
+        daemon._reap_workers()
+
+        self.assertEqual(daemon._recycling, None)
+        self.assertEqual(daemon._free_counters, [2, 3, 0])
+        self.assertEqual(daemon.logger.warning.call_count, 0)
+
+    @patch("succubus.prefork.os.kill")
+    @patch("succubus.prefork.os.fork")
+    def test_reload_replaces_workers_one_by_one(self, mock_fork, mock_kill):
+        daemon = self.make_recycling_daemon()
+        daemon._worker_generation = {101: 0, 102: 0}
+        daemon.config = {}
+        daemon.load_configuration = lambda: daemon.config.update(workers=2)
+        mock_fork.side_effect = [103, 104]
+
+        self.assertTrue(daemon.reload())
+        mock_kill.assert_called_once_with(os.getpid(), signal.SIGCHLD)
+        daemon._recycle_workers()
+
+        mock_kill.assert_called_with(101, signal.SIGTERM)
+        daemon.logger.info.assert_any_call("Recycling worker %d (pid %d): %s",
+                                           0, 101, "configuration reloaded")
+        self.assertEqual(daemon._worker_generation[103], 1)
+
+        # The next worker is replaced as soon as the first one is gone.
+        del daemon.worker_pids[101]
+        daemon._recycle_workers()
+        mock_kill.assert_called_with(102, signal.SIGTERM)
+
+        del daemon.worker_pids[102]
+        daemon._recycle_workers()
+        self.assertIn("Rolled out", daemon.logger.info.call_args[0][0])
+        self.assertEqual(daemon._recycle_workers(), None)
+
+    def test_unchanged_configuration_keeps_workers(self):
+        daemon = self.make_recycling_daemon()
+
+        self.assertTrue(daemon.reload())
+
+        self.assertEqual(daemon._recycle_workers(), None)
+
+    def test_no_recycling_without_limits(self):
+        daemon = self.make_recycling_daemon()
+
+        self.assertEqual(daemon._recycle_workers(), None)
+
+    def test_master_shutdown_only_removes_pid_file(self):
+        daemon = self.make_daemon()
+        daemon.shutdown = Mock()
+        daemon._delpid_if_owned = Mock()
+
+        daemon._shutdown()
+
+        daemon._delpid_if_owned.assert_called_once_with(os.getpid())
+        self.assertEqual(daemon.shutdown.call_count, 0)
@@ -0,0 +1,85 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase, skipIf
+from mock import patch
+import os
+import signal
+import sys
+import time
+
+from succubus.procpool import ProcessPool
+
+
+def square(number):
+    return number * number
+
+
+def invert(block, size):
+    for index in range(size):
+        block.buf[index] = 255 - block.buf[index]
+    return os.getpid()
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+
+
+class TestProcessPool(TestCase):
+    def setUp(self):
+        self.pool = ProcessPool(processes=2)
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.stop(1)
+
+    def test_work_runs_in_other_processes(self):
+        self.assertEqual(self.pool.apply(square, 7, timeout=5), 49)
+        self.assertEqual(self.pool.map(square, range(5)), [0, 1, 4, 9, 16])
+
+    @patch("succubus.procpool.multiprocessing", spec=['cpu_count', 'Pool'])
+    def test_workers_are_forked_without_contexts(self, mock_multiprocessing):
+        pool = ProcessPool(processes=2)
+
+        pool.start()
+
+        mock_multiprocessing.Pool.assert_called_once_with(
+            2, initializer=pool._init_worker)
+
+    @skipIf(sys.version_info < (3, 8), "Shared memory needs Python 3.8+")
+    def test_shared_memory_is_changed_in_place(self):
+        block = self.pool.shared(b'\x00\x01\xff')
+
+        worker_pid = self.pool.apply(invert, block, 3, timeout=5)
+
+        self.assertNotEqual(worker_pid, os.getpid())
+        self.assertEqual(bytes(block.buf[:3]), b'\xff\xfe\x00')
+        self.pool.release(block)
+
+    @skipIf(sys.version_info < (3, 8), "Shared memory needs Python 3.8+")
+    def test_stop_releases_shared_memory(self):
+        block = self.pool.shared(size=10)
+
+        self.pool.stop(1)
+
+        self.assertEqual(self.pool._blocks, {})
+        self.assertFalse(os.path.exists('/dev/shm/' + block.name.lstrip('/')))
+
+    def test_stop_kills_workers_after_timeout(self):
+        previous = signal.signal(signal.SIGTERM, lambda *args: None)
+        try:
+            pool = ProcessPool(processes=1)
+            pool.start()
+            pool.submit(sleep, 30)
+            time.sleep(0.1)
+            start = time.time()
+
+            pool.stop(0.2)
+
+            self.assertLess(time.time() - start, 5)
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+
+    def test_submit_needs_running_pool(self):
+        self.pool.stop(1)
+
+        self.assertRaises(RuntimeError, self.pool.submit, square, 1)
@@ -0,0 +1,117 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase, skipIf
+from mock import patch, Mock
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+from succubus import Daemon, PreforkDaemon
+from succubus.profiler import Profiler
+
+
+def wait_in_known_function(event):
+    event.wait()
+
+
+class TestProfiler(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.path = os.path.join(self.temp_dir, 'foo.collapsed')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_stacks_of_other_threads_are_counted(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=wait_in_known_function, args=(stop,),
+                                  name='known-thread')
+        thread.start()
+        profiler = Profiler(self.path, interval=0.001)
+        try:
+            profiler.start()
+            time.sleep(0.1)
+            profiler.stop()
+        finally:
+            stop.set()
+            thread.join()
+
+        with open(self.path) as output:
+            lines = output.read().splitlines()
+        known = [line for line in lines if line.startswith('known-thread;')]
+        self.assertEqual(len(known), 1)
+        stack, count = known[0].rsplit(' ', 1)
+        self.assertIn(';wait_in_known_function (profiler_tests.py:', stack)
+        self.assertGreater(int(count), 0)
+        self.assertLessEqual(int(count), profiler.samples)
+        self.assertFalse(any('succubus-profiler' in line for line in lines))
+
+
+class TestDaemonProfiler(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['foo', 'bar']
+
+    def tearDown(self):
+        self.mock_sys_context.__exit__()
+        shutil.rmtree(self.temp_dir)
+
+    def test_toggle_starts_and_stops_profiler(self):
+        daemon = Daemon(pid_file=os.path.join(self.temp_dir, 'foo.pid'))
+        daemon.logger = Mock()
+        daemon.profile_interval = 0.001
+
+        self.assertTrue(daemon.toggle_profiler())
+        time.sleep(0.05)
+        self.assertFalse(daemon.toggle_profiler())
+
+        self.assertEqual(daemon._profiler, None)
+        self.assertEqual(daemon.profile_file(),
+                         os.path.join(self.temp_dir, 'foo.%d.collapsed' % os.getpid()))
+        with open(daemon.profile_file()) as output:
+            self.assertIn('test_toggle_starts_and_stops_profiler', output.read())
+
+    def test_sigusr1_toggles_profiler_outside_of_signal_handler(self):
+        daemon = Daemon(pid_file=os.path.join(self.temp_dir, 'foo.pid'))
+        daemon.logger = Mock()
+        toggled = threading.Event()
+        daemon.toggle_profiler = Mock(side_effect=lambda: toggled.set())
+
+        daemon._handle_sigusr1(signal.SIGUSR1, None)
+        self.assertEqual(daemon.toggle_profiler.call_count, 0)
+        daemon._start_signal_thread()
+        try:
+            self.assertTrue(toggled.wait(5))
+        finally:
+            daemon.shutdown_requested.set()
+
+    def test_profile_is_written_on_shutdown(self):
+        daemon = Daemon(pid_file=os.path.join(self.temp_dir, 'foo.pid'))
+        daemon.logger = Mock()
+        daemon.toggle_profiler()
+
+        daemon._cleanup(time.time() + 1)
+
+        self.assertTrue(os.path.exists(daemon.profile_file()))
+
+    @skipIf(sys.version_info < (3, 3), "PreforkDaemon needs Python 3.3+")
+    @patch("succubus.prefork.os.kill")
+    def test_prefork_master_profiles_workers(self, mock_kill):
+        daemon = PreforkDaemon(pid_file=os.path.join(self.temp_dir, 'foo.pid'),
+                               workers=2)
+        daemon.worker_pids = {101: 0, 102: 1}
+
+        result = daemon._control_profile()
+
+        self.assertEqual(result['profiling'], True)
+        self.assertEqual(result['workers'], [101, 102])
+        self.assertEqual(daemon._profiler, None)
+        mock_kill.assert_any_call(101, signal.SIGUSR1)
+        mock_kill.assert_any_call(102, signal.SIGUSR1)
+        self.assertFalse(daemon.toggle_profiler())
@@ -0,0 +1,170 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase
+from mock import patch
+import datetime
+import threading
+import time
+
+from succubus.scheduler import CronSchedule, Job, Scheduler
+
+
+class TestJob(TestCase):
+    def test_interval_job_does_not_drift(self):
+        job = Job(None, interval=10)
+        job.schedule(100.0)
+        self.assertEqual(job.deadline, 110.0)
+
+        # The run that was due at 110 only happens at 113.
+        job.schedule(113.0)
+
+        self.assertEqual(job.deadline, 120.0)
+        self.assertEqual(job.missed, 0)
+
+    def test_missed_runs_are_coalesced(self):
+        job = Job(None, interval=10)
+        job.schedule(100.0)
+
+        job.schedule(145.0)
+
+        self.assertEqual(job.deadline, 150.0)
+        self.assertEqual(job.missed, 3)
+
+    def test_first_run_can_be_immediate(self):
+        job = Job(None, interval=10)
+
+        job.schedule(100.0, first=0)
+
+        self.assertEqual(job.deadline, 100.0)
+
+    @patch("succubus.scheduler.random.uniform")
+    def test_jitter_delays_deadline_but_not_base(self, mock_uniform):
+        mock_uniform.return_value = 2.5
+        job = Job(None, interval=10, jitter=5)
+
+        job.schedule(100.0)
+        job.schedule(112.6)
+
+        mock_uniform.assert_called_with(0, 5)
+        self.assertEqual(job.base, 120.0)
+        self.assertEqual(job.deadline, 122.5)
+
+
+class TestCronSchedule(TestCase):
+    def test_every_quarter_hour(self):
+        cron = CronSchedule('*/15 * * * *')
+
+        self.assertEqual(cron.next_after(datetime.datetime(2020, 1, 1, 10, 14, 59)),
+                         datetime.datetime(2020, 1, 1, 10, 15))
+        self.assertEqual(cron.next_after(datetime.datetime(2020, 1, 1, 10, 15)),
+                         datetime.datetime(2020, 1, 1, 10, 30))
+        self.assertEqual(cron.next_after(datetime.datetime(2020, 1, 1, 23, 59)),
+                         datetime.datetime(2020, 1, 2, 0, 0))
+
+    def test_lists_and_ranges(self):
+        cron = CronSchedule('0 8-10,18 * * *')
+
+        self.assertEqual(cron.next_after(datetime.datetime(2020, 1, 1, 10, 0)),
+                         datetime.datetime(2020, 1, 1, 18, 0))
+
+    def test_day_of_month_or_weekday(self):
+        # The 13th, and every Friday. 2020-03-06 is a Friday.
+        cron = CronSchedule('0 0 13 * 5')
+
+        self.assertEqual(cron.next_after(datetime.datetime(2020, 3, 1)),
+                         datetime.datetime(2020, 3, 6))
+        self.assertEqual(cron.next_after(datetime.datetime(2020, 3, 12)),
+                         datetime.datetime(2020, 3, 13))
+
+    def test_sunday_is_0_and_7(self):
+        # 2020-03-01 is a Sunday.
+        for expression in ('0 12 * * 0', '0 12 * * 7'):
+            self.assertEqual(CronSchedule(expression).next_after(datetime.datetime(2020, 2, 28)),
+                             datetime.datetime(2020, 3, 1, 12, 0))
+
+    def test_leap_day(self):
+        cron = CronSchedule('0 0 29 2 *')
+
+        self.assertEqual(cron.next_after(datetime.datetime(2021, 1, 1)),
+                         datetime.datetime(2024, 2, 29))
+
+    def test_invalid_expressions_are_rejected(self):
+        for expression in ('* * * *', '60 * * * *', '*/0 * * * *', 'a * * * *'):
+            self.assertRaises(ValueError, CronSchedule, expression)
+        self.assertRaises(ValueError, CronSchedule('0 0 30 2 *').next_after,
+                          datetime.datetime(2020, 1, 1))
+
+
+class TestScheduler(TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler(max_workers=2)
+        self.thread = threading.Thread(target=self.scheduler.run)
+
+    def tearDown(self):
+        self.scheduler.stop(1)
+        self.thread.join(1)
+
+    def test_jobs_run_until_stopped(self):
+        calls = []
+        self.scheduler.every(0.01, lambda: calls.append(time.time()))
+        self.thread.start()
+        time.sleep(0.2)
+
+        start = time.time()
+        self.scheduler.stop(1)
+        self.thread.join(1)
+
+        self.assertLess(time.time() - start, 0.1)
+        self.assertFalse(self.thread.is_alive())
+        self.assertGreater(len(calls), 5)
+
+    def test_job_added_while_running_wakes_up_scheduler(self):
+        called = threading.Event()
+        self.scheduler.every(3600, lambda: None)
+        self.thread.start()
+        time.sleep(0.05)
+
+        self.scheduler.every(3600, called.set, first=0)
+
+        self.assertTrue(called.wait(1))
+
+    def test_blocking_jobs_run_on_thread_pool(self):
+        threads = []
+        self.scheduler.every(0.01, lambda: threads.append(threading.current_thread().name),
+                             blocking=True, first=0)
+        self.thread.start()
+        time.sleep(0.05)
+
+        self.assertTrue(threads)
+        self.assertTrue(all(name.startswith('succubus-scheduler-') for name in threads))
+
+    def test_slow_blocking_job_is_not_queued_twice(self):
+        release = threading.Event()
+        job = self.scheduler.every(0.01, lambda: release.wait(1), blocking=True, first=0)
+        self.thread.start()
+        time.sleep(0.1)
+
+        release.set()
+        self.scheduler.stop(1)
+
+        self.assertEqual(job.runs, 1)
+        self.assertGreater(job.missed, 0)
+
+    def test_failing_job_is_run_again(self):
+        job = self.scheduler.every(0.01, lambda: 1 / 0, first=0)
+        with patch.object(self.scheduler, 'logger') as mock_logger:
+            self.thread.start()
+            time.sleep(0.05)
+            self.scheduler.stop(1)
+
+        self.assertGreater(job.runs, 1)
+        mock_logger.exception.assert_called_with("Error in scheduled job %s:", '<lambda>')
+
+    def test_cancelled_job_does_not_run(self):
+        job = self.scheduler.every(0.01, lambda: 1 / 0)
+        job.cancel()
+        self.thread.start()
+        time.sleep(0.05)
+
+        self.assertEqual(job.runs, 0)
+        self.assertEqual(self.scheduler.jobs, [])
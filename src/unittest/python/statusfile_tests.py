@@ -0,0 +1,133 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase
+from mock import patch, Mock
+import os
+import shutil
+import tempfile
+import time
+
+from succubus import Daemon
+from succubus.statusfile import StatusFile, StatusUpdater, read
+
+
+class TestStatusFile(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.path = os.path.join(self.temp_dir, 'foo.status')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_reader_sees_updates(self):
+        status_file = StatusFile(self.path, 1234, 1000.0)
+
+        status_file.beat()
+        status_file.beat()
+        status_file.update(rss=4096, queue_depth=3)
+        status_file.counter('requests').inc(5)
+        status_file.counter('errors').set(2)
+        status_file.counter('requests').inc()
+
+        status = read(self.path)
+        self.assertEqual(status['pid'], 1234)
+        self.assertEqual(status['started_at'], 1000.0)
+        self.assertAlmostEqual(status['heartbeat'], time.time(), delta=5)
+        self.assertEqual(status['iterations'], 2)
+        self.assertEqual(status['queue_depth'], 3)
+        self.assertEqual(status['rss'], 4096)
+        self.assertEqual(status['counters'], {'requests': 6, 'errors': 2})
+
+    def test_fresh_file_has_no_heartbeat(self):
+        StatusFile(self.path, 1234, 1000.0)
+
+        status = read(self.path)
+
+        self.assertEqual(status['heartbeat'], None)
+        self.assertEqual(status['counters'], {})
+
+    def test_forked_process_writes_to_same_counter(self):
+        status_file = StatusFile(self.path, 1234, 1000.0)
+        status_file.counter('requests').inc()
+        pid = os.fork()
+        if pid == 0:
+            status_file.counter('requests').inc()
+            status_file.counter('jobs').inc()
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(read(self.path)['counters'], {'requests': 2, 'jobs': 1})
+
+    def test_counters_are_limited(self):
+        status_file = StatusFile(None, 1234, 1000.0, counters=1)
+        status_file.counter('a')
+
+        self.assertRaises(ValueError, status_file.counter, 'b')
+        self.assertRaises(ValueError, status_file.counter, 'x' * 25)
+
+    def test_read_rejects_other_files(self):
+        with open(self.path, 'wb') as other_file:
+            other_file.write(b'x' * 100)
+
+        self.assertEqual(read(self.path), None)
+        self.assertEqual(read(os.path.join(self.temp_dir, 'missing')), None)
+
+    def test_only_creator_removes_file(self):
+        status_file = StatusFile(self.path, 1234, 1000.0)
+        pid = os.fork()
+        if pid == 0:
+            status_file.close()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertTrue(os.path.exists(self.path))
+
+        status_file.close()
+
+        self.assertFalse(os.path.exists(self.path))
+
+
+class TestDaemonStatusFile(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['foo', 'status', '--verbose']
+        self.daemon = Daemon(pid_file=os.path.join(self.temp_dir, 'foo.pid'))
+        self.daemon.logger = Mock()
+
+    def tearDown(self):
+        self.mock_sys_context.__exit__()
+        shutil.rmtree(self.temp_dir)
+
+    def test_status_counter_needs_started_daemon(self):
+        self.assertRaises(RuntimeError, self.daemon.status_counter, 'requests')
+
+    def test_heartbeat_counts_iterations(self):
+        self.daemon._status = StatusFile(self.daemon.status_file, os.getpid(), 1000.0)
+
+        self.daemon.heartbeat()
+
+        self.assertEqual(read(self.daemon.status_file)['iterations'], 1)
+
+    def test_updater_writes_memory_and_queue_depth(self):
+        self.daemon._status = StatusFile(self.daemon.status_file, os.getpid(), 1000.0)
+        self.daemon.queue_depth = Mock(return_value=7)
+        self.daemon.shutdown_requested.set()
+
+        StatusUpdater(self.daemon).run()
+
+        status = read(self.daemon.status_file)
+        self.assertEqual(status['queue_depth'], 7)
+        self.assertGreater(status['rss'], 0)
+
+    def test_verbose_status_shows_status_file(self):
+        self.daemon._status = StatusFile(self.daemon.status_file, os.getpid(), 1000.0)
+        self.daemon.status_counter('requests').inc(42)
+        self.daemon._already_running = Mock(return_value=True)
+
+        retval = self.daemon.status()
+
+        self.assertEqual(retval, 0)
+        output = ''.join(call[0][0] for call in self.mock_sys.stdout.write.call_args_list)
+        self.assertIn("Loop iterations: 0\n", output)
+        self.assertIn("requests: 42\n", output)
@@ -0,0 +1,152 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase
+from mock import patch, Mock
+import os
+import shutil
+import signal
+import tempfile
+
+from succubus import Daemon
+from succubus.supervisor import Supervisor, describe_exit, read_state
+
+
+class TestDescribeExit(TestCase):
+    def test_exit_code(self):
+        self.assertEqual(describe_exit(3 << 8), 'exit code 3')
+
+    def test_signal(self):
+        self.assertEqual(describe_exit(signal.SIGSEGV), 'killed by SIGSEGV')
+
+
+class TestSupervisor(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['foo', 'bar']
+        self.daemon = Daemon(pid_file=os.path.join(self.temp_dir, 'foo.pid'))
+        self.daemon.logger = Mock()
+        self.daemon.restart_backoff = 1
+        self.daemon.restart_backoff_max = 8
+        self.daemon.restart_limit = 5
+        self.daemon.restart_window = 100
+        self.supervisor = Supervisor(self.daemon)
+
+    def tearDown(self):
+        self.mock_sys_context.__exit__()
+        shutil.rmtree(self.temp_dir)
+
+    @patch("succubus.supervisor.random.uniform")
+    def test_backoff_doubles_up_to_maximum(self, mock_uniform):
+        mock_uniform.side_effect = lambda low, high: high
+        self.daemon.restart_limit = 10
+
+        delays = [self.supervisor._next_delay(0) for _ in range(6)]
+
+        self.assertEqual(delays, [1, 2, 4, 8, 8, 8])
+        mock_uniform.assert_called_with(4, 8)
+
+    @patch("succubus.supervisor.random.uniform")
+    def test_backoff_is_reset_after_long_run(self, mock_uniform):
+        mock_uniform.side_effect = lambda low, high: high
+
+        self.supervisor._next_delay(0)
+        self.supervisor._next_delay(0)
+
+        self.assertEqual(self.supervisor._next_delay(9), 1)
+
+    @patch("succubus.supervisor.time.time")
+    def test_gives_up_when_restart_budget_is_used_up(self, mock_time):
+        mock_time.return_value = 1000.0
+        delays = [self.supervisor._next_delay(0) for _ in range(6)]
+
+        self.assertTrue(all(delay is not None for delay in delays[:5]))
+        self.assertEqual(delays[5], None)
+
+        # Restarts older than restart_window do not count.
+        mock_time.return_value = 1101.0
+        self.assertNotEqual(self.supervisor._next_delay(0), None)
+
+    def test_state_is_written_and_removed(self):
+        self.supervisor.restarts = 2
+        self.supervisor.last_exit = 'exit code 1'
+
+        self.supervisor._write_state()
+
+        state = read_state(self.daemon.supervisor_state_file)
+        self.assertEqual(state['restarts'], 2)
+        self.assertEqual(state['last_exit'], 'exit code 1')
+        self.assertEqual(state['supervisor_pid'], os.getpid())
+        self.supervisor.close()
+        self.assertFalse(os.path.exists(self.daemon.supervisor_state_file))
+
+    def test_state_is_kept_after_giving_up(self):
+        self.supervisor.gave_up = True
+        self.supervisor._write_state()
+
+        self.supervisor.close()
+
+        self.assertTrue(read_state(self.daemon.supervisor_state_file)['gave_up'])
+
+    @patch("succubus.supervisor.os.kill")
+    def test_shutdown_request_stops_child(self, mock_kill):
+        self.supervisor.child_pid = 4242
+        self.daemon.shutdown_requested.set()
+        self.supervisor._poll_child = Mock(side_effect=[None, None, 0])
+        self.supervisor._child_exited.set()
+
+        self.assertEqual(self.supervisor._wait_for_child(), None)
+        self.supervisor._stop_child()
+
+        mock_kill.assert_called_once_with(4242, signal.SIGTERM)
+
+    @patch("succubus.supervisor.os.kill")
+    def test_sighup_is_forwarded_to_child(self, mock_kill):
+        self.supervisor.child_pid = 4242
+
+        self.supervisor._forward_signal(signal.SIGHUP, None)
+
+        mock_kill.assert_called_once_with(4242, signal.SIGHUP)
+
+    @patch("succubus.supervisor.faulthandler")
+    @patch("succubus.supervisor.signal.signal")
+    @patch("succubus.supervisor.signal.pthread_sigmask")
+    @patch("succubus.supervisor.os.fork", return_value=0)
+    def test_child_gets_own_event_and_signal_mask(self, mock_fork, mock_sigmask,
+                                                  mock_signal, mock_faulthandler):
+        supervisor_event = self.daemon.shutdown_requested
+        read_fd, write_fd = os.pipe()
+        os.close(read_fd)
+        self.daemon._pid_file_fd = write_fd
+        self.supervisor._sigmask = set([signal.SIGTERM])
+
+        self.assertEqual(self.supervisor._fork(), 0)
+
+        mock_sigmask.assert_called_once_with(signal.SIG_SETMASK, set([signal.SIGTERM]))
+        self.assertIsNot(self.daemon.shutdown_requested, supervisor_event)
+        self.assertEqual(self.daemon._supervisor_pid, os.getpid())
+        self.assertEqual(self.daemon._pid_file_fd, None)
+        self.assertRaises(OSError, os.close, write_fd)
+
+    def test_supervisor_does_not_call_shutdown(self):
+        self.daemon._supervisor = self.supervisor
+        self.daemon.shutdown = Mock()
+        self.daemon._cleanup = Mock()
+
+        self.daemon._shutdown()
+
+        self.assertEqual(self.daemon.shutdown.call_count, 0)
+        self.assertEqual(self.daemon._cleanup.call_count, 1)
+
+    @patch("succubus.daemonize.sys.stdout")
+    def test_status_shows_restarts(self, mock_stdout):
+        self.supervisor.restarts = 3
+        self.supervisor.last_exit = 'killed by SIGSEGV'
+        self.supervisor._write_state()
+
+        self.daemon._print_supervisor_state(running=True)
+        self.daemon._print_supervisor_state(running=False)
+
+        mock_stdout.write.assert_called_once_with(
+            "Supervised, restarted 3 times, last exit: killed by SIGSEGV\n")
@@ -0,0 +1,140 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase
+from mock import patch, Mock
+import threading
+import time
+
+from succubus import ThreadPoolDaemon
+
+
+class ListDaemon(ThreadPoolDaemon):
+    """Fetches the items of a list, requests shutdown when it is empty"""
+
+    def __init__(self, items, handler, **kwargs):
+        super(ListDaemon, self).__init__(pid_file="foo", **kwargs)
+        self.items = list(items)
+        self.handler = handler
+        self.fetched = []
+        self.logger = Mock()
+        self.notify_ready = Mock()
+        self.poll_interval = 0.01
+
+    def get_work(self):
+        if not self.items:
+            self.shutdown_requested.set()
+            return None
+        item = self.items.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        self.fetched.append(item)
+        return item
+
+    def handle(self, item):
+        self.handler(item)
+
+
+class TestThreadPoolDaemon(TestCase):
+    def setUp(self):
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['foo', 'bar']
+
+    def tearDown(self):
+        self.mock_sys_context.__exit__()
+
+    def test_usage_without_arguments(self):
+        self.mock_sys.argv = ['foo']
+
+        daemon = ThreadPoolDaemon(pid_file="foo")
+
+        self.assertEqual(daemon.action(), 2)
+
+    @patch("succubus.threadpool.multiprocessing.cpu_count")
+    def test_defaults(self, mock_cpu_count):
+        mock_cpu_count.return_value = 2
+
+        daemon = ThreadPoolDaemon(pid_file="foo")
+
+        self.assertEqual(daemon.threads, 6)
+        self.assertEqual(daemon.queue_size, 6)
+
+    def test_all_items_are_handled_on_pool_threads(self):
+        handled = []
+        daemon = ListDaemon(range(20), lambda item: handled.append(
+            (item, threading.current_thread().name)), threads=3)
+
+        daemon._run()
+
+        self.assertEqual(sorted(item for item, _ in handled), list(range(20)))
+        self.assertTrue(all(name.startswith('succubus-worker-') for _, name in handled))
+        daemon.notify_ready.assert_called_once_with()
+        self.assertEqual(daemon._in_flight, 0)
+        self.assertIn('succubus_work_latency_seconds_count 20',
+                      daemon.metrics.to_prometheus())
+
+    def test_get_work_is_not_called_while_queue_is_full(self):
+        release = threading.Event()
+        daemon = ListDaemon(range(100), lambda item: release.wait(5),
+                            threads=2, queue_size=3)
+        runner = threading.Thread(target=daemon._run)
+        runner.start()
+        time.sleep(0.1)
+
+        self.assertEqual(len(daemon.fetched), 5)
+        self.assertIn('succubus_work_queue_depth 3', daemon.metrics.to_prometheus())
+
+        release.set()
+        runner.join(5)
+        self.assertEqual(len(daemon.fetched), 100)
+
+    def test_fetched_items_are_drained_on_shutdown(self):
+        handled = []
+        release = threading.Event()
+
+        def handler(item):
+            release.wait(5)
+            handled.append(item)
+
+        daemon = ListDaemon(range(100), handler, threads=2, queue_size=2)
+        runner = threading.Thread(target=daemon._run)
+        runner.start()
+        time.sleep(0.05)
+
+        daemon.shutdown_requested.set()
+        release.set()
+        runner.join(5)
+
+        self.assertEqual(sorted(handled), daemon.fetched)
+        self.assertEqual(len(handled), 4)
+
+    def test_drain_gives_up_after_shutdown_timeout(self):
+        release = threading.Event()
+        daemon = ListDaemon(range(3), lambda item: release.wait(5), threads=1,
+                            queue_size=5)
+        daemon.shutdown_timeout = 0.1
+        start = time.time()
+
+        daemon._run()
+
+        self.assertLess(time.time() - start, 1)
+        daemon.logger.warning.assert_called_with(
+            "%d work items were not handled within the shutdown timeout", 3)
+        release.set()
+
+    def test_failing_items_are_counted_and_logged(self):
+        daemon = ListDaemon(range(3), lambda item: 1 / item)
+
+        daemon._run()
+
+        daemon.logger.exception.assert_called_once_with(
+            "Error while handling a work item:")
+        self.assertIn('succubus_work_errors_total 1', daemon.metrics.to_prometheus())
+
+    def test_failing_work_source_is_retried(self):
+        daemon = ListDaemon([IOError("down"), 42], Mock())
+
+        daemon._run()
+
+        daemon.logger.exception.assert_called_once_with("Error while fetching work:")
+        daemon.handler.assert_called_once_with(42)
@@ -0,0 +1,167 @@
+from __future__ import print_function, absolute_import, division
+
+from unittest2 import TestCase
+from mock import patch, Mock
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+
+from succubus import Daemon
+from succubus.supervisor import Supervisor
+from succubus.watchdog import Heartbeat, Watchdog, dump_stacks, sd_notify
+
+
+class TestHeartbeat(TestCase):
+    @patch("succubus.watchdog._monotonic")
+    def test_watch_is_armed_by_first_beat(self, mock_monotonic):
+        heartbeat = Heartbeat(5)
+        mock_monotonic.return_value = 100.0
+        self.assertEqual(heartbeat.silence(), None)
+
+        heartbeat.beat()
+        mock_monotonic.return_value = 104.0
+        self.assertEqual(heartbeat.silence(), 4.0)
+        self.assertEqual(heartbeat.missed(), None)
+
+        mock_monotonic.return_value = 106.0
+        self.assertEqual(heartbeat.missed(), 6.0)
+
+        heartbeat.reset()
+        self.assertEqual(heartbeat.missed(), None)
+
+    def test_beat_is_seen_by_forked_process(self):
+        heartbeat = Heartbeat(5)
+        pid = os.fork()
+        if pid == 0:
+            heartbeat.beat()
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        self.assertLess(heartbeat.silence(), 5)
+
+
+class TestSdNotify(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="succubus-test")
+        self.address = os.path.join(self.temp_dir, 'notify')
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.address)
+        self.sock.settimeout(1)
+        self.env_context = patch.dict(os.environ, {'NOTIFY_SOCKET': self.address})
+        self.env_context.__enter__()
+
+    def tearDown(self):
+        self.env_context.__exit__()
+        self.sock.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_message_is_sent_to_notify_socket(self):
+        self.assertTrue(sd_notify('READY=1'))
+
+        self.assertEqual(self.sock.recv(100), b'READY=1')
+
+    def test_nothing_is_sent_without_notify_socket(self):
+        del os.environ['NOTIFY_SOCKET']
+
+        self.assertFalse(sd_notify('READY=1'))
+
+    def test_heartbeat_notifies_systemd_watchdog(self):
+        heartbeat = Heartbeat(5)
+
+        heartbeat.beat()
+        heartbeat.beat()
+
+        self.assertEqual(self.sock.recv(100), b'WATCHDOG=1')
+        # The second beat came too soon to be forwarded.
+        self.sock.settimeout(0)
+        self.assertRaises(socket.error, self.sock.recv, 100)
+
+
+class TestWatchdog(TestCase):
+    def setUp(self):
+        self.mock_sys_context = patch("succubus.daemonize.sys")
+        self.mock_sys = self.mock_sys_context.__enter__()
+        self.mock_sys.argv = ['foo', 'bar']
+        self.daemon = Daemon(pid_file="foo")
+        self.daemon.logger = Mock()
+        self.daemon._flush_logging = Mock()
+
+    def tearDown(self):
+        self.mock_sys_context.__exit__()
+
+    def test_dump_stacks_shows_all_threads(self):
+        stop = threading.Event()
+
+        def waiting_for_stop():
+            stop.wait()
+        thread = threading.Thread(target=waiting_for_stop)
+        thread.start()
+        try:
+            stacks = dump_stacks()
+        finally:
+            stop.set()
+            thread.join()
+
+        self.assertIn('waiting_for_stop', stacks)
+        self.assertIn('test_dump_stacks_shows_all_threads', stacks)
+
+    @patch("succubus.watchdog.faulthandler", None)
+    def test_dump_stacks_without_faulthandler(self):
+        stacks = dump_stacks()
+
+        self.assertIn('MainThread', stacks)
+        self.assertIn('test_dump_stacks_without_faulthandler', stacks)
+
+    def test_heartbeat_without_watchdog_does_nothing(self):
+        self.daemon.heartbeat()
+
+    @patch("succubus.watchdog.os.kill")
+    def test_hung_daemon_is_killed(self, mock_kill):
+        self.daemon._heartbeat = Heartbeat(0.04)
+        self.daemon.heartbeat()
+
+        watchdog = Watchdog(self.daemon)
+        watchdog.start()
+        watchdog.join(5)
+
+        mock_kill.assert_called_once_with(os.getpid(), signal.SIGKILL)
+        message = self.daemon.logger.error.call_args[0]
+        self.assertIn('test_hung_daemon_is_killed', message[2])
+        self.assertEqual(self.daemon._flush_logging.call_count, 1)
+
+    @patch("succubus.watchdog.os.kill")
+    def test_beating_daemon_is_left_alone(self, mock_kill):
+        self.daemon._heartbeat = Heartbeat(0.5)
+        self.daemon.heartbeat()
+
+        watchdog = Watchdog(self.daemon)
+        watchdog.start()
+        for _ in range(10):
+            self.daemon.wait(0.05)
+            self.daemon.heartbeat()
+        self.daemon.shutdown_requested.set()
+        watchdog.join(5)
+
+        self.assertFalse(watchdog.is_alive())
+        self.assertEqual(mock_kill.call_count, 0)
+
+    def test_supervisor_kills_hung_child_and_logs_its_stacks(self):
+        self.daemon._heartbeat = Heartbeat(0.2)
+        supervisor = Supervisor(self.daemon)
+        supervisor.child_pid = supervisor._fork()
+        if supervisor.child_pid == 0:
+            self.daemon.heartbeat()
+            threading.Event().wait(10)
+            os._exit(0)
+
+        status = supervisor._wait_for_child()
+        supervisor._log_dump()
+        supervisor.close()
+
+        self.assertTrue(os.WIFSIGNALED(status))
+        self.assertEqual(os.WTERMSIG(status), signal.SIGABRT)
+        dump = self.daemon.logger.error.call_args[0][2]
+        self.assertIn('test_supervisor_kills_hung_child_and_logs_its_stacks', dump)